@@ -1,6 +1,9 @@
 # flake8: noqa
+__version__ = "0.0.1"
+
 from .database import (
     get_current_database,
+    get_current_databases,
     create_databases,
     delete_databases,
     clean_databases
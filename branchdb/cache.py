@@ -0,0 +1,213 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import sys
+import json
+import time
+import marshal
+import threading
+import branchdb
+from branchdb import utils
+
+CACHE_FOLDER = ".cache"
+RESOLUTION_FILE = "resolution.json"
+SETTINGS_FILE = "settings.marshal"
+CLONE_STRATEGY_FILE = "clone_strategy.json"
+
+
+def cache_folder(project_root):
+    """Returns the folder holding the generated cache files of a project"""
+    return os.path.join(project_root, ".branchdb", CACHE_FOLDER)
+
+
+def file_signature(path):
+    """Returns the (mtime, size, inode) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    mtime = getattr(stat, "st_mtime_ns", None) or stat.st_mtime
+    return [mtime, stat.st_size, stat.st_ino]
+
+
+def resolution_signature(project):
+    """
+    Returns the signature that a cached resolution must match to be reused,
+    or None when the project's HEAD can not be watched.
+    """
+    if project.git_dir is None:
+        return None
+    return [
+        file_signature(os.path.join(project.git_dir, "HEAD")),
+        # a reftable repository records checkouts in its table list instead of HEAD
+        file_signature(os.path.join(project.git_dir, "reftable", "tables.list")),
+        file_signature(project.mapping_path),
+        file_signature(project.settings_path),
+        # commits to the SQLite mapping land in its write-ahead log until a checkpoint
+        file_signature(project.mapping_database_path),
+        file_signature(project.mapping_database_path + "-wal")]
+
+
+def _resolution_path(project_root):
+    return os.path.join(cache_folder(project_root), RESOLUTION_FILE)
+
+
+def _cache_key(slug):
+    return "" if slug is None else slug
+
+
+def _load_resolutions(project_root, signature):
+    try:
+        with io.open(_resolution_path(project_root), "rb") as cache_file:
+            cached = json.loads(cache_file.read().decode("utf-8"))
+    except (IOError, OSError, ValueError):
+        return {}
+    if cached.get("signature") != signature:
+        return {}
+    return cached.get("databases", {})
+
+
+def get_cached_database(project, slug, signature):
+    """Returns the cached database name for the slug, or None if there is no fresh entry"""
+    if signature is None:
+        return None
+    return _load_resolutions(project.root, signature).get(_cache_key(slug))
+
+
+def set_cached_database(project, slug, db_name, signature):
+    """Saves the database name for the slug. Failing to write the cache is not an error."""
+    if signature is None:
+        return
+    databases = _load_resolutions(project.root, signature)
+    databases[_cache_key(slug)] = db_name
+    try:
+        folder = cache_folder(project.root)
+        if os.path.exists(folder) is False:
+            os.makedirs(folder)
+        utils.atomic_json_dump({"signature": signature, "databases": databases}, _resolution_path(project.root))
+    except (IOError, OSError):
+        pass
+
+
+def _clone_strategy_path(project_root):
+    return os.path.join(cache_folder(project_root), CLONE_STRATEGY_FILE)
+
+
+def _load_clone_strategies(project_root):
+    try:
+        with io.open(_clone_strategy_path(project_root), "rb") as cache_file:
+            return json.loads(cache_file.read().decode("utf-8"))
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def get_clone_strategy(project_root, connection):
+    """Returns the clone strategy that won the last benchmark on the connection, or None"""
+    return _load_clone_strategies(project_root).get(connection, {}).get("strategy")
+
+
+def set_clone_strategy(project_root, connection, strategy, timings):
+    """Records the winning clone strategy of a connection along with the timings of each strategy"""
+    strategies = _load_clone_strategies(project_root)
+    strategies[connection] = {"strategy": strategy, "timings": timings}
+    folder = cache_folder(project_root)
+    if os.path.exists(folder) is False:
+        os.makedirs(folder)
+    utils.atomic_json_dump(strategies, _clone_strategy_path(project_root))
+
+
+def _settings_cache_path(settings_path):
+    return os.path.join(os.path.dirname(settings_path), CACHE_FOLDER, SETTINGS_FILE)
+
+
+def _settings_cache_key(settings_path):
+    signature = file_signature(settings_path)
+    if signature is None:
+        return None
+    return [signature, branchdb.__version__, list(sys.version_info[:2])]
+
+
+def get_cached_settings(settings_path):
+    """
+    Returns whether the settings cache is fresh, along with the cached settings.
+    A fresh cache without settings means the settings can not be cached.
+    """
+    key = _settings_cache_key(settings_path)
+    try:
+        with io.open(_settings_cache_path(settings_path), "rb") as cache_file:
+            cached_key, values = marshal.loads(cache_file.read())
+    except (IOError, OSError, ValueError, EOFError, TypeError):
+        return False, None
+    if key is None or cached_key != key:
+        return False, None
+    return True, values
+
+
+def set_cached_settings(settings_path, values):
+    """Saves the settings, or marks them as uncacheable when they can not be marshalled"""
+    key = _settings_cache_key(settings_path)
+    if key is None:
+        return
+    try:
+        content = marshal.dumps((key, values))
+    except ValueError:
+        content = marshal.dumps((key, None))
+    cache_path = _settings_cache_path(settings_path)
+    try:
+        folder = os.path.dirname(cache_path)
+        if os.path.exists(folder) is False:
+            os.makedirs(folder)
+        utils.atomic_write(content, cache_path)
+    except (IOError, OSError):
+        pass
+
+
+def invalidate(project_root):
+    """Removes the cached resolutions of the project"""
+    try:
+        os.remove(_resolution_path(project_root))
+    except OSError:
+        pass
+
+
+class ResolutionMemo(object):
+    """
+    Thread-safe, in-process memo of resolved database names.
+    Entries are reused while the project's resolution signature is unchanged and,
+    when a ttl (in seconds) is set for the memo or the entry, until they expire.
+    Without a signature to compare, entries are only reused when a ttl is set.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, project, slug, signature):
+        with self._lock:
+            entry = self._entries.get((project.root, slug))
+        if entry is None:
+            return None
+        db_name, entry_signature, resolved_at, ttl = entry
+        if ttl is None:
+            ttl = self.ttl
+        if signature is None and ttl is None:
+            return None
+        if signature != entry_signature:
+            return None
+        if ttl is not None and time.time() - resolved_at > ttl:
+            return None
+        return db_name
+
+    def set(self, project, slug, db_name, signature, ttl=None):
+        with self._lock:
+            self._entries[(project.root, slug)] = (db_name, signature, time.time(), ttl)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
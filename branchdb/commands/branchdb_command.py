@@ -6,9 +6,13 @@ from __future__ import unicode_literals
 
 import io
 import os
+import sys
 import shutil
 import argparse
-from branchdb import database, git_tools, utils, repo_mapping
+import subprocess
+import six
+from branchdb import cache, database, frozen, git_tools, hooks, mapping_backends, utils, repo_mapping
+from branchdb.project import get_project
 
 
 def main():
@@ -34,6 +38,16 @@ def main():
         "--branch",
         default=None,
         help="Specify a branch to do a paired action on (use with '--set')")
+    tools_parser.add_argument(
+        "--bench-clone",
+        action="store_true",
+        default=False,
+        help="Time each strategy for copying the template databases and use the fastest for CLONE_STRATEGY 'auto'")
+    tools_parser.add_argument(
+        "--import-mapping",
+        default=None,
+        metavar="BACKEND",
+        help="Copy the branches kept by another mapping backend (e.g. 'json') into the one set by MAPPING_BACKEND")
 
     # init parser
     init_parser = subparsers.add_parser(
@@ -86,8 +100,63 @@ def main():
         action="store_true",
         default=False,
         help="Delete all databases associated with branchdb project.")
+    delete_parser.add_argument(
+        "-f", "--force",
+        action="store_const",
+        const=True,
+        default=None,
+        help="Terminate the sessions still using the databases (default: the FORCE_DELETE setting)")
+    delete_parser.add_argument(
+        "-m", "--match",
+        default=None,
+        help="Delete the databases of every branch matching a glob pattern, e.g. 'feature/*'")
+    delete_parser.add_argument(
+        "--regex",
+        action="store_true",
+        default=False,
+        help="Treat '--match' as a regular expression instead of a glob pattern")
+
+    # hooks parser
+    hooks_parser = subparsers.add_parser(
+        "hooks",
+        help="Manage the git hooks that precompute the active databases after each checkout")
+    hooks_parser.set_defaults(parser="hooks")
+    hooks_parser.add_argument(
+        "action",
+        choices=["install", "uninstall", "run"],
+        help="Install or uninstall the hooks, or 'run' them to refresh the active databases now")
+
+    # freeze parser
+    freeze_parser = subparsers.add_parser(
+        "freeze",
+        help="Write the resolved databases and settings to an artifact usable without git (e.g. in containers)")
+    freeze_parser.set_defaults(parser="freeze")
+    freeze_parser.add_argument(
+        "-o", "--output",
+        default=None,
+        help="Where to write the artifact (default: .branchdb/{})".format(frozen.FROZEN_FILE))
+
+    # pool parser
+    pool_parser = subparsers.add_parser(
+        "pool",
+        help="Manage the spare clones of the templates that 'create' claims instead of copying the template")
+    pool_parser.set_defaults(parser="pool")
+    pool_parser.add_argument(
+        "action",
+        choices=["refill", "drain"],
+        help="Clone the templates until each pool holds POOL_SIZE spares, or drop every spare")
+    pool_parser.add_argument(
+        "--background",
+        action="store_true",
+        default=False,
+        help="Run the action in a detached process and return immediately")
 
     args = parser.parse_args()
+    with database.connection_pool:
+        run_command(args)
+
+
+def run_command(args):
     if args.parser == "tools":
         run_tools_command(args)
     if args.parser == "init":
@@ -96,17 +165,44 @@ def main():
         run_create_command(args)
     elif args.parser == "delete":
         run_delete_command(args)
+    elif args.parser == "hooks":
+        run_hooks_command(args)
+    elif args.parser == "freeze":
+        run_freeze_command(args)
+    elif args.parser == "pool":
+        run_pool_command(args)
 
 
 def run_tools_command(args):
+    project = get_project()
     if args.current is True:
-        print(database.get_current_database())
+        print(database.get_current_database(project=project))
     if args.set is not None:
-        active_branch, project_root = git_tools.get_branch_and_root()
-        branch = args.branch or active_branch
-        with repo_mapping.RepoMapping(project_root) as mapping:
+        branch = args.branch or project.branch
+        with repo_mapping.RepoMapping(project.root) as mapping:
             mapping[branch] = args.set
         print("Set branch '{}' to point to '{}'".format(branch, args.set))
+    if args.bench_clone is True:
+        benchmarks = database.bench_clone_strategies(project=project)
+        if not benchmarks:
+            print("No connection has a template and more than one clone strategy.")
+        for benchmark in benchmarks:
+            timings = ", ".join("{} {:.2f}s".format(k, v) for k, v in sorted(benchmark.timings.items()))
+            print("{}: {} ({})".format(benchmark.connection, benchmark.strategy or "no strategy succeeded", timings))
+            for strategy, error in sorted(benchmark.errors.items()):
+                print("{} ({}): {}".format(strategy, benchmark.connection, error))
+    if args.import_mapping is not None:
+        count = repo_mapping.import_mapping(project.root, args.import_mapping)
+        print("Imported {} branches from the '{}' mapping".format(count, args.import_mapping))
+
+
+def gitignore_content():
+    """
+    Returns the `.branchdb/.gitignore` of a project: the generated files, the SQLite mapping (with its
+    write-ahead log) and the frozen artifact, which holds the resolved settings and their credentials
+    """
+    ignored = ["{}/".format(cache.CACHE_FOLDER), mapping_backends.SQLITE_FILE + "*", frozen.FROZEN_FILE]
+    return "".join(line + "\n" for line in ignored)
 
 
 def run_init_command(args):
@@ -127,26 +223,29 @@ def run_init_command(args):
         with io.open(settings_path, "a+") as settings_file:
             settings_file.write("DEFAULT_DATABASE_NAME = \"{}\"\n".format(args.starting_database))
         utils.json_dump({}, os.path.join(local_settings_path, "mappings.json"))
+    with io.open(os.path.join(local_settings_path, ".gitignore"), "w") as gitignore:
+        gitignore.write(gitignore_content())
     print("Project initialized. Please edit your settings for the database connections.")
 
 
 def run_create_command(args, dry_run=False):
-    repo = git_tools.get_repo()
-    branch_name = args.branch or repo.active_branch.name
+    project = get_project()
+    branch_name = args.branch or project.branch
 
     msg = "Please only use '--template-branch' or '--template-database'"
     assert bool(args.template_branch and args.template_database) is False, msg
     template = args.template_database or None
     if args.template_branch:
-        project_root = git_tools.get_project_root(repo)
-        with repo_mapping.RepoMapping(project_root) as mapping:
+        with repo_mapping.RepoMapping(project.root) as mapping:
             template = mapping[args.template_branch]
 
     try:
         result = database.create_databases(
             branch_name,
             template=template,
-            dry_run=dry_run)
+            dry_run=dry_run,
+            project=project,
+            progress=print_copy_progress)
     except Exception as e:
         print(e)
         print("Unable to create databases.")
@@ -154,38 +253,123 @@ def run_create_command(args, dry_run=False):
         if result.success == result.total:
             print("Successfully created '{}' database{}".format(result.success, "" if result.success == 1 else "s"))
         else:
+            print_errors(result)
             print("Unable to create all databases.")
 
 
+def print_copy_progress(progress):
+    """Reports a template being copied from another server"""
+    megabytes = 1024.0 * 1024.0
+    print("Copying '{}' into '{}': {}/{} tables, {:.1f} MB at {:.1f} MB/s".format(
+        progress.template,
+        progress.database,
+        progress.copied_tables,
+        progress.tables,
+        progress.copied_bytes / megabytes,
+        progress.throughput / megabytes))
+
+
 def run_delete_command(args):
-    repo = git_tools.get_repo()
+    project = get_project()
     if args.all:
-        database.delete_all_databases()
+        result = database.delete_all_databases(project=project, force=args.force)
+        print_errors(result)
+        return
+
+    if args.match is not None:
+        try:
+            result = database.delete_matching_databases(
+                args.match, project=project, force=args.force, regex=args.regex)
+        except Exception as e:
+            print(e)
+            print("Unable to delete databases")
+        else:
+            if result.success == result.total:
+                print("Successfully deleted '{}' database{}".format(result.success, "" if result.success == 1 else "s"))
+            else:
+                print_errors(result)
+                print("Unable to delete all databases.")
         return
 
     if args.branch is not None or (args.branch is None and args.clean is False):
-        branch_name = args.branch or repo.active_branch.name
+        branch_name = args.branch or project.branch
         try:
-            result = database.delete_databases(branch_name)
+            result = database.delete_databases(branch_name, project=project, force=args.force)
         except Exception:
             print("Unable to delete databases")
         else:
             if result.success == result.total:
                 print("Successfully deleted '{}' database{}".format(result.success, "" if result.success == 1 else "s"))
             else:
+                print_errors(result)
                 print("Unable to delete all databases.")
 
     if args.clean is True:
         try:
-            result = database.clean_databases()
+            result = database.clean_databases(project=project, force=args.force)
         except Exception:
             print("Unable to clean databases")
         else:
             if result.success == result.total:
                 print("Successfully cleaned '{}' database{}".format(result.success, "" if result.success == 1 else "s"))
             else:
+                print_errors(result)
                 print("Unable to clean all databases.")
 
 
+def print_errors(result):
+    for error in result.errors:
+        if error.database is None:
+            print("{}: {}".format(error.connection, error.error))
+        else:
+            print("{} ({}): {}".format(error.database, error.connection, error.error))
+
+
+def run_hooks_command(args):
+    project = get_project()
+    if args.action == "install":
+        hooks_dir = hooks.install_hooks(project)
+        print("Installed hooks in '{}'".format(hooks_dir))
+    elif args.action == "uninstall":
+        hooks_dir = hooks.uninstall_hooks(project)
+        print("Removed hooks from '{}'".format(hooks_dir))
+    elif args.action == "run":
+        # resolving the databases stores them in the resolution cache read by `get_current_database()`
+        database.get_current_databases(project=project)
+        print(database.get_current_database(project=project))
+
+
+def run_freeze_command(args):
+    path = frozen.freeze(get_project(), path=args.output)
+    print("Froze databases to '{}'. Set {}={} to use it.".format(path, frozen.FROZEN_ENVIRONMENT_VARIABLE, path))
+
+
+def run_pool_command(args):
+    if args.background is True:
+        run_in_background(["pool", args.action])
+        print("Started '{}' in the background".format(args.action))
+        return
+    if args.action == "refill":
+        result = database.refill_pools(project=get_project())
+        verb = "cloned or dropped"
+    else:
+        result = database.drain_pools()
+        verb = "dropped"
+    print_errors(result)
+    print("Successfully {} '{}' spare database{}".format(verb, result.success, "" if result.success == 1 else "s"))
+
+
+def run_in_background(arguments):
+    """Starts a branchdb command in a process that outlives this one"""
+    command = [sys.executable, "-m", "branchdb.commands.branchdb_command"] + list(arguments)
+    options = dict(cwd=os.getcwd(), close_fds=True)
+    if six.PY2 and hasattr(os, "setsid"):
+        options["preexec_fn"] = os.setsid
+    elif six.PY3:
+        options["start_new_session"] = True
+    with io.open(os.devnull, "wb") as devnull:
+        subprocess.Popen(command, stdin=devnull, stdout=devnull, stderr=devnull, **options)
+
+
 if __name__ == "__main__":
     main()
@@ -5,14 +5,17 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
-from branchdb import git_tools, errors, utils
+import threading
+from branchdb import cache, errors, frozen, utils
+from branchdb.project import get_project
 from . import default_settings
 
 
-def project_settings_module():
+def project_settings_module(project=None):
     """Returns the path for the project's personal settings.py file"""
-    project_root = git_tools.get_project_root()
-    settings_path = os.path.join(project_root, ".branchdb", "settings.py")
+    if project is None:
+        project = get_project()
+    settings_path = project.settings_path
     if os.path.exists(settings_path) is False:
         raise errors.ImproperlyConfigured("Unable to find settings module for project")
     return settings_path
@@ -20,30 +23,37 @@ def project_settings_module():
 
 class LazySettings(object):
     """Adapted version of django.conf.LazySettings"""
+    _lock = threading.RLock()
 
     def __init__(self):
         self._wrapped = None
 
     def __getattr__(self, key):
-        if self._wrapped is None:
-            self._setup()
-        value = getattr(self._wrapped, key)
-        self.__dict__[key] = value
+        with self._lock:
+            if self._wrapped is None:
+                self._setup()
+            value = getattr(self._wrapped, key)
+            self.__dict__[key] = value
         return value
 
     def __setattr__(self, key, value):
-        if key == "_wrapped":
-            self.__dict__.clear()
-            self.__dict__["_wrapped"] = value
-        else:
-            if self._wrapped is None:
-                self._setup()
-            self.__dict__.pop(key, None)
-            setattr(self._wrapped, key, value)
+        with self._lock:
+            if key == "_wrapped":
+                self.__dict__.clear()
+                self.__dict__["_wrapped"] = value
+            else:
+                if self._wrapped is None:
+                    self._setup()
+                self.__dict__.pop(key, None)
+                setattr(self._wrapped, key, value)
 
     def _setup(self):
+        frozen_path = frozen.frozen_path()
+        if frozen_path is not None:
+            self._wrapped = FrozenSettings(frozen_path)
+            return
         settings_module = project_settings_module()
-        self._wrapped = Settings(settings_module)
+        self._wrapped = Settings(settings_module, use_cache=True)
 
     @property
     def configured(self):
@@ -51,19 +61,32 @@ class LazySettings(object):
 
 
 class Settings(object):
-    def __init__(self, settings_module):
+    def __init__(self, settings_module, use_cache=False):
         self.settings_module = settings_module
-        custom_settings = utils.import_source_file("settings", self.settings_module)
 
         # Note: the ordering matters here
         self._load(default_settings)
-        self._load(custom_settings)
+        if use_cache is True:
+            fresh, values = cache.get_cached_settings(self.settings_module)
+            if values is not None:
+                self._load_values(values)
+                return
+        custom_settings = utils.import_source_file("settings", self.settings_module)
+        values = self._load(custom_settings)
+        if use_cache is True and fresh is False:
+            cache.set_cached_settings(self.settings_module, values)
 
     def _load(self, mod):
+        values = dict()
         for setting in dir(mod):
             if setting.isupper():
-                value = getattr(mod, setting)
-                setattr(self, setting, value)
+                values[setting] = getattr(mod, setting)
+        self._load_values(values)
+        return values
+
+    def _load_values(self, values):
+        for setting, value in values.items():
+            setattr(self, setting, value)
 
     def __repr__(self):
         return "<{cls} \"{module}\">".format(
@@ -71,4 +94,13 @@ class Settings(object):
             module=self.settings_module)
 
 
+class FrozenSettings(Settings):
+    """Settings read from a frozen artifact instead of the project's settings module"""
+
+    def __init__(self, artifact_path):
+        self.settings_module = artifact_path
+        self._load(default_settings)
+        self._load_values(frozen.load(artifact_path)["settings"])
+
+
 settings = LazySettings()
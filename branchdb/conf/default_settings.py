@@ -11,3 +11,25 @@ NAME_SCHEME = "{prefix}{separator}{branch}{suffix}"
 DEFAULT_DATABASE_NAME = None
 
 DATABASE_TEMPLATE = DEFAULT_DATABASE_NAME
+
+CLONE_STRATEGY = "auto"
+
+POOL_SIZE = 0
+
+POOL_MAX_AGE = None
+
+POOL_TEMPLATE_VERSION = None
+
+MAX_CONCURRENCY = 4
+
+MAX_CONNECTIONS = None
+
+FORCE_DELETE = False
+
+MAPPING_BACKEND = "json"
+
+MAPPING_CONNECTION = None
+
+MAPPING_NAMESPACE = None
+
+MAPPING_CACHE_TTL = 5
@@ -4,7 +4,10 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from .shared import ExecutionResult, get_database_connections  # noqa
-from .create import create_databases  # noqa
-from .delete import clean_databases, delete_databases, delete_all_databases  # noqa
-from .read import get_current_database  # noqa
+from .shared import (  # noqa
+    ConnectionManager, ExecutionError, ExecutionResult, connection_pool, close_connections,
+    get_database_connections, run_on_connections, run_for_databases, engine_result)
+from .create import CloneBenchmark, bench_clone_strategies, create_databases  # noqa
+from .delete import clean_databases, delete_databases, delete_all_databases, delete_matching_databases  # noqa
+from .read import get_current_database, get_current_databases, invalidate  # noqa
+from .pool import refill_pools, drain_pools  # noqa
@@ -0,0 +1,232 @@
+# coding=utf-8
+"""
+asyncio versions of the database operations, for managing databases from an event loop.
+Requires Python 3.5+, which is why this module is not imported by `branchdb.database`.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+import functools
+from collections import OrderedDict
+from branchdb import errors, repo_mapping, utils
+from branchdb.conf import settings
+from branchdb.engines import get_async_engine
+from branchdb.project import get_project
+from .create import clone_strategy
+from .delete import _stale_databases
+from .shared import ExecutionResult, database_entries, engine_result, unreachable_result
+
+
+async def connect(db_info):
+    engine = get_async_engine(db_info["ENGINE"])()
+    await engine.connect(
+        user=db_info["USER"],
+        password=db_info["PASSWORD"],
+        host=db_info["HOST"],
+        port=db_info["PORT"])
+    return engine
+
+
+async def get_database_connections():
+    """Connects every database concurrently, returning a list of (engine, db_info)"""
+    databases = database_entries()
+    engines = await asyncio.gather(*(connect(db_info) for db_info in databases), return_exceptions=True)
+    failures = list(engine for engine in engines if isinstance(engine, BaseException))
+    if failures:
+        await disconnect(engine for engine in engines if not isinstance(engine, BaseException))
+        raise failures[0]
+    return list(zip(engines, databases))
+
+
+async def disconnect(engines):
+    for engine in engines:
+        try:
+            await engine.disconnect()
+        except Exception:
+            pass
+
+
+async def blocking(function, *args, **kwargs):
+    """Calls `function` on the loop's default executor, for the git and file I/O of the project"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, functools.partial(function, *args, **kwargs))
+
+
+class BlockingContext(object):
+    """Enters and exits a blocking context manager on the loop's default executor"""
+
+    def __init__(self, context):
+        self.context = context
+
+    async def __aenter__(self):
+        return await blocking(self.context.__enter__)
+
+    async def __aexit__(self, *exc_info):
+        return await blocking(self.context.__exit__, *exc_info)
+
+
+async def run_on_connections(operation, max_concurrency=None, databases=None):
+    """
+    Awaits `operation(engine, db_info)` for every connection, at most `max_concurrency`
+    (default: the MAX_CONCURRENCY setting) at a time, and combines the returned EngineResults.
+    Each connection is established for its operation and closed once it is done. A server that cannot be
+    reached fails the `databases` the operation works on there, without stopping the others.
+    """
+    if max_concurrency is None:
+        max_concurrency = settings.MAX_CONCURRENCY
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or 1))
+    if databases is not None:
+        databases = list(databases)
+
+    async def bounded(db_info):
+        async with semaphore:
+            try:
+                engine = await connect(db_info)
+            except errors.ConnectionError as e:
+                return unreachable_result(db_info, databases, e)
+            try:
+                return await operation(engine, db_info)
+            finally:
+                await disconnect([engine])
+
+    engine_results = await asyncio.gather(*(bounded(db_info) for db_info in database_entries()))
+    return ExecutionResult.combine(engine_results)
+
+
+async def run_for_databases(operation, engine, db_info, db_names):
+    """
+    Awaits `operation(db_name)` for each database on one engine and gathers the failures.
+    The existence of every database is checked with one catalog query up front.
+    """
+    failures = dict()
+    try:
+        existing = await engine.databases_exist(db_names)
+    except Exception as e:
+        failures = dict((db_name, e) for db_name in db_names)
+    else:
+        engine.catalog = dict((name, name in existing) for name in db_names)
+        try:
+            for db_name in db_names:
+                try:
+                    await operation(db_name)
+                except Exception as e:
+                    failures[db_name] = e
+        finally:
+            engine.catalog = None
+    return engine_result(db_info, db_names, failures)
+
+
+# the mapping is read and saved on the loop's executor, as it may be a file or a database
+def _record_branch(project, branch_name, dry_run):
+    with repo_mapping.RepoMapping(project.root) as mapping:
+        mapping.get_or_create(branch_name, dry_run=dry_run)
+
+
+def _load_mapping(project):
+    with repo_mapping.RepoMapping(project.root) as mapping:
+        return dict(mapping)
+
+
+def _lookup_branch(project, branch_name):
+    with repo_mapping.RepoMapping(project.root) as mapping:
+        return mapping.get(branch_name)
+
+
+def _select_branches(project, pattern, regex):
+    with repo_mapping.RepoMapping(project.root) as mapping:
+        return mapping.select(pattern, regex=regex)
+
+
+def _remove_branches(project, *branches):
+    with repo_mapping.RepoMapping(project.root) as mapping:
+        mapping.remove(*branches)
+
+
+async def create_databases(branch_name, template=None, dry_run=False, project=None):
+    """Create a database for the given git branch across all connections"""
+    if project is None:
+        project = await blocking(get_project)
+    db_name = utils.get_database_name(branch_name)
+
+    async def create(engine, db_info):
+        _template = template or db_info.get("TEMPLATE", settings.DATABASE_TEMPLATE)
+        options = dict(template=_template)
+        if _template is not None:
+            strategy = await blocking(clone_strategy, engine, db_info, project)
+            if strategy is not None:
+                options["strategy"] = strategy
+        return await run_for_databases(
+            lambda name: engine.create_database(name, **options),
+            engine, db_info, [db_name])
+
+    result = await run_on_connections(create, databases=[db_name])
+    await blocking(_record_branch, project, branch_name, dry_run)
+    return result
+
+
+def _delete_databases(db_names, force=None):
+    """
+    Returns the operation that deletes the databases on a single engine in one bulk drop.
+    With `force` (default: the FORCE_DELETE setting), sessions still using the databases are terminated.
+    """
+    if force is None:
+        force = settings.FORCE_DELETE
+    db_names = list(OrderedDict.fromkeys(db_names))
+
+    async def delete(engine, db_info):
+        try:
+            failures = await engine.delete_databases(db_names, force=force)
+        except Exception as e:
+            failures = dict((db_name, e) for db_name in db_names)
+        return engine_result(db_info, db_names, failures)
+    return delete
+
+
+async def _delete_everywhere(db_names, force=None):
+    """Deletes the databases on every connection"""
+    db_names = list(OrderedDict.fromkeys(db_names))
+    return await run_on_connections(_delete_databases(db_names, force=force), databases=db_names)
+
+
+async def delete_all_databases(project=None, force=None):
+    """Deletes every database associated with the current project"""
+    if project is None:
+        project = await blocking(get_project)
+    mapping = await blocking(_load_mapping, project)
+    result = await _delete_everywhere(sorted(mapping.values()), force=force)
+    await blocking(_remove_branches, project, *mapping)
+    return result
+
+
+async def delete_databases(branch_name, project=None, force=None):
+    """Delete the database for the associated branch across all database connections"""
+    if project is None:
+        project = await blocking(get_project)
+    db_name = await blocking(_lookup_branch, project, branch_name)
+    if db_name is None:
+        raise Exception("No database registered for branch '{}'".format(branch_name))
+    result = await _delete_everywhere([db_name], force=force)
+    await blocking(_remove_branches, project, branch_name)
+    return result
+
+
+async def delete_matching_databases(pattern, project=None, force=None, regex=False):
+    """Deletes the databases of every branch matching a glob pattern, or a regular expression with `regex`"""
+    if project is None:
+        project = await blocking(get_project)
+    selected = await blocking(_select_branches, project, pattern, regex)
+    if not selected:
+        raise Exception("No database registered for branches matching '{}'".format(pattern))
+    result = await _delete_everywhere(selected.values(), force=force)
+    await blocking(_remove_branches, project, *selected)
+    return result
+
+
+async def clean_databases(project=None, force=None):
+    """Delete all databases with stale branches"""
+    async with BlockingContext(_stale_databases(project)) as stale_databases:
+        result = await _delete_everywhere(stale_databases, force=force)
+    return result
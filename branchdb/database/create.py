@@ -4,24 +4,138 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from branchdb import git_tools, repo_mapping, utils
+import timeit
+from collections import namedtuple
+from branchdb import cache, errors, repo_mapping, utils
 from branchdb.conf import settings
-from . import get_database_connections, ExecutionResult
+from branchdb.project import get_project
+from . import run_on_connections, run_for_databases, pool
+from .shared import connection_params, connection_pool, database_entries, describe_connection
 
+AUTO_STRATEGY = "auto"
+# outside the naming scheme, so the benchmark never touches the database of a branch
+BENCH_DATABASE = "branchdb_bench_{}"
 
-def create_databases(branch_name, template=None, dry_run=False):
-    """Create a database for the given git branch across all connections"""
-    project_root = git_tools.get_project_root()
+CloneBenchmark = namedtuple("CloneBenchmark", ["connection", "strategy", "timings", "errors"])
+
+
+def clone_strategy(engine, db_info, project):
+    """
+    Returns the strategy to copy templates with on the connection, or None for the server's default.
+    "auto" uses the winner of the last `branchdb tools --bench-clone` on the connection.
+    The global CLONE_STRATEGY is ignored by the engines without it, unlike the one of an entry.
+    """
+    strategy = db_info.get("CLONE_STRATEGY")
+    if strategy is None and settings.CLONE_STRATEGY in (AUTO_STRATEGY,) + tuple(engine.clone_strategies):
+        strategy = settings.CLONE_STRATEGY
+    if strategy == AUTO_STRATEGY:
+        strategy = cache.get_clone_strategy(project.root, describe_connection(db_info))
+    if strategy is None or not engine.clone_strategies:
+        return None
+    if strategy not in engine.clone_strategies:
+        raise errors.ImproperlyConfigured("Unknown clone strategy '{}' for '{}'".format(
+            strategy, describe_connection(db_info)))
+    return strategy
+
+
+def template_source(db_info):
+    """
+    Returns the connection parameters of the server the connection copies its template from,
+    or None when the template lives on the same server. TEMPLATE_SERVER names the ALIAS of another entry.
+    """
+    alias = db_info.get("TEMPLATE_SERVER")
+    if alias is None:
+        return None
+    for source in settings.DATABASES:
+        if source.get("ALIAS") == alias and source is not db_info:
+            return connection_params(source)
+    error = "No database connection has the ALIAS '{}' for '{}' to copy its template from".format(
+        alias, describe_connection(db_info))
+    raise errors.ImproperlyConfigured(error)
+
+
+def create_databases(branch_name, template=None, dry_run=False, project=None, progress=None):
+    """
+    Create a database for the given git branch across all connections.
+    `progress` is called with a CopyProgress while templates are copied from another server.
+    """
+    if project is None:
+        project = get_project()
     db_name = utils.get_database_name(branch_name)
-    success = len(settings.DATABASES)
-    for engine, db_info in get_database_connections():
+
+    def create(engine, db_info):
         _template = template or db_info.get("TEMPLATE", settings.DATABASE_TEMPLATE)
+        source = template_source(db_info) if _template is not None else None
+        if source is not None:
+            jobs = db_info.get("COPY_JOBS", settings.MAX_CONCURRENCY)
+            return run_for_databases(
+                lambda name: engine.copy_database(name, _template, source, jobs=jobs, progress=progress),
+                engine, db_info, [db_name])
+
+        options = dict(template=_template)
+        if _template is not None:
+            strategy = clone_strategy(engine, db_info, project)
+            if strategy is not None:
+                options["strategy"] = strategy
+
+        def create_database(name):
+            if _template is not None and pool.claim_spare(engine, db_info, name, _template):
+                return True
+            return engine.create_database(name, **options)
+        return run_for_databases(create_database, engine, db_info, [db_name])
+
+    result = run_on_connections(create, databases=[db_name])
+    with repo_mapping.RepoMapping(project.root) as mapping:
+        mapping.get_or_create(branch_name, dry_run=dry_run)
+    return result
+
+
+def bench_clone_strategies(project=None):
+    """
+    Times copying the template with each clone strategy, one connection at a time, and records
+    the fastest strategy of every connection for the "auto" CLONE_STRATEGY.
+    Connections without a template or with a single strategy are skipped.
+    """
+    if project is None:
+        project = get_project()
+    import uuid
+    db_name = BENCH_DATABASE.format(uuid.uuid4().hex[:12])
+    benchmarks = list()
+    for db_info in database_entries():
+        engine = connection_pool.acquire(db_info)
         try:
-            engine.create_database(db_name, template=_template)
+            template = db_info.get("TEMPLATE", settings.DATABASE_TEMPLATE)
+            if template is None or len(engine.clone_strategies) < 2:
+                continue
+            benchmarks.append(_bench_clone(engine, db_info, template, db_name, project))
+        finally:
+            connection_pool.release(engine, db_info)
+    return benchmarks
+
+
+def _bench_clone(engine, db_info, template, db_name, project):
+    connection = describe_connection(db_info)
+    timings = dict()
+    failures = dict()
+    for strategy in engine.clone_strategies:
+        try:
+            timings[strategy] = _time_clone(engine, template, db_name, strategy)
         except Exception as e:
-            print(e)
-            success -= 1
-            continue
-    with repo_mapping.RepoMapping(project_root) as mapping:
-        mapping.get_or_create(branch_name, dry_run=dry_run)
-    return ExecutionResult(success=success, total=len(settings.DATABASES))
+            failures[strategy] = e
+    winner = None
+    if timings:
+        winner = min(timings, key=timings.get)
+        cache.set_clone_strategy(project.root, connection, winner, timings)
+    return CloneBenchmark(connection, winner, timings, failures)
+
+
+def _time_clone(engine, template, db_name, strategy):
+    if engine.database_exists(db_name):
+        raise errors.DatabaseError("Database '{}' already exists.".format(db_name))
+    start = timeit.default_timer()
+    try:
+        engine.create_database(db_name, template=template, strategy=strategy)
+        return timeit.default_timer() - start
+    finally:
+        if engine.database_exists(db_name):
+            engine.delete_database(db_name, force=True)
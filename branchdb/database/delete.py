@@ -4,80 +4,91 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from collections import OrderedDict
 from contextlib import contextmanager
-from branchdb import git_tools, repo_mapping
+from branchdb import repo_mapping
 from branchdb.conf import settings
-from . import get_database_connections, ExecutionResult
+from branchdb.project import get_project
+from . import run_on_connections, engine_result
 
 
-def _delete_databases(engine, db_names):
-    success = len(db_names)
-    for db_name in db_names:
+def _delete_databases(db_names, force=None):
+    """
+    Returns the operation that deletes the databases on a single engine in one bulk drop.
+    With `force` (default: the FORCE_DELETE setting), sessions still using the databases are terminated.
+    """
+    if force is None:
+        force = settings.FORCE_DELETE
+    db_names = list(OrderedDict.fromkeys(db_names))
+
+    def delete(engine, db_info):
         try:
-            engine.delete_database(db_name)
+            failures = engine.delete_databases(db_names, force=force)
         except Exception as e:
-            print(e)
-            success -= 1
-            continue
-    return success
+            failures = dict((db_name, e) for db_name in db_names)
+        return engine_result(db_info, db_names, failures)
+    return delete
+
+
+def _delete_everywhere(db_names, force=None):
+    """Deletes the databases on every connection"""
+    db_names = list(OrderedDict.fromkeys(db_names))
+    return run_on_connections(_delete_databases(db_names, force=force), databases=db_names)
 
 
-def delete_all_databases():
+def delete_all_databases(project=None, force=None):
     """Deletes every database associated with the current project"""
-    repo = git_tools.get_repo()
-    project_root = git_tools.get_project_root(repo)
-    with repo_mapping.RepoMapping(project_root) as mapping:
-        total = len(mapping.databases) * len(settings.DATABASES)
-        success = 0
-        for engine, _ in get_database_connections():
-            try:
-                success += _delete_databases(engine, mapping.databases)
-            except Exception as e:
-                print(e)
-                continue
+    if project is None:
+        project = get_project()
+    with repo_mapping.RepoMapping(project.root) as mapping:
+        result = _delete_everywhere(mapping.databases, force=force)
         mapping.remove(*mapping.branches)
-    return ExecutionResult(success=success, total=total)
+    return result
 
 
-def delete_databases(branch_name):
+def delete_databases(branch_name, project=None, force=None):
     """Delete the database for the associated branch across all database connections"""
-    project_root = git_tools.get_project_root()
-    mapping = repo_mapping.RepoMapping(project_root)
-    try:
-        db_name = mapping[branch_name]
-    except KeyError:
-        raise Exception("No database registered for branch '{}'".format(branch_name))
-    success = 0
-    for engine, _ in get_database_connections():
+    if project is None:
+        project = get_project()
+    with repo_mapping.RepoMapping(project.root) as mapping:
         try:
-            success += _delete_databases(engine, [db_name])
-        except Exception as e:
-            print(e)
-            continue
-    mapping.remove(branch_name)
-    return ExecutionResult(success=success, total=len(settings.DATABASES))
+            db_name = mapping[branch_name]
+        except KeyError:
+            raise Exception("No database registered for branch '{}'".format(branch_name))
+        result = _delete_everywhere([db_name], force=force)
+        mapping.remove(branch_name)
+    return result
+
+
+def delete_matching_databases(pattern, project=None, force=None, regex=False):
+    """
+    Deletes the databases of every branch matching a glob pattern (e.g. 'feature/*'),
+    or a regular expression with `regex`, across all database connections
+    """
+    if project is None:
+        project = get_project()
+    with repo_mapping.RepoMapping(project.root) as mapping:
+        selected = mapping.select(pattern, regex=regex)
+        if not selected:
+            raise Exception("No database registered for branches matching '{}'".format(pattern))
+        result = _delete_everywhere(selected.values(), force=force)
+        mapping.remove(*selected)
+    return result
 
 
-def clean_databases():
+def clean_databases(project=None, force=None):
     """Delete all databases with stale branches"""
-    success = 0
-    with _stale_databases() as stale_databases:
-        total = len(stale_databases) * len(settings.DATABASES)
-        for engine, _ in get_database_connections():
-            try:
-                success += _delete_databases(engine, stale_databases)
-            except Exception as e:
-                print(e)
-                continue
-    return ExecutionResult(success=success, total=total)
+    with _stale_databases(project) as stale_databases:
+        result = _delete_everywhere(stale_databases, force=force)
+    return result
 
 
 @contextmanager
-def _stale_databases():
-    repo = git_tools.get_repo()
-    project_root = git_tools.get_project_root(repo)
-    remote_branches = list(ref.name for ref in repo.remote().refs)
-    with repo_mapping.RepoMapping(project_root) as mapping:
+def _stale_databases(project=None):
+    if project is None:
+        project = get_project()
+    remote_branches = list(ref.name for ref in project.repo.remote().refs)
+    with repo_mapping.RepoMapping(project.root) as mapping:
         databases = list(v for k, v in mapping if k not in remote_branches)
         yield databases
         mapping.remove_databases(*databases)
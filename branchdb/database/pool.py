@@ -0,0 +1,170 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import re
+import json
+import time
+from collections import namedtuple
+from branchdb import utils
+from branchdb.conf import settings
+from branchdb.project import get_project
+from . import run_on_connections, engine_result
+
+SPARE_MARKER = "branchdb-spare:"
+SPARE_BRANCH = "spare-{}"
+SPARE_ID_LENGTH = 12
+
+PoolOptions = namedtuple("PoolOptions", ["size", "template", "version", "max_age"])
+
+
+def pool_options(db_info):
+    """Returns the pool settings of a connection, where each DATABASES entry can override the global ones"""
+    return PoolOptions(
+        size=db_info.get("POOL_SIZE", settings.POOL_SIZE) or 0,
+        template=db_info.get("TEMPLATE", settings.DATABASE_TEMPLATE),
+        version=db_info.get("POOL_TEMPLATE_VERSION", settings.POOL_TEMPLATE_VERSION),
+        max_age=db_info.get("POOL_MAX_AGE", settings.POOL_MAX_AGE))
+
+
+def pool_enabled(engine, options):
+    return options.size > 0 and options.template is not None and engine.supports_pool is True
+
+
+def spare_comment(options, created=None):
+    """Returns the comment that tags a database as a spare clone of the pool's template"""
+    tag = {
+        "template": options.template,
+        "version": options.version,
+        "created": time.time() if created is None else created}
+    return SPARE_MARKER + json.dumps(tag, sort_keys=True)
+
+
+def spare_name(spare_id):
+    return utils.get_database_name(SPARE_BRANCH.format(spare_id))
+
+
+def is_spare_name(db_name):
+    """
+    Returns whether the name is one the pool gives its spares. A claimed spare whose tag could not be
+    cleared after the rename keeps the tag, but not the name, so it is never taken for a spare again.
+    """
+    marker = "0" * SPARE_ID_LENGTH
+    head, _, tail = spare_name(marker).rpartition(marker)
+    pattern = "{}[0-9a-f]{{{}}}{}".format(re.escape(head), SPARE_ID_LENGTH, re.escape(tail))
+    return re.match(pattern + r"\Z", db_name) is not None
+
+
+def _usable_since(comment, options, now):
+    """Returns when the spare was cloned, or None if it can not be claimed"""
+    try:
+        tag = json.loads(comment[len(SPARE_MARKER):])
+        created = float(tag["created"])
+    except (ValueError, TypeError, KeyError):
+        return None
+    if tag.get("template") != options.template or tag.get("version") != options.version:
+        return None
+    if options.max_age is not None and now - created > options.max_age:
+        return None
+    return created
+
+
+def spare_databases(engine, options):
+    """
+    Returns the spares that can be claimed, oldest first, and the spares that are stale because
+    they were cloned from another template (or template version) or are older than the max age.
+    """
+    now = time.time()
+    usable = list()
+    stale = list()
+    for name, comment in sorted(engine.commented_databases(SPARE_MARKER).items()):
+        if is_spare_name(name) is False:
+            continue
+        created = _usable_since(comment, options, now)
+        if created is None:
+            stale.append(name)
+        else:
+            usable.append((created, name))
+    return list(name for _, name in sorted(usable)), stale
+
+
+def claim_spare(engine, db_info, db_name, template):
+    """
+    Renames a spare clone of the template to the database name, returning whether one was claimed.
+    Spares claimed by another process in the meantime are skipped.
+    """
+    options = pool_options(db_info)
+    if pool_enabled(engine, options) is False or template != options.template:
+        return False
+    if engine.database_exists(db_name):
+        return False
+    usable, _ = spare_databases(engine, options)
+    for spare in usable:
+        try:
+            engine.rename_database(spare, db_name)
+        except Exception:
+            continue
+        try:
+            engine.comment_database(db_name, None)
+        except Exception:
+            # a leftover tag is harmless, since spares are also told apart by their name
+            pass
+        return True
+    return False
+
+
+def refill_pools(project=None):
+    """Drops the stale spares of every connection and clones the template until each pool is full"""
+    import uuid
+    from .create import clone_strategy
+    if project is None:
+        project = get_project()
+
+    def refill(engine, db_info):
+        options = pool_options(db_info)
+        if pool_enabled(engine, options) is False:
+            return engine_result(db_info, [], {})
+        usable, stale = spare_databases(engine, options)
+        failures = engine.delete_databases(stale, force=True) if stale else dict()
+
+        create_options = dict(template=options.template)
+        strategy = clone_strategy(engine, db_info, project)
+        if strategy is not None:
+            create_options["strategy"] = strategy
+        spares = list(spare_name(uuid.uuid4().hex[:SPARE_ID_LENGTH]) for _ in range(options.size - len(usable)))
+        for spare in spares:
+            try:
+                engine.create_database(spare, **create_options)
+            except Exception as e:
+                failures[spare] = e
+                continue
+            try:
+                engine.comment_database(spare, spare_comment(options))
+            except Exception as e:
+                # an untagged clone would never be claimed or drained
+                failures[spare] = e
+                _delete_quietly(engine, spare)
+        return engine_result(db_info, stale + spares, failures)
+
+    return run_on_connections(refill)
+
+
+def _delete_quietly(engine, db_name):
+    try:
+        engine.delete_database(db_name, force=True)
+    except Exception:
+        pass
+
+
+def drain_pools():
+    """Drops every spare clone on every connection"""
+    def drain(engine, db_info):
+        if engine.supports_pool is False:
+            return engine_result(db_info, [], {})
+        spares = sorted(name for name in engine.commented_databases(SPARE_MARKER) if is_spare_name(name))
+        failures = engine.delete_databases(spares, force=True) if spares else dict()
+        return engine_result(db_info, spares, failures)
+
+    return run_on_connections(drain)
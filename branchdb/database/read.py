@@ -4,22 +4,94 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from branchdb import errors, git_tools, repo_mapping
+from branchdb import cache, errors, frozen, mapping_backends, repo_mapping
 from branchdb.conf import settings
+from branchdb.project import get_project
 
+memo = cache.ResolutionMemo()
 
-def get_current_database(slug=None):
+
+def invalidate():
+    """Forgets every database name resolved by this process"""
+    memo.invalidate()
+
+
+def remember(project, slug, db_name, signature):
+    """
+    Caches the database name until the resolution signature changes. Names from a mapping that other
+    machines share can change behind the signature, so they are only memoized for MAPPING_CACHE_TTL seconds.
+    """
+    if mapping_backends.backend_class().shared is False:
+        cache.set_cached_database(project, slug, db_name, signature)
+        memo.set(project, slug, db_name, signature)
+    elif settings.MAPPING_CACHE_TTL:
+        memo.set(project, slug, db_name, signature, ttl=settings.MAPPING_CACHE_TTL)
+
+
+def get_current_database(slug=None, project=None):
     """Get the name of the database for the active branch"""
-    current_branch, project_root = git_tools.get_branch_and_root()
+    frozen_path = frozen.frozen_path()
+    if frozen_path is not None:
+        return frozen.get_frozen_database(frozen_path, slug)
+    if project is None:
+        project = get_project()
+    # the cached names are checked without loading the settings; only names from
+    # a mapping in the project itself are written to the cache
+    signature = cache.resolution_signature(project)
+    db_name = memo.get(project, slug, signature)
+    if db_name is not None:
+        return db_name
+    db_name = cache.get_cached_database(project, slug, signature)
+    if db_name is not None:
+        memo.set(project, slug, db_name, signature)
+        return db_name
+
     default_database = get_default_database(slug)
-    with repo_mapping.RepoMapping(project_root) as mapping:
-        db_name = mapping.get(current_branch, default_database)
+    with repo_mapping.RepoMapping(project.root) as mapping:
+        db_name = mapping.get(project.branch, default_database)
     if db_name is None:
         error = "Unable to retrieve active branch name. Please add a default database to your settings."
         raise errors.ImproperlyConfigured(error)
+    remember(project, slug, db_name, signature)
     return db_name
 
 
+def get_current_databases(project=None):
+    """
+    Get the databases for the active branch across every configured connection in one pass.
+    Returns the connection information of each database, keyed by its 'ALIAS' (default: its 'ENGINE'),
+    with the resolved database name added as 'NAME'.
+    """
+    frozen_path = frozen.frozen_path()
+    if frozen_path is not None:
+        return frozen.get_frozen_databases(frozen_path)
+    if project is None:
+        project = get_project()
+    signature = cache.resolution_signature(project)
+    with repo_mapping.RepoMapping(project.root) as mapping:
+        branch_database = mapping.get(project.branch)
+
+    databases = dict()
+    slugs = set()
+    for db_info in settings.DATABASES:
+        key = db_info.get("ALIAS", db_info["ENGINE"])
+        if key in databases:
+            error = "Multiple databases are keyed as '{}'. Please give each of them an 'ALIAS'.".format(key)
+            raise errors.ImproperlyConfigured(error)
+        db_name = branch_database or db_info.get("DEFAULT", settings.DEFAULT_DATABASE_NAME)
+        if db_name is None:
+            error = "Unable to retrieve active branch name. Please add a default database to your settings."
+            raise errors.ImproperlyConfigured(error)
+        databases[key] = dict(db_info, NAME=db_name)
+
+        slug = db_info["ENGINE"]
+        if slug not in slugs:
+            # the first database of each engine answers `get_current_database(slug)`
+            slugs.add(slug)
+            remember(project, slug, db_name, signature)
+    return databases
+
+
 def get_default_database(slug):
     default_database = settings.DEFAULT_DATABASE_NAME
     try:
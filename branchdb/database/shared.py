@@ -4,26 +4,357 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from collections import namedtuple
+import atexit
+import threading
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
 from branchdb import errors
 from branchdb.conf import settings
 from branchdb.engines import get_engine
 
-ExecutionResult = namedtuple("ExecutionResult", ["total", "success"])
+ExecutionError = namedtuple("ExecutionError", ["connection", "database", "error"])
+EngineResult = namedtuple("EngineResult", ["connection", "total", "success", "errors"])
 
 
-def get_database_connections():
-    """Generator for connecting all databases"""
-    engines = list()
+class ExecutionResult(namedtuple("ExecutionResult", ["total", "success", "errors", "engines"])):
+    """The outcome of an operation across database connections, along with each connection's own result"""
+
+    def __new__(cls, total, success, errors=(), engines=()):
+        return super(ExecutionResult, cls).__new__(cls, total, success, tuple(errors), tuple(engines))
+
+    @classmethod
+    def combine(cls, engine_results):
+        engine_results = list(engine_results)
+        return cls(
+            total=sum(result.total for result in engine_results),
+            success=sum(result.success for result in engine_results),
+            errors=[error for result in engine_results for error in result.errors],
+            engines=engine_results)
+
+
+def describe_connection(db_info):
+    """Returns a short, password-free name for a database connection"""
+    if "ALIAS" in db_info:
+        return db_info["ALIAS"]
+    return "{}@{}:{}".format(db_info.get("ENGINE"), db_info.get("HOST", ""), db_info.get("PORT", ""))
+
+
+def connection_params(db_info):
+    """Returns the arguments that the entry's engine takes to connect"""
+    return get_engine(db_info["ENGINE"]).connection_params(db_info)
+
+
+class ConnectionManager(object):
+    """
+    Hands out connected engines, connecting each server lazily and reusing released connections.
+    At most `max_connections` (default: the MAX_CONNECTIONS setting) stay open; idle connections are
+    closed, least recently used first, to make room, and once every connection is leased, `acquire`
+    waits for one to be released. Closing the manager (or leaving its context) disconnects everything it opened.
+    """
+
+    def __init__(self, max_connections=None):
+        self.max_connections = max_connections
+        self._idle = OrderedDict()
+        self._leased = set()
+        # connections being opened count against the limit before they are leased
+        self._opening = 0
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    @staticmethod
+    def _key(db_info):
+        params = connection_params(db_info)
+        return (db_info["ENGINE"],) + tuple(sorted((key, params[key]) for key in params if key != "password"))
+
+    def _limit(self):
+        if self.max_connections is not None:
+            return self.max_connections
+        return settings.MAX_CONNECTIONS
+
+    def _count(self):
+        return len(self._leased) + self._opening + sum(len(engines) for engines in self._idle.values())
+
+    @property
+    def open_connections(self):
+        with self._lock:
+            return len(self._leased) + sum(len(engines) for engines in self._idle.values())
+
+    def acquire(self, db_info, block=True):
+        """
+        Returns a connected engine for the database, reserved until it is released. An idle connection
+        is checked before it is reused, and replaced when the server dropped it. At the limit, the call waits
+        for a connection to be released, or with `block` False, returns None.
+        """
+        key = self._key(db_info)
+        engine = None
+        evicted = None
+        with self._lock:
+            while True:
+                idle = self._idle.get(key)
+                if idle:
+                    engine = idle.pop()
+                    if not idle:
+                        del self._idle[key]
+                    self._leased.add(engine)
+                    break
+                limit = self._limit()
+                if limit is None or self._count() < limit:
+                    self._opening += 1
+                    break
+                evicted = self._pop_least_recently_used()
+                if evicted is not None:
+                    self._opening += 1
+                    break
+                if block is False:
+                    return None
+                self._released.wait()
+        if evicted is not None:
+            _disconnect(evicted)
+        if engine is not None:
+            if _is_alive(engine):
+                return engine
+            with self._lock:
+                self._leased.discard(engine)
+                self._opening += 1
+            _disconnect(engine)
+        return self._open(db_info)
+
+    def _open(self, db_info):
+        """Connects a new engine in the slot reserved by `acquire`"""
+        try:
+            engine = get_engine(db_info["ENGINE"])()
+            engine.connect(**connection_params(db_info))
+        except Exception:
+            with self._lock:
+                self._opening -= 1
+                self._released.notify()
+            raise
+        engine.manager = self
+        engine.db_info = db_info
+        with self._lock:
+            self._opening -= 1
+            self._leased.add(engine)
+        return engine
+
+    @contextmanager
+    def reserve(self, count):
+        """
+        Holds up to `count` connection slots, without waiting, for connections opened outside the manager
+        (such as connections to one particular database), closing idle connections to make room.
+        Yields the number of slots held, all of them without a limit, until the block ends.
+        """
+        evicted = list()
+        with self._lock:
+            limit = self._limit()
+            if limit is None:
+                reserved = count
+            else:
+                while self._count() + count > limit:
+                    engine = self._pop_least_recently_used()
+                    if engine is None:
+                        break
+                    evicted.append(engine)
+                reserved = max(0, min(count, limit - self._count()))
+            self._opening += reserved
+        for engine in evicted:
+            _disconnect(engine)
+        try:
+            yield reserved
+        finally:
+            with self._lock:
+                self._opening -= reserved
+                self._released.notify_all()
+
+    def _pop_least_recently_used(self):
+        for key, engines in self._idle.items():
+            if engines:
+                engine = engines.pop(0)
+                if not engines:
+                    del self._idle[key]
+                return engine
+        return None
+
+    def release(self, engine, db_info):
+        """Returns the engine to the pool so later operations can reuse its connection"""
+        key = self._key(db_info)
+        with self._lock:
+            if engine not in self._leased:
+                return
+            self._leased.discard(engine)
+            engines = self._idle.pop(key, [])
+            engines.append(engine)
+            # re-inserting keeps the most recently used servers last
+            self._idle[key] = engines
+            self._released.notify()
+
+    def close(self):
+        """Disconnects every connection opened by the manager"""
+        with self._lock:
+            engines = list(self._leased)
+            for idle in self._idle.values():
+                engines.extend(idle)
+            self._leased.clear()
+            self._idle.clear()
+            self._released.notify_all()
+        for engine in engines:
+            engine.manager = None
+            _disconnect(engine)
+
+
+def _is_alive(engine):
+    try:
+        return engine.is_alive() is not False
+    except Exception:
+        return False
+
+
+def _disconnect(engine):
+    try:
+        engine.disconnect()
+    except Exception:
+        pass
+
+
+connection_pool = ConnectionManager()
+atexit.register(connection_pool.close)
+
+
+def close_connections():
+    """Disconnects every pooled connection of this process"""
+    connection_pool.close()
+
+
+def database_entries():
+    """Returns the DATABASES entries, which must name at least one connection"""
     if len(settings.DATABASES) < 1:
         raise errors.ImproperlyConfigured("Please specify at least one database connection in your settings file.")
-    for db_info in settings.DATABASES:
-        engine = get_engine(db_info["ENGINE"])()
-        engine.connect(
-            user=db_info["USER"],
-            password=db_info["PASSWORD"],
-            host=db_info["HOST"],
-            port=db_info["PORT"])
-        engines.append((engine, db_info))
-    for engine, db_info in engines:
-        yield engine, db_info
+    return list(settings.DATABASES)
+
+
+@contextmanager
+def get_database_connections(manager=None):
+    """
+    Yields a generator for connecting all databases, one at a time as they are requested.
+    The engines are leased from the manager (default: the process-wide pool) and released when the block ends.
+    """
+    if manager is None:
+        manager = connection_pool
+    leased = list()
+
+    def connections():
+        for db_info in database_entries():
+            leased.append((manager.acquire(db_info), db_info))
+            yield leased[-1]
+
+    try:
+        yield connections()
+    finally:
+        release_connections(leased)
+
+
+def release_connections(connections):
+    for engine, db_info in connections:
+        if engine.manager is not None:
+            engine.manager.release(engine, db_info)
+
+
+def run_on_connections(operation, connections=None, max_concurrency=None, manager=None, databases=None):
+    """
+    Calls `operation(engine, db_info)` for every connection, at most `max_concurrency`
+    (default: the MAX_CONCURRENCY setting) at a time, and combines the returned EngineResults.
+    By default, each worker leases the engine of its DATABASES entry from the manager (default: the
+    process-wide pool) just for its operation, so MAX_CONNECTIONS below the number of entries makes
+    workers wait for a connection instead of failing. A server that cannot be reached fails the
+    `databases` the operation works on there, without stopping the others. Given (engine, db_info)
+    `connections` are all established up front, and released once every operation is done.
+    """
+    if connections is None:
+        if manager is None:
+            manager = connection_pool
+        if databases is not None:
+            databases = list(databases)
+
+        def leased_operation(db_info):
+            try:
+                engine = manager.acquire(db_info)
+            except errors.ConnectionError as e:
+                return unreachable_result(db_info, databases, e)
+            try:
+                return operation(engine, db_info)
+            finally:
+                manager.release(engine, db_info)
+
+        return _run_all(leased_operation, database_entries(), max_concurrency)
+
+    established = list()
+    try:
+        for connection in connections:
+            established.append(connection)
+        return _run_all(lambda connection: operation(*connection), established, max_concurrency)
+    finally:
+        release_connections(established)
+
+
+def _run_all(function, items, max_concurrency):
+    if max_concurrency is None:
+        max_concurrency = settings.MAX_CONCURRENCY
+    workers = max(1, min(max_concurrency or 1, len(items)))
+    if workers == 1:
+        return ExecutionResult.combine(function(item) for item in items)
+
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(workers)
+    try:
+        engine_results = pool.map(function, items)
+    finally:
+        pool.close()
+        pool.join()
+    return ExecutionResult.combine(engine_results)
+
+
+def run_for_databases(operation, engine, db_info, db_names):
+    """
+    Calls `operation(db_name)` for each database on one engine and gathers the failures.
+    The existence of every database is checked with one catalog query up front.
+    """
+    failures = dict()
+    try:
+        with engine.catalog_snapshot(db_names):
+            for db_name in db_names:
+                try:
+                    operation(db_name)
+                except Exception as e:
+                    failures[db_name] = e
+    except Exception as e:
+        failures = dict((db_name, e) for db_name in db_names)
+    return engine_result(db_info, db_names, failures)
+
+
+def unreachable_result(db_info, db_names, error):
+    """
+    Builds the EngineResult of a connection that could not be established, where every database failed.
+    When the databases are unknown, the error is reported for the connection itself.
+    """
+    if db_names is None:
+        connection = describe_connection(db_info)
+        return EngineResult(
+            connection=connection, total=0, success=0, errors=(ExecutionError(connection, None, error),))
+    return engine_result(db_info, db_names, dict((db_name, error) for db_name in db_names))
+
+
+def engine_result(db_info, db_names, failures):
+    """Builds the EngineResult of one engine from the errors raised for each of its databases"""
+    connection = describe_connection(db_info)
+    failed = tuple(
+        ExecutionError(connection, db_name, failures[db_name]) for db_name in db_names if db_name in failures)
+    return EngineResult(
+        connection=connection,
+        total=len(db_names),
+        success=len(db_names) - len(failed),
+        errors=failed)
@@ -6,5 +6,4 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from .slugs import SlugType
-from .base_engine import get_engine, BaseEngine
-from .postgres.postgres_engine import PostgresEngine
+from .base_engine import get_engine, get_async_engine, BaseEngine
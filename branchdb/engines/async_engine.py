@@ -0,0 +1,88 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import abc
+import six
+from .base_engine import EngineMetaclass, async_engine_register
+
+
+class AsyncEngineMetaclass(EngineMetaclass):
+    registry = async_engine_register
+
+
+@six.add_metaclass(AsyncEngineMetaclass)
+class BaseAsyncEngine(object):
+    """
+    Engine whose database operations are coroutines, for managing databases from an asyncio event loop.
+    Requires Python 3.5+.
+    """
+    slug = None
+    connection = None
+    catalog = None
+    # the strategies `create_database()` accepts for copying a template, if it supports more than one
+    clone_strategies = tuple()
+
+    def __repr__(self):
+        connected = "connected" if self.connected else "unconnected"
+        return "<{cls} {connected}>".format(cls=self.__class__.__name__, connected=connected)
+
+    @property
+    def connected(self):
+        return self.connection is not None
+
+    @abc.abstractmethod
+    async def connect(self, user=None, password=None, host="localhost", port=""):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def disconnect(self):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def all_databases(self, prefix=None):
+        """Returns a list of all database names that currently exist, optionally only those starting with a prefix"""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def create_database(self, database_name, template=None, strategy=None):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def delete_database(self, database_name, force=False):
+        raise NotImplementedError()
+
+    async def database_exists(self, database_name):
+        if self.catalog is not None and database_name in self.catalog:
+            return self.catalog[database_name]
+        return database_name in await self.databases_exist([database_name])
+
+    async def databases_exist(self, database_names):
+        """Returns the set of the given database names that currently exist"""
+        existing = set(await self.all_databases())
+        return set(name for name in database_names if name in existing)
+
+    async def delete_databases(self, database_names, force=False):
+        """
+        Deletes the databases after a single existence query, terminating the sessions still using them
+        when `force` is set. Returns the errors of the databases that were not deleted.
+        """
+        failures = dict()
+        existing = await self.databases_exist(database_names)
+        self.catalog = dict((name, name in existing) for name in database_names)
+        try:
+            for database_name in database_names:
+                try:
+                    await self.delete_database(database_name, force=force)
+                except Exception as e:
+                    failures[database_name] = e
+        finally:
+            self.catalog = None
+        return failures
+
+    def record_database(self, database_name, exists):
+        """Keeps the catalog snapshot in line with a database that was just created or deleted"""
+        if self.catalog is not None and database_name in self.catalog:
+            self.catalog[database_name] = exists
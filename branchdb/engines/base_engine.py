@@ -6,27 +6,92 @@ from __future__ import unicode_literals
 
 import abc
 import six
+from contextlib import contextmanager
+from branchdb import errors, utils
+from .slugs import SlugType
+
+ENTRY_POINT_GROUP = "branchdb.engines"
+BUILTIN_ENGINES = {
+    SlugType.POSTGRESQL: "branchdb.engines.postgres.postgres_engine:PostgresEngine",
+    SlugType.SQLITE: "branchdb.engines.sqlite.sqlite_engine:SqliteEngine",
+    SlugType.MYSQL: "branchdb.engines.mysql.mysql_engine:MysqlEngine",
+    SlugType.REDIS: "branchdb.engines.redis.redis_engine:RedisEngine",
+}
+ASYNC_ENTRY_POINT_GROUP = "branchdb.async_engines"
+BUILTIN_ASYNC_ENGINES = {
+    SlugType.POSTGRESQL: "branchdb.engines.postgres.async_postgres_engine:AsyncPostgresEngine",
+}
 
 engine_register = {}
+async_engine_register = {}
 
 
 def get_engine(slug):
-    """Returns the database engine class for a given slug"""
-    return engine_register[slug]
+    """
+    Returns the database engine class for a given slug, importing it on first use.
+    Slugs are looked up in the built-in engines, then in the "branchdb.engines" entry points,
+    and can also be given as a "module:Class" path.
+    """
+    return _lookup_engine(slug, engine_register, BUILTIN_ENGINES, ENTRY_POINT_GROUP)
+
+
+def get_async_engine(slug):
+    """
+    Returns the asyncio engine class for a given slug, importing it on first use.
+    Async engines have their own registry and "branchdb.async_engines" entry points.
+    """
+    return _lookup_engine(slug, async_engine_register, BUILTIN_ASYNC_ENGINES, ASYNC_ENTRY_POINT_GROUP)
+
+
+def _lookup_engine(slug, register, builtin_engines, entry_point_group):
+    try:
+        return register[slug]
+    except KeyError:
+        pass
+    path = builtin_engines.get(slug) or _entry_point_path(slug, entry_point_group)
+    if path is None and ":" in slug:
+        path = slug
+    if path is None:
+        raise errors.ImproperlyConfigured("No engine is registered for '{}'".format(slug))
+    engine = utils.import_string(path)
+    register.setdefault(slug, engine)
+    return engine
+
+
+def _entry_point_path(slug, group=ENTRY_POINT_GROUP):
+    """Returns the "module:Class" path of the engine entry point named after the slug"""
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        import pkg_resources
+        for entry_point in pkg_resources.iter_entry_points(group, slug):
+            return "{}:{}".format(entry_point.module_name, ".".join(entry_point.attrs))
+        return None
+    found = entry_points()
+    if hasattr(found, "select"):
+        found = found.select(group=group)
+    else:
+        found = found.get(group, [])
+    for entry_point in found:
+        if entry_point.name == slug:
+            return entry_point.value
+    return None
 
 
 class EngineMetaclass(abc.ABCMeta):
+    registry = engine_register
+
     def __init__(cls, name, bases, nmspc):
         super(EngineMetaclass, cls).__init__(name, bases, nmspc)
+        registry = type(cls).registry
         slug = getattr(cls, "slug")
         if slug is None and name.lower().startswith("base") is False:
             raise Exception("Class '{}' must have a slug attribute".format(name))
-        if slug in engine_register:
-            registered = engine_register[slug]
-            print(registered.__name__)
+        if slug in registry:
+            registered = registry[slug]
             if registered.__name__ != name:
                 raise Exception("Class '{}' has conflicting slug of '{}'".format(name, slug))
-        engine_register[slug] = cls
+        registry[slug] = cls
 
     @abc.abstractmethod
     def connect(self, username=None, password=None, host="localhost", port=""):
@@ -37,16 +102,16 @@ class EngineMetaclass(abc.ABCMeta):
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def all_databases(self):
-        """Returns a list of all database names that currently exist"""
+    def all_databases(self, prefix=None):
+        """Returns a list of all database names that currently exist, optionally only those starting with a prefix"""
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def create_database(self, database_name, template=None):
+    def create_database(self, database_name, template=None, strategy=None):
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def delete_database(self, database_name):
+    def delete_database(self, database_name, force=False):
         raise NotImplementedError()
 
 
@@ -54,6 +119,17 @@ class EngineMetaclass(abc.ABCMeta):
 class BaseEngine(object):
     slug = None
     connetion = None
+    manager = None
+    # the DATABASES entry the engine was connected for by its manager
+    db_info = None
+    # the arguments of the last `connect()`
+    _connection_params = None
+    catalog = None
+    # the strategies `create_database()` accepts for copying a template, if it supports more than one
+    clone_strategies = tuple()
+    # engines implementing `commented_databases()`, `comment_database()` and `rename_database()`
+    # can keep a pool of spare clones
+    supports_pool = False
 
     def __repr__(self):
         connected = "connected" if self.connected else "unconnected"
@@ -63,5 +139,103 @@ class BaseEngine(object):
     def connected(self):
         return self.connection is not None
 
+    def acquire_connection(self):
+        """
+        Returns another connected engine to the same server for parallel work, or None when no connection
+        is available. Engines of a manager lease it without waiting, so the manager's limit bounds it;
+        engines outside a manager connect a new one. Hand it back with `release_connection()`.
+        """
+        if self.manager is not None:
+            try:
+                return self.manager.acquire(self.db_info, block=False)
+            except errors.ConnectionError:
+                return None
+        if self._connection_params is None:
+            return None
+        engine = type(self)()
+        try:
+            engine.connect(**self._connection_params)
+        except errors.ConnectionError:
+            return None
+        return engine
+
+    def release_connection(self, engine):
+        """Hands back an engine from `acquire_connection()`"""
+        if self.manager is not None:
+            self.manager.release(engine, self.db_info)
+        else:
+            engine.disconnect()
+
+    @contextmanager
+    def reserve_connections(self, count):
+        """
+        Yields how many of `count` connections opened outside the manager, such as connections to one
+        particular database, fit under the limit of the engine's manager, holding them until the block ends
+        """
+        if self.manager is None:
+            yield count
+            return
+        with self.manager.reserve(count) as reserved:
+            yield reserved
+
+    def is_alive(self):
+        """Returns whether the connection still works, checked before an idle connection is reused"""
+        return True
+
+    @classmethod
+    def connection_params(cls, db_info):
+        """Returns the arguments that `connect()` takes for a DATABASES entry"""
+        return dict(
+            user=db_info["USER"],
+            password=db_info["PASSWORD"],
+            host=db_info["HOST"],
+            port=db_info["PORT"])
+
     def database_exists(self, database_name):
-        return any(db == database_name for db in self.all_databases())
+        if self.catalog is not None and database_name in self.catalog:
+            return self.catalog[database_name]
+        return database_name in self.databases_exist([database_name])
+
+    def databases_exist(self, database_names):
+        """Returns the set of the given database names that currently exist"""
+        existing = set(self.all_databases())
+        return set(name for name in database_names if name in existing)
+
+    def delete_databases(self, database_names, force=False):
+        """
+        Deletes the databases after a single existence query, terminating the sessions still using them
+        when `force` is set. Returns the errors of the databases that were not deleted.
+        """
+        failures = dict()
+        with self.catalog_snapshot(database_names):
+            for database_name in database_names:
+                try:
+                    if force is True:
+                        self.delete_database(database_name, force=True)
+                    else:
+                        self.delete_database(database_name)
+                except Exception as e:
+                    failures[database_name] = e
+        return failures
+
+    def copy_database(self, database_name, template, source, jobs=None, progress=None):
+        """
+        Creates the database as a copy of a template that lives on another server, which `source`
+        holds the connection parameters of (user, password, host and port).
+        """
+        raise errors.DatabaseError("{} can not copy templates from another server".format(self.__class__.__name__))
+
+    @contextmanager
+    def catalog_snapshot(self, database_names):
+        """Answers `database_exists()` for the given databases from a single catalog query until the block exits"""
+        existing = self.databases_exist(database_names)
+        self.catalog = dict((name, name in existing) for name in database_names)
+        try:
+            yield self.catalog
+        finally:
+            self.catalog = None
+
+    def record_database(self, database_name, exists):
+        """Keeps the catalog snapshot in line with a database that was just created or deleted"""
+        if self.catalog is not None and database_name in self.catalog:
+            self.catalog[database_name] = exists
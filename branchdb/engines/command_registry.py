@@ -0,0 +1,67 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import threading
+from branchdb.errors import DatabaseError
+
+COMMAND_EXTENSION = ".sql"
+
+
+class CommandRegistry(object):
+    """
+    The SQL templates of a folder, read once on first use.
+    A template named `<command>.sql` works on every server, while `<command>.<version>.sql`
+    is a variant for servers whose version is at least `<version>` (e.g. `drop.130000.sql`).
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._commands = None
+        self._lock = threading.Lock()
+
+    @property
+    def commands(self):
+        if self._commands is None:
+            with self._lock:
+                if self._commands is None:
+                    self._commands = self._load()
+        return self._commands
+
+    def _load(self):
+        commands = dict()
+        for filename in os.listdir(self.folder):
+            if filename.endswith(COMMAND_EXTENSION) is False:
+                continue
+            name, _, version = filename[:-len(COMMAND_EXTENSION)].partition(".")
+            with io.open(os.path.join(self.folder, filename), encoding="utf-8") as command_file:
+                template = command_file.read()
+            commands.setdefault(name, []).append((int(version or 0), template))
+        for variants in commands.values():
+            variants.sort(key=lambda variant: variant[0], reverse=True)
+        return commands
+
+    def get(self, name, server_version=None):
+        """
+        Returns the newest variant of the command that the server supports.
+        Without a server version, only the variant that works on every server is used.
+        """
+        try:
+            variants = self.commands[name]
+        except KeyError:
+            raise DatabaseError("Unknown command '{}'".format(name))
+        for version, template in variants:
+            if version == 0 or (server_version is not None and version <= server_version):
+                return template
+        raise DatabaseError("Command '{}' is not supported by server version {}".format(name, server_version))
+
+    def supports(self, name, server_version=None):
+        try:
+            self.get(name, server_version)
+        except DatabaseError:
+            return False
+        return True
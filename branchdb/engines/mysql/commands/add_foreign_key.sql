@@ -0,0 +1 @@
+ALTER TABLE {database}.{table} ADD CONSTRAINT {constraint} FOREIGN KEY ({columns}) REFERENCES {referenced_schema}.{referenced_table} ({referenced_columns}) ON UPDATE {update_rule} ON DELETE {delete_rule}
@@ -0,0 +1 @@
+SELECT SCHEMA_NAME FROM information_schema.SCHEMATA
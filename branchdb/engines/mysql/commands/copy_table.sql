@@ -0,0 +1 @@
+INSERT INTO {database}.{table} ({columns}) SELECT {columns} FROM {template}.{table}
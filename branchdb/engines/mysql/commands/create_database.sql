@@ -0,0 +1 @@
+CREATE DATABASE {database}
@@ -0,0 +1 @@
+CREATE DATABASE {database} CHARACTER SET {charset} COLLATE {collation}
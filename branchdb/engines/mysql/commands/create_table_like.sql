@@ -0,0 +1 @@
+CREATE TABLE {database}.{table} LIKE {template}.{table}
@@ -0,0 +1 @@
+SELECT ID FROM information_schema.PROCESSLIST WHERE DB IN %s AND ID <> CONNECTION_ID()
@@ -0,0 +1 @@
+DROP DATABASE {database}
@@ -0,0 +1 @@
+SET SESSION foreign_key_checks = 0, unique_checks = 0
@@ -0,0 +1 @@
+SET SESSION foreign_key_checks = 1, unique_checks = 1
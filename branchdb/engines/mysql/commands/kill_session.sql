@@ -0,0 +1 @@
+KILL %s
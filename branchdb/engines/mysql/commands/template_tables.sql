@@ -0,0 +1 @@
+SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE' ORDER BY COALESCE(DATA_LENGTH, 0) DESC
@@ -0,0 +1,334 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import six
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from branchdb.conf import settings
+from branchdb.errors import DatabaseError, ConnectionError, ImproperlyConfigured
+from branchdb.engines import BaseEngine, SlugType
+from branchdb.engines.command_registry import CommandRegistry
+from branchdb.engines.pipes import pipe
+from branchdb.utils import like_prefix
+
+commands = CommandRegistry(os.path.join(os.path.dirname(__file__), "commands"))
+CLONE_STRATEGIES = ("insert_select", "dump")
+FOREIGN_KEY_RULES = ("CASCADE", "SET NULL", "SET DEFAULT", "RESTRICT", "NO ACTION")
+DEFAULT_PORT = 3306
+
+
+class Keyword(six.text_type):
+    """A part of a command that is inserted as is instead of being quoted as an identifier"""
+
+
+def quote(identifier):
+    return "`{}`".format(identifier.replace("`", "``"))
+
+
+def compose(command, **kwargs):
+    """Fills in the command template, quoting every argument (or list of arguments) as an identifier"""
+    values = dict()
+    for key, value in kwargs.items():
+        if isinstance(value, Keyword):
+            values[key] = value
+        elif isinstance(value, (list, tuple)):
+            values[key] = ", ".join(quote(item) for item in value)
+        else:
+            values[key] = quote(value)
+    return command.format(**values)
+
+
+def client_arguments(params):
+    """Returns the command line options that point `mysqldump` and `mysql` to the server"""
+    arguments = list()
+    for key in ("user", "host", "port"):
+        if params.get(key) not in (None, ""):
+            arguments.append("--{}={}".format(key, params[key]))
+    return arguments
+
+
+def client_environment(params):
+    """Returns the environment of `mysqldump` and `mysql`, which keeps the password off the command line"""
+    environment = dict(os.environ)
+    if params.get("password"):
+        environment["MYSQL_PWD"] = params["password"]
+    return environment
+
+
+class MysqlEngine(BaseEngine):
+    """
+    MySQL and MariaDB engine, built on PyMySQL (`pip install branchdb[mysql]`).
+    Servers have no `CREATE DATABASE ... TEMPLATE`, so templates are cloned table by table with
+    `CREATE TABLE ... LIKE` and `INSERT ... SELECT` over several connections ("insert_select"),
+    or by piping `mysqldump` into `mysql` ("dump"), which also copies views, triggers and routines.
+    """
+    slug = SlugType.MYSQL
+    connection = None
+    _connection_params = None
+
+    def connect(self, user=None, password=None, host="localhost", port=""):
+        try:
+            import pymysql
+        except ImportError:
+            error = "The MySQL engine requires PyMySQL. Install it with 'pip install branchdb[mysql]'"
+            raise ImproperlyConfigured(error)
+        try:
+            self.connection = pymysql.connect(
+                user=user,
+                password=password or "",
+                host=host or "localhost",
+                port=int(port or DEFAULT_PORT),
+                charset="utf8mb4",
+                autocommit=True)
+        except Exception:
+            raise ConnectionError("Unable to connect to MySQL database")
+        self._connection_params = dict(user=user, password=password, host=host, port=port)
+        return self.connection
+
+    def disconnect(self):
+        return self.connection.close()
+
+    def is_alive(self):
+        if self.connection is None:
+            return False
+        try:
+            self.connection.ping(reconnect=False)
+        except Exception:
+            return False
+        return True
+
+    def command(self, command_name, **kwargs):
+        return compose(commands.get(command_name), **kwargs)
+
+    @contextmanager
+    def get_cursor(self):
+        if self.connection is None:
+            raise DatabaseError("Must call 'MysqlEngine.connect()' before retrieving a cursor")
+        cursor = self.connection.cursor()
+        yield cursor
+        cursor.close()
+
+    def _execute(self, cursor, command, params=None):
+        cursor.execute(command, params)
+
+    def _query(self, command, params=None):
+        with self.get_cursor() as cursor:
+            self._execute(cursor, command, params)
+            return list(cursor.fetchall())
+
+    def all_databases(self, prefix=None):
+        if prefix:
+            rows = self._query(self.command("all_databases_like"), [like_prefix(prefix)])
+        else:
+            rows = self._query(self.command("all_databases"))
+        return list(row[0] for row in rows)
+
+    def databases_exist(self, database_names):
+        database_names = list(database_names)
+        if not database_names:
+            return set()
+        return set(row[0] for row in self._query(self.command("databases_exist"), [database_names]))
+
+    @property
+    def clone_strategies(self):
+        return CLONE_STRATEGIES
+
+    def create_database(self, database_name, template=None, strategy=None, max_concurrency=None):
+        """
+        Creates the database, cloning the template's tables over at most `max_concurrency`
+        (default: the MAX_CONCURRENCY setting) connections unless the "dump" strategy is used.
+        """
+        if self.database_exists(database_name) is True:
+            raise DatabaseError("Database '{}' already exists.".format(database_name))
+        if strategy is not None and strategy not in CLONE_STRATEGIES:
+            raise DatabaseError("Unknown clone strategy '{}'".format(strategy))
+        if template is None:
+            with self.get_cursor() as cursor:
+                self._execute(cursor, self.command("create_database", database=database_name))
+            self.record_database(database_name, True)
+            return True
+
+        charsets = self._query(self.command("database_charset"), [template])
+        if not charsets:
+            raise DatabaseError("Template '{}' does not exist.".format(template))
+        charset, collation = charsets[0]
+        create = self.command(
+            "create_database_charset",
+            database=database_name,
+            charset=charset,
+            collation=collation)
+        with self.get_cursor() as cursor:
+            self._execute(cursor, create)
+        try:
+            if strategy == "dump":
+                self._dump(template, database_name)
+            else:
+                self._clone_tables(template, database_name, max_concurrency)
+        except Exception:
+            # a partial clone would pass for a working database
+            with self.get_cursor() as cursor:
+                self._execute(cursor, self.command("delete_database_if_exists", database=database_name))
+            raise
+        self.record_database(database_name, True)
+        return True
+
+    def _clone_tables(self, template, database_name, max_concurrency=None):
+        """Copies the template's tables, largest first, then adds their foreign keys once every row is in place"""
+        tables = list(row[0] for row in self._query(self.command("template_tables"), [template]))
+        columns = OrderedDict((table, []) for table in tables)
+        for table, column in self._query(self.command("template_columns"), [template]):
+            if table in columns:
+                columns[table].append(column)
+        foreign_keys = self._query(self.command("template_foreign_keys"), [template])
+
+        if max_concurrency is None:
+            max_concurrency = settings.MAX_CONCURRENCY
+        workers = max(1, min(max_concurrency or 1, len(tables)))
+        pending = list(tables)
+        failures = list()
+        lock = threading.Lock()
+
+        def clone(index):
+            # every worker but the first clones on a connection of its own from `acquire_connection()`,
+            # leaving its tables to the others when no connection is available
+            engine = self
+            if index > 0:
+                engine = self.acquire_connection()
+                if engine is None:
+                    return
+            try:
+                engine._disable_checks()
+                while not failures:
+                    with lock:
+                        if not pending:
+                            return
+                        table = pending.pop(0)
+                    engine._clone_table(template, database_name, table, columns[table])
+            except Exception as e:
+                failures.append(e)
+            finally:
+                try:
+                    engine._enable_checks()
+                finally:
+                    # pooled connections go back with their session's checks restored
+                    if engine is not self:
+                        self.release_connection(engine)
+
+        if workers == 1:
+            clone(0)
+        else:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(workers)
+            try:
+                pool.map(clone, range(workers))
+            finally:
+                pool.close()
+                pool.join()
+        if failures:
+            raise failures[0]
+        self._add_foreign_keys(template, database_name, foreign_keys)
+
+    def _clone_table(self, template, database_name, table, columns):
+        names = dict(database=database_name, template=template, table=table)
+        with self.get_cursor() as cursor:
+            self._execute(cursor, self.command("create_table_like", **names))
+            if columns:
+                self._execute(cursor, self.command("copy_table", columns=columns, **names))
+
+    def _add_foreign_keys(self, template, database_name, foreign_keys):
+        """`CREATE TABLE ... LIKE` leaves out foreign keys, which are added back without checking the copied rows"""
+        constraints = OrderedDict()
+        for table, name, column, schema, referenced_table, referenced_column, update_rule, delete_rule in foreign_keys:
+            constraint = constraints.setdefault((table, name), dict(
+                # references within the template point to the clone's tables
+                referenced_schema=database_name if schema == template else schema,
+                referenced_table=referenced_table,
+                update_rule=update_rule,
+                delete_rule=delete_rule,
+                columns=[],
+                referenced_columns=[]))
+            constraint["columns"].append(column)
+            constraint["referenced_columns"].append(referenced_column)
+        if not constraints:
+            return
+        self._disable_checks()
+        try:
+            with self.get_cursor() as cursor:
+                for (table, name), constraint in constraints.items():
+                    for rule in ("update_rule", "delete_rule"):
+                        if constraint[rule] not in FOREIGN_KEY_RULES:
+                            raise DatabaseError("Unknown foreign key rule '{}'".format(constraint[rule]))
+                        constraint[rule] = Keyword(constraint[rule])
+                    self._execute(cursor, self.command(
+                        "add_foreign_key", database=database_name, table=table, constraint=name, **constraint))
+        finally:
+            self._enable_checks()
+
+    def _disable_checks(self):
+        with self.get_cursor() as cursor:
+            self._execute(cursor, self.command("disable_checks"))
+
+    def _enable_checks(self):
+        with self.get_cursor() as cursor:
+            self._execute(cursor, self.command("enable_checks"))
+
+    def _dump(self, template, database_name):
+        params = self._connection_params or dict()
+        dump_command = ["mysqldump", "--single-transaction", "--routines", "--triggers"] + client_arguments(params)
+        restore_command = ["mysql"] + client_arguments(params)
+        pipe(
+            dump_command + [template],
+            client_environment(params),
+            restore_command + [database_name],
+            client_environment(params))
+
+    def delete_database(self, database_name, force=False):
+        if self.database_exists(database_name) is False:
+            raise DatabaseError("Database '{}' does not exist.".format(database_name))
+        if force is True:
+            self._kill_sessions([database_name])
+        with self.get_cursor() as cursor:
+            self._execute(cursor, self.command("delete_database", database=database_name))
+        self.record_database(database_name, False)
+        return True
+
+    def delete_databases(self, database_names, force=False):
+        """
+        Drops the databases after a single existence query. With `force`, the sessions still using
+        them are found with a single query and killed. Returns the errors of the databases that were not dropped.
+        """
+        database_names = list(database_names)
+        existing = self.databases_exist(database_names)
+        failures = dict()
+        names = list()
+        for name in database_names:
+            if name in existing:
+                names.append(name)
+            else:
+                failures[name] = DatabaseError("Database '{}' does not exist.".format(name))
+        if names and force is True:
+            self._kill_sessions(names)
+        for name in names:
+            try:
+                with self.get_cursor() as cursor:
+                    # databases dropped since the existence check are not an error
+                    self._execute(cursor, self.command("delete_database_if_exists", database=name))
+            except Exception as e:
+                failures[name] = e
+            else:
+                self.record_database(name, False)
+        return failures
+
+    def _kill_sessions(self, database_names):
+        for row in self._query(self.command("database_sessions"), [list(database_names)]):
+            try:
+                with self.get_cursor() as cursor:
+                    self._execute(cursor, self.command("kill_session"), [row[0]])
+            except Exception:
+                # the session ended on its own
+                pass
@@ -0,0 +1,56 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import subprocess
+import tempfile
+from branchdb.errors import DatabaseError
+
+
+def pipe(dump_command, dump_environment, restore_command, restore_environment):
+    """
+    Runs `dump_command` with its output piped straight into `restore_command`, so the dump is never
+    written to disk. Raises DatabaseError when either of them fails.
+    """
+    # the dump's errors go to a file, as a pipe that is only read after the restore could fill up and block the dump
+    with tempfile.TemporaryFile() as dump_errors:
+        dump_returncode = _pipe(dump_command, dump_environment, dump_errors, restore_command, restore_environment)
+        dump_errors.seek(0)
+        if dump_returncode != 0:
+            raise DatabaseError("{} failed: {}".format(
+                dump_command[0], dump_errors.read().decode("utf-8", "replace")))
+
+
+def _pipe(dump_command, dump_environment, dump_errors, restore_command, restore_environment):
+    """Runs the dump into the restore, raising when the restore fails. Returns the exit status of the dump"""
+    try:
+        dump = subprocess.Popen(
+            dump_command,
+            stdout=subprocess.PIPE,
+            stderr=dump_errors,
+            env=dump_environment)
+    except OSError as e:
+        raise DatabaseError("Unable to run {}: {}".format(dump_command[0], e))
+    try:
+        with io.open(os.devnull, "wb") as devnull:
+            restore = subprocess.Popen(
+                restore_command,
+                stdin=dump.stdout,
+                stdout=devnull,
+                stderr=subprocess.PIPE,
+                env=restore_environment)
+    except OSError as e:
+        dump.kill()
+        dump.wait()
+        raise DatabaseError("Unable to run {}: {}".format(restore_command[0], e))
+    # only the restore reads the dump, so the dump notices when the restore exits early
+    dump.stdout.close()
+    _, restore_errors = restore.communicate()
+    dump.wait()
+    if dump.returncode == 0 and restore.returncode != 0:
+        raise DatabaseError("{} failed: {}".format(restore_command[0], restore_errors.decode("utf-8", "replace")))
+    return dump.returncode
@@ -0,0 +1,151 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+import psycopg2
+import psycopg2.extensions
+from branchdb.errors import DatabaseError, ConnectionError
+from branchdb.engines import SlugType
+from branchdb.engines.async_engine import BaseAsyncEngine
+from .postgres_engine import CLONE_STRATEGIES, commands, compose, like_prefix
+
+
+async def wait(connection):
+    """Yields to the event loop until the pending operation of an asynchronous connection completes"""
+    loop = asyncio.get_event_loop()
+    while True:
+        state = connection.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            return
+        if state == psycopg2.extensions.POLL_READ:
+            add, remove = loop.add_reader, loop.remove_reader
+        elif state == psycopg2.extensions.POLL_WRITE:
+            add, remove = loop.add_writer, loop.remove_writer
+        else:
+            raise psycopg2.OperationalError("Unexpected poll state: {}".format(state))
+        ready = loop.create_future()
+        add(connection.fileno(), ready.set_result, None)
+        try:
+            await ready
+        finally:
+            remove(connection.fileno())
+
+
+class AsyncPostgresEngine(BaseAsyncEngine):
+    """
+    PostgreSQL engine built on psycopg2's asynchronous connections.
+    Statements on one engine run one at a time; connect several engines to run them side by side.
+    """
+    slug = SlugType.POSTGRESQL
+    connection = None
+
+    def __init__(self):
+        self._lock = None
+        self._server_version = None
+
+    async def connect(self, user=None, password=None, host="localhost", port=""):
+        try:
+            self.connection = psycopg2.connect(
+                dbname="postgres", user=user, password=password, host=host, port=port, async_=1)
+            await wait(self.connection)
+        except Exception:
+            self.connection = None
+            raise ConnectionError("Unable to connect to PostgreSQL database")
+        self._lock = asyncio.Lock()
+        self._server_version = None
+        return self.connection
+
+    @property
+    def server_version(self):
+        """The version of the connected server, or None when unconnected"""
+        if self._server_version is None and self.connection is not None:
+            self._server_version = self.connection.server_version
+        return self._server_version
+
+    def command(self, command_name, **kwargs):
+        """Returns the newest form of the command that this server supports"""
+        return compose(commands.get(command_name, self.server_version), **kwargs)
+
+    def supports(self, command_name):
+        return commands.supports(command_name, self.server_version)
+
+    async def disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    async def _execute(self, command, params=None, fetch=False):
+        if self.connection is None:
+            raise DatabaseError("Must call 'AsyncPostgresEngine.connect()' before executing a command")
+        async with self._lock:
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute(command, params)
+                await wait(self.connection)
+                if fetch is True:
+                    return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    async def all_databases(self, prefix=None):
+        if prefix:
+            rows = await self._execute(self.command("all_databases_like"), [like_prefix(prefix)], fetch=True)
+        else:
+            rows = await self._execute(self.command("all_databases"), fetch=True)
+        return list(row[0] for row in rows)
+
+    async def databases_exist(self, database_names):
+        database_names = list(database_names)
+        if not database_names:
+            return set()
+        rows = await self._execute(self.command("databases_exist"), [database_names], fetch=True)
+        return set(row[0] for row in rows)
+
+    @property
+    def clone_strategies(self):
+        """The strategies this server can copy a template with (PostgreSQL 15+)"""
+        if self.supports("create_template_database_strategy"):
+            return CLONE_STRATEGIES
+        return tuple()
+
+    async def create_database(self, database_name, template=None, strategy=None):
+        if await self.database_exists(database_name) is True:
+            raise DatabaseError("Database '{}' already exists.".format(database_name))
+        if strategy is not None and strategy not in CLONE_STRATEGIES:
+            raise DatabaseError("Unknown clone strategy '{}'".format(strategy))
+        if template is None:
+            create = self.command("create_database", database=database_name)
+        elif strategy is not None and strategy in self.clone_strategies:
+            create = self.command(
+                "create_template_database_strategy",
+                database=database_name,
+                template=template,
+                strategy=strategy)
+        else:
+            create = self.command(
+                "create_template_database",
+                database=database_name,
+                template=template)
+        await self._execute(create)
+        privileges = self.command(
+            "grant_privileges",
+            database=database_name,
+            user=self.connection.info.user)
+        await self._execute(privileges)
+        self.record_database(database_name, True)
+        return True
+
+    async def delete_database(self, database_name, force=False):
+        if await self.database_exists(database_name) is False:
+            raise DatabaseError("Database '{}' does not exist.".format(database_name))
+        if force is True and self.supports("delete_database_force"):
+            await self._execute(self.command("delete_database_force", database=database_name))
+        else:
+            if force is True:
+                await self._execute(self.command("terminate_backends"), [[database_name]], fetch=True)
+            await self._execute(self.command("delete_database", database=database_name))
+        self.record_database(database_name, False)
+        return True
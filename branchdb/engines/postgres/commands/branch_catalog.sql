@@ -0,0 +1 @@
+SELECT branch, database FROM branchdb_catalog WHERE namespace = %s
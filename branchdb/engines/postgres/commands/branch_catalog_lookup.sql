@@ -0,0 +1 @@
+SELECT database FROM branchdb_catalog WHERE namespace = %s AND branch = %s
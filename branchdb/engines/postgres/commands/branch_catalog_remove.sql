@@ -0,0 +1 @@
+DELETE FROM branchdb_catalog WHERE namespace = %s AND branch = %s
@@ -0,0 +1 @@
+INSERT INTO branchdb_catalog (namespace, branch, database) VALUES (%s, %s, %s) ON CONFLICT (namespace, branch) DO UPDATE SET database = EXCLUDED.database
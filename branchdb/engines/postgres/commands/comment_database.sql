@@ -0,0 +1 @@
+COMMENT ON DATABASE {database} IS %s
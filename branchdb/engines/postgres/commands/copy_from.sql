@@ -0,0 +1 @@
+COPY {schema}.{table} FROM STDIN
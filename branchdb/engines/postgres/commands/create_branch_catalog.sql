@@ -0,0 +1 @@
+CREATE TABLE IF NOT EXISTS branchdb_catalog (namespace text NOT NULL, branch text NOT NULL, database text NOT NULL, PRIMARY KEY (namespace, branch))
@@ -0,0 +1 @@
+CREATE DATABASE {database} TEMPLATE {template} STRATEGY {strategy}
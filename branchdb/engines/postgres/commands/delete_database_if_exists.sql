@@ -0,0 +1 @@
+DROP DATABASE IF EXISTS {database}
@@ -0,0 +1 @@
+SELECT pg_export_snapshot()
@@ -0,0 +1 @@
+SELECT EXISTS (SELECT 1 FROM pg_largeobject_metadata)
@@ -0,0 +1 @@
+ALTER DATABASE {database} RENAME TO {name}
@@ -0,0 +1 @@
+SELECT schemaname, sequencename, last_value FROM pg_sequences WHERE last_value IS NOT NULL
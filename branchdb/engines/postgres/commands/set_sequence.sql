@@ -0,0 +1 @@
+SELECT setval(%s::regclass, %s)
@@ -0,0 +1 @@
+SET TRANSACTION SNAPSHOT %s
@@ -4,31 +4,39 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import io
 import os
 import psycopg2.sql
+import psycopg2.errorcodes
 from contextlib import contextmanager
+from branchdb.conf import settings
+from branchdb.utils import like_prefix
 from branchdb.errors import DatabaseError, ConnectionError
 from branchdb.engines import BaseEngine, SlugType
+from branchdb.engines.command_registry import CommandRegistry
 
+commands = CommandRegistry(os.path.join(os.path.dirname(__file__), "commands"))
+CLONE_STRATEGIES = ("wal_log", "file_copy")
 
-def get_command(command_name, *args, **kwargs):
-    command_file = "{}.sql".format(command_name)
-    command_path = os.path.join(os.path.dirname(__file__), "commands", command_file)
-    with io.open(command_path) as data:
-        command = data.read()
-    composed_args = tuple()
-    for arg in args:
-        composed_args += psycopg2.sql.Identifier(arg)
+
+def compose(command, *args, **kwargs):
+    """Fills in the command template, quoting every argument as an identifier"""
+    composed_args = tuple(psycopg2.sql.Identifier(arg) for arg in args)
     composed_kwargs = dict()
     for key, value in kwargs.items():
         composed_kwargs[key] = psycopg2.sql.Identifier(value)
     return psycopg2.sql.SQL(command).format(*composed_args, **composed_kwargs)
 
 
+def get_command(command_name, *args, **kwargs):
+    """Returns the form of the command that works on every server"""
+    return compose(commands.get(command_name), *args, **kwargs)
+
+
 class PostgresEngine(BaseEngine):
     slug = SlugType.POSTGRESQL
     connection = None
+    supports_pool = True
+    _server_version = None
 
     def connect(self, user=None, password=None, host="localhost", port=""):
         try:
@@ -36,8 +44,24 @@ class PostgresEngine(BaseEngine):
         except Exception:
             raise ConnectionError("Unable to connect to PostgreSQL database")
         self.connection.autocommit = True
+        self._server_version = None
+        self._connection_params = dict(user=user, password=password, host=host, port=port)
         return self.connection
 
+    @property
+    def server_version(self):
+        """The version of the connected server, or None when unconnected"""
+        if self._server_version is None and self.connection is not None:
+            self._server_version = self.connection.server_version
+        return self._server_version
+
+    def command(self, command_name, **kwargs):
+        """Returns the newest form of the command that this server supports"""
+        return compose(commands.get(command_name, self.server_version), **kwargs)
+
+    def supports(self, command_name):
+        return commands.supports(command_name, self.server_version)
+
     @contextmanager
     def get_cursor(self):
         if self.connection is None:
@@ -49,43 +73,263 @@ class PostgresEngine(BaseEngine):
     def disconnect(self):
         return self.connection.close()
 
-    def all_databases(self):
+    def is_alive(self):
+        if self.connection is None or self.connection.closed:
+            return False
+        try:
+            with self.get_cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except psycopg2.Error:
+            return False
+        return True
+
+    def all_databases(self, prefix=None):
         databases = list()
         with self.get_cursor() as cursor:
-            command = get_command("all_databases")
-            self._execute(cursor, command)
+            if prefix:
+                self._execute(cursor, self.command("all_databases_like"), [like_prefix(prefix)])
+            else:
+                self._execute(cursor, self.command("all_databases"))
             for row in cursor.fetchall():
                 databases.append(row[0])
         return databases
 
-    def _execute(self, cursor, command):
-        cursor.execute(command)
+    def databases_exist(self, database_names):
+        database_names = list(database_names)
+        if not database_names:
+            return set()
+        with self.get_cursor() as cursor:
+            self._execute(cursor, self.command("databases_exist"), [database_names])
+            return set(row[0] for row in cursor.fetchall())
+
+    def commented_databases(self, prefix):
+        """Returns the comment of every database whose comment starts with the prefix"""
+        with self.get_cursor() as cursor:
+            self._execute(cursor, self.command("commented_databases"), [like_prefix(prefix)])
+            return dict((row[0], row[1]) for row in cursor.fetchall())
+
+    def comment_database(self, database_name, comment):
+        """Sets (or with None, removes) the comment of a database"""
+        with self.get_cursor() as cursor:
+            self._execute(cursor, self.command("comment_database", database=database_name), [comment])
+            self.connection.commit()
+
+    def rename_database(self, database_name, new_name):
+        with self.get_cursor() as cursor:
+            self._execute(cursor, self.command("rename_database", database=database_name, name=new_name))
+            self.connection.commit()
+        self.record_database(database_name, False)
+        self.record_database(new_name, True)
+        return True
+
+    def branch_catalog(self, namespace, branch=None):
+        """
+        Returns the branches mapped to their databases in the `branchdb_catalog` table, or with `branch`,
+        that branch's database (or None). A server without the table has no branches.
+        """
+        try:
+            with self.get_cursor() as cursor:
+                if branch is None:
+                    self._execute(cursor, self.command("branch_catalog"), [namespace])
+                    return dict((row[0], row[1]) for row in cursor.fetchall())
+                self._execute(cursor, self.command("branch_catalog_lookup"), [namespace, branch])
+                rows = cursor.fetchall()
+                return rows[0][0] if rows else None
+        except psycopg2.ProgrammingError as e:
+            if e.pgcode != psycopg2.errorcodes.UNDEFINED_TABLE:
+                raise
+            return dict() if branch is None else None
+
+    def update_branch_catalog(self, namespace, changes):
+        """
+        Sets the database of each branch in `branchdb_catalog`, or removes the branches changed to None,
+        in a single transaction. The table is created on first use.
+        """
+        self.connection.autocommit = False
+        try:
+            with self.get_cursor() as cursor:
+                self._execute(cursor, self.command("create_branch_catalog"))
+                for branch, database_name in changes.items():
+                    if database_name is None:
+                        self._execute(cursor, self.command("branch_catalog_remove"), [namespace, branch])
+                    else:
+                        self._execute(cursor, self.command("branch_catalog_set"), [namespace, branch, database_name])
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.connection.autocommit = True
 
-    def create_database(self, database_name, template=None):
+    def _execute(self, cursor, command, params=None):
+        cursor.execute(command, params)
+
+    @property
+    def clone_strategies(self):
+        """The strategies this server can copy a template with (PostgreSQL 15+)"""
+        if self.supports("create_template_database_strategy"):
+            return CLONE_STRATEGIES
+        return tuple()
+
+    def create_database(self, database_name, template=None, strategy=None):
         if self.database_exists(database_name) is True:
             raise DatabaseError("Database '{}' already exists.".format(database_name))
+        if strategy is not None and strategy not in CLONE_STRATEGIES:
+            raise DatabaseError("Unknown clone strategy '{}'".format(strategy))
         if template is None:
-            create = get_command("create_database", database=database_name)
+            create = self.command("create_database", database=database_name)
+        elif strategy is not None and strategy in self.clone_strategies:
+            create = self.command(
+                "create_template_database_strategy",
+                database=database_name,
+                template=template,
+                strategy=strategy)
         else:
-            create = get_command(
+            create = self.command(
                 "create_template_database",
                 database=database_name,
                 template=template)
         with self.get_cursor() as cursor:
             self._execute(cursor, create)
-            privileges = get_command(
+            privileges = self.command(
                 "grant_privileges",
                 database=database_name,
                 user=self.connection.info.user)
             self._execute(cursor, privileges)
             self.connection.commit()
+        self.record_database(database_name, True)
         return True
 
-    def delete_database(self, database_name):
+    def copy_database(self, database_name, template, source, jobs=None, progress=None):
+        """
+        Creates the database as a copy of a template on another server, streaming the schema and the
+        tables over `jobs` (default: the MAX_CONCURRENCY setting) pairs of connections without touching the disk.
+        Fewer jobs run when the engine's connection manager has no room for them.
+        `progress` is called with a CopyProgress as the copy advances. Returns the final CopyProgress.
+        """
+        from .template_copy import DatabaseCopy
+        if jobs is None:
+            jobs = settings.MAX_CONCURRENCY
+        self.create_database(database_name)
+        try:
+            # the copy holds a connection to the template, and a pair of connections per job
+            with self.reserve_connections(1 + 2 * max(1, jobs or 1)) as reserved:
+                jobs = max(1, (reserved - 1) // 2)
+                copy = DatabaseCopy(
+                    source, template, self._connection_params, database_name, jobs=jobs, progress=progress)
+                return copy.run()
+        except Exception:
+            # a partial copy would pass for a working database
+            try:
+                self.delete_database(database_name, force=True)
+            except Exception:
+                pass
+            raise
+
+    def delete_database(self, database_name, force=False):
         if self.database_exists(database_name) is False:
             raise DatabaseError("Database '{}' does not exist.".format(database_name))
-        command = get_command("delete_database", database=database_name)
-        with self.get_cursor() as cursor:
-            self._execute(cursor, command)
-            self.connection.commit()
+        if force is True and self.supports("delete_database_force") is False:
+            self._terminate_backends([database_name])
+        self._drop(database_name, force=force)
+        self.record_database(database_name, False)
         return True
+
+    def delete_databases(self, database_names, force=False, max_concurrency=None):
+        """
+        Drops the databases after a single existence query, spreading them over at most `max_concurrency`
+        (default: the MAX_CONCURRENCY setting) connections, as many as the engine's connection manager
+        has room for. With `force`, sessions still using the databases are terminated. Returns the errors
+        of the databases that were not dropped.
+        """
+        database_names = list(database_names)
+        existing = self.databases_exist(database_names)
+        failures = dict()
+        names = list()
+        for name in database_names:
+            if name in existing:
+                names.append(name)
+            else:
+                failures[name] = DatabaseError("Database '{}' does not exist.".format(name))
+        if not names:
+            return failures
+        if force is True and self.supports("delete_database_force") is False:
+            self._terminate_backends(names)
+
+        if max_concurrency is None:
+            max_concurrency = settings.MAX_CONCURRENCY
+        workers = max(1, min(max_concurrency or 1, len(names)))
+        if workers == 1:
+            failures.update(self._drop_batch(names, force))
+            return failures
+
+        from multiprocessing.pool import ThreadPool
+
+        def drop(index):
+            batch = names[index::workers]
+            if index == 0:
+                return self._drop_batch(batch, force)
+            return self._drop_batch_on_other_connection(batch, force)
+
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(drop, range(workers))
+        finally:
+            pool.close()
+            pool.join()
+        leftover = list()
+        for result in results:
+            if isinstance(result, list):
+                leftover.extend(result)
+            else:
+                failures.update(result)
+        # batches that could not get a connection of their own run on this one
+        failures.update(self._drop_batch(leftover, force))
+        return failures
+
+    def _drop_batch(self, database_names, force):
+        failures = dict()
+        for name in database_names:
+            try:
+                # databases dropped since the existence check are not an error
+                self._drop(name, force=force, if_exists=True)
+            except Exception as e:
+                failures[name] = e
+            else:
+                self.record_database(name, False)
+        return failures
+
+    def _drop_batch_on_other_connection(self, database_names, force):
+        """
+        Drops the databases on another connection from `acquire_connection()`, or returns them when none is
+        available, so the connection manager's limit bounds the parallel drops
+        """
+        engine = self.acquire_connection()
+        if engine is None:
+            return database_names
+        try:
+            return engine._drop_batch(database_names, force)
+        finally:
+            self.release_connection(engine)
+
+    def _drop(self, database_name, force=False, if_exists=False):
+        command_name = "delete_database_if_exists" if if_exists is True else "delete_database"
+        if force is True and self.supports(command_name + "_force"):
+            command_name += "_force"
+        command = self.command(command_name, database=database_name)
+        try:
+            with self.get_cursor() as cursor:
+                self._execute(cursor, command)
+                self.connection.commit()
+        except psycopg2.OperationalError as e:
+            # a terminated session may have reconnected before the drop
+            if force is False or e.pgcode != psycopg2.errorcodes.OBJECT_IN_USE:
+                raise
+            self._terminate_backends([database_name])
+            with self.get_cursor() as cursor:
+                self._execute(cursor, command)
+                self.connection.commit()
+
+    def _terminate_backends(self, database_names):
+        with self.get_cursor() as cursor:
+            self._execute(cursor, self.command("terminate_backends"), [list(database_names)])
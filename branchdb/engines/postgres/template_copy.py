@@ -0,0 +1,248 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import timeit
+import threading
+from collections import namedtuple
+import psycopg2
+import psycopg2.extensions
+import psycopg2.sql
+from branchdb.errors import DatabaseError
+from branchdb.engines.pipes import pipe
+from .postgres_engine import commands, compose
+
+
+class CopyProgress(namedtuple("CopyProgress", [
+        "template", "database", "tables", "copied_tables", "total_bytes", "copied_bytes", "elapsed"])):
+    """
+    A snapshot of a running copy. `total_bytes` is the size of the template's tables on disk,
+    which only estimates the amount of data to stream.
+    """
+
+    @property
+    def throughput(self):
+        """The bytes streamed per second so far"""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.copied_bytes / self.elapsed
+
+
+def connect(params, dbname):
+    return psycopg2.connect(
+        dbname=dbname,
+        user=params.get("user"),
+        password=params.get("password"),
+        host=params.get("host"),
+        port=params.get("port"))
+
+
+def libpq_environment(params, dbname):
+    """Returns the environment that points pg_dump and psql to a database, keeping the password off the command line"""
+    environment = dict(os.environ)
+    for key, variable in (("user", "PGUSER"), ("password", "PGPASSWORD"), ("host", "PGHOST"), ("port", "PGPORT")):
+        if params.get(key) not in (None, ""):
+            environment[variable] = str(params[key])
+    environment["PGDATABASE"] = dbname
+    return environment
+
+
+def stream_section(section, source, template, target, database_name, snapshot=None):
+    """Pipes a section of `pg_dump` of the template into `psql` on the target database"""
+    dump_command = ["pg_dump", "--section={}".format(section), "--no-owner", "--no-privileges"]
+    if snapshot is not None:
+        dump_command.append("--snapshot={}".format(snapshot))
+    restore_command = ["psql", "--quiet", "--no-psqlrc", "--set=ON_ERROR_STOP=1"]
+    pipe(
+        dump_command,
+        libpq_environment(source, template),
+        restore_command,
+        libpq_environment(target, database_name))
+
+
+class _CountingWriter(object):
+    def __init__(self, file_, counter):
+        self.file_ = file_
+        self.counter = counter
+
+    def write(self, data):
+        self.file_.write(data)
+        self.counter(len(data))
+
+    def close(self):
+        self.file_.close()
+
+
+class DatabaseCopy(object):
+    """
+    Copies a template from one server into an existing, empty database on another.
+    The schema is piped from `pg_dump` into `psql`, the tables are streamed with COPY over `jobs`
+    pairs of connections, and nothing is written to disk. Every read uses the same snapshot
+    of the template. `progress` is called with a CopyProgress at most every `interval` seconds
+    and after each table. Large objects are not copied, so templates that have any are refused.
+    """
+
+    def __init__(self, source, template, target, database_name, jobs=1, progress=None, interval=1.0):
+        self.source = source
+        self.template = template
+        self.target = target
+        self.database_name = database_name
+        self.jobs = max(1, jobs or 1)
+        self.progress = progress
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._tables = 0
+        self._copied_tables = 0
+        self._total_bytes = 0
+        self._copied_bytes = 0
+        self._started = None
+        self._reported = None
+
+    def run(self):
+        self._started = self._reported = timeit.default_timer()
+        connection = connect(self.source, self.template)
+        try:
+            connection.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+            version = connection.server_version
+            if commands.supports("sequence_values", version) is False:
+                raise DatabaseError("Copying templates between servers requires PostgreSQL 10 or later")
+            with connection.cursor() as cursor:
+                cursor.execute(compose(commands.get("export_snapshot", version)))
+                snapshot = cursor.fetchone()[0]
+                cursor.execute(compose(commands.get("has_large_objects", version)))
+                if cursor.fetchone()[0]:
+                    raise DatabaseError(
+                        "Unable to copy '{}' from another server: large objects are not supported".format(
+                            self.template))
+                cursor.execute(compose(commands.get("table_sizes", version)))
+                rows = cursor.fetchall()
+                tables = list((row[0], row[1]) for row in rows)
+                self._tables = len(tables)
+                self._total_bytes = sum(row[2] or 0 for row in rows)
+                cursor.execute(compose(commands.get("sequence_values", version)))
+                sequences = cursor.fetchall()
+
+            stream_section("pre-data", self.source, self.template, self.target, self.database_name, snapshot)
+            self._copy_tables(tables, snapshot)
+            self._set_sequences(sequences)
+            stream_section("post-data", self.source, self.template, self.target, self.database_name, snapshot)
+        finally:
+            connection.close()
+        self._report(force=True)
+        return self.snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return CopyProgress(
+                template=self.template,
+                database=self.database_name,
+                tables=self._tables,
+                copied_tables=self._copied_tables,
+                total_bytes=self._total_bytes,
+                copied_bytes=self._copied_bytes,
+                elapsed=timeit.default_timer() - self._started)
+
+    def _report(self, force=False):
+        if self.progress is None:
+            return
+        now = timeit.default_timer()
+        with self._lock:
+            if force is False and now - self._reported < self.interval:
+                return
+            self._reported = now
+        self.progress(self.snapshot())
+
+    def _count(self, copied_bytes):
+        with self._lock:
+            self._copied_bytes += copied_bytes
+        self._report()
+
+    def _copy_tables(self, tables, snapshot):
+        pending = list(tables)
+        failures = list()
+        workers = max(1, min(self.jobs, len(pending)))
+
+        def work():
+            source = target = None
+            try:
+                source = connect(self.source, self.template)
+                target = connect(self.target, self.database_name)
+                source.set_session(
+                    isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+                with source.cursor() as cursor:
+                    cursor.execute(compose(commands.get("set_snapshot")), [snapshot])
+                while not failures:
+                    with self._lock:
+                        if not pending:
+                            return
+                        schema, table = pending.pop(0)
+                    self.copy_table(source, target, schema, table)
+                    with self._lock:
+                        self._copied_tables += 1
+                    self._report(force=True)
+            except Exception as e:
+                failures.append(e)
+            finally:
+                for connection in (source, target):
+                    if connection is not None:
+                        connection.close()
+
+        threads = list(threading.Thread(target=work) for _ in range(workers))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if failures:
+            raise failures[0]
+
+    def copy_table(self, source, target, schema, table):
+        """Streams a table from the source connection into the target connection through a pipe"""
+        copy_to = compose(commands.get("copy_to"), schema=schema, table=table)
+        copy_from = compose(commands.get("copy_from"), schema=schema, table=table)
+        read_fd, write_fd = os.pipe()
+        reader = io.open(read_fd, "rb")
+        writer = _CountingWriter(io.open(write_fd, "wb"), self._count)
+        dump_failures = list()
+
+        def dump():
+            try:
+                with source.cursor() as cursor:
+                    cursor.copy_expert(copy_to, writer)
+            except Exception as e:
+                dump_failures.append(e)
+            finally:
+                try:
+                    writer.close()
+                except (IOError, OSError):
+                    pass
+
+        thread = threading.Thread(target=dump)
+        thread.start()
+        try:
+            with target.cursor() as cursor:
+                cursor.copy_expert(copy_from, reader)
+        finally:
+            # closing the reader stops the dump when the restore failed
+            reader.close()
+            thread.join()
+        if dump_failures:
+            target.rollback()
+            raise dump_failures[0]
+        target.commit()
+
+    def _set_sequences(self, sequences):
+        if not sequences:
+            return
+        target = connect(self.target, self.database_name)
+        try:
+            with target.cursor() as cursor:
+                for schema, name, value in sequences:
+                    qualified = psycopg2.sql.Identifier(schema, name).as_string(target)
+                    cursor.execute(compose(commands.get("set_sequence")), [qualified, value])
+            target.commit()
+        finally:
+            target.close()
@@ -0,0 +1,252 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import re
+import six
+from branchdb.errors import DatabaseError, ConnectionError, ImproperlyConfigured
+from branchdb.engines import BaseEngine, SlugType
+
+PREFIX_MODE = "prefix"
+INDEX_MODE = "index"
+# the hash, in the configured logical database, that maps every database name to its key prefix or index
+REGISTRY_KEY = "branchdb:databases"
+KEY_SEPARATOR = ":"
+BATCH_SIZE = 1000
+# the UNLINK commands of a deletion sent per round trip
+PIPELINE_DEPTH = 10
+DEFAULT_DATABASES = 16
+
+
+def escape_pattern(prefix):
+    """Escapes the glob characters of SCAN's MATCH in a key prefix"""
+    return re.sub(r"([*?\[\]\\])", r"\\\1", prefix)
+
+
+def text(value):
+    if isinstance(value, six.binary_type):
+        return value.decode("utf-8")
+    return value
+
+
+class RedisEngine(BaseEngine):
+    """
+    Branches Redis keyspaces, built on redis-py (`pip install branchdb[redis]`).
+    In "prefix" mode a database is every key starting with `<name>:` in the configured logical database;
+    in "index" mode it is a logical database of its own. The names are registered in the REGISTRY_KEY hash.
+    Templates are copied with SCAN and pipelined DUMP/RESTORE, BATCH_SIZE keys per round trip.
+    """
+    slug = SlugType.REDIS
+    connection = None
+    mode = PREFIX_MODE
+    db = 0
+    _connection_params = None
+
+    def __init__(self):
+        self._clients = dict()
+
+    @classmethod
+    def connection_params(cls, db_info):
+        return dict(
+            user=db_info.get("USER"),
+            password=db_info.get("PASSWORD"),
+            host=db_info.get("HOST") or "localhost",
+            port=db_info.get("PORT"),
+            db=db_info.get("DB", cls.db),
+            mode=db_info.get("MODE", cls.mode))
+
+    def connect(self, user=None, password=None, host="localhost", port="", db=0, mode=PREFIX_MODE):
+        if mode not in (PREFIX_MODE, INDEX_MODE):
+            raise ImproperlyConfigured("Unknown Redis mode '{}', expected '{}' or '{}'".format(
+                mode, PREFIX_MODE, INDEX_MODE))
+        self.mode = mode
+        self.db = int(db or 0)
+        self._connection_params = dict(user=user, password=password, host=host, port=port)
+        try:
+            self.connection = self._client(self.db)
+            self.connection.ping()
+        except ImproperlyConfigured:
+            raise
+        except Exception:
+            self.connection = None
+            raise ConnectionError("Unable to connect to Redis")
+        return self.connection
+
+    def _client(self, db):
+        """Returns a client of the logical database, reusing the one created before"""
+        if db in self._clients:
+            return self._clients[db]
+        try:
+            import redis
+        except ImportError:
+            error = "The Redis engine requires redis-py. Install it with 'pip install branchdb[redis]'"
+            raise ImproperlyConfigured(error)
+        params = self._connection_params
+        options = dict(host=params["host"] or "localhost", port=int(params["port"] or 6379), db=db)
+        if params["password"]:
+            options["password"] = params["password"]
+        if params["user"]:
+            options["username"] = params["user"]
+        client = self._clients[db] = redis.Redis(**options)
+        return client
+
+    def disconnect(self):
+        for client in self._clients.values():
+            client.connection_pool.disconnect()
+        self._clients = dict()
+        self.connection = None
+
+    def _registry(self):
+        if self.connection is None:
+            raise DatabaseError("Must call 'RedisEngine.connect()' before using the databases")
+        return dict((text(name), text(value)) for name, value in self.connection.hgetall(REGISTRY_KEY).items())
+
+    def all_databases(self, prefix=None):
+        return list(name for name in self._registry() if not prefix or name.startswith(prefix))
+
+    def databases_exist(self, database_names):
+        database_names = list(database_names)
+        if not database_names:
+            return set()
+        if self.connection is None:
+            raise DatabaseError("Must call 'RedisEngine.connect()' before using the databases")
+        values = self.connection.hmget(REGISTRY_KEY, database_names)
+        return set(name for name, value in zip(database_names, values) if value is not None)
+
+    def keyspace(self, database_name):
+        """Returns the client and key prefix that hold the database's keys"""
+        value = text(self.connection.hget(REGISTRY_KEY, database_name))
+        if value is None:
+            raise DatabaseError("Database '{}' does not exist.".format(database_name))
+        if self.mode == INDEX_MODE:
+            return self._client(int(value)), ""
+        return self.connection, value
+
+    def _template_keyspace(self, template):
+        """Templates that branchdb did not create are read from `<template>:`, or in index mode the numbered database"""
+        if self.database_exists(template):
+            return self.keyspace(template)
+        if self.mode == INDEX_MODE:
+            if not six.text_type(template).isdigit():
+                raise DatabaseError("Template '{}' does not exist.".format(template))
+            return self._client(int(template)), ""
+        return self.connection, template + KEY_SEPARATOR
+
+    def create_database(self, database_name, template=None, strategy=None):
+        if self.database_exists(database_name) is True:
+            raise DatabaseError("Database '{}' already exists.".format(database_name))
+        if template is not None:
+            source, source_prefix = self._template_keyspace(template)
+        if self.mode == INDEX_MODE:
+            target, target_prefix = self._client(self._claim_index(database_name)), ""
+        else:
+            target, target_prefix = self.connection, database_name + KEY_SEPARATOR
+            if not self.connection.hsetnx(REGISTRY_KEY, database_name, target_prefix):
+                raise DatabaseError("Database '{}' already exists.".format(database_name))
+        if template is not None:
+            try:
+                self.copy_keys(source, source_prefix, target, target_prefix)
+            except Exception:
+                # a partial copy would pass for a working database
+                self._delete_keys(target, target_prefix)
+                self.connection.hdel(REGISTRY_KEY, database_name)
+                raise
+        self.record_database(database_name, True)
+        return True
+
+    def _claim_index(self, database_name):
+        """
+        Registers the database under the lowest logical database that is neither registered nor holding keys.
+        The registry is watched, so the claim is retried when another process registers a database meanwhile.
+        """
+        databases = self._database_count()
+
+        def claim(pipe):
+            if pipe.hexists(REGISTRY_KEY, database_name):
+                raise DatabaseError("Database '{}' already exists.".format(database_name))
+            used = set(int(value) for value in pipe.hvals(REGISTRY_KEY))
+            free = (index for index in range(databases) if index != self.db and index not in used)
+            index = next((index for index in free if self._client(index).dbsize() == 0), None)
+            if index is None:
+                raise DatabaseError("No empty logical database is left for '{}'".format(database_name))
+            pipe.multi()
+            pipe.hset(REGISTRY_KEY, database_name, index)
+            return index
+
+        return self.connection.transaction(claim, REGISTRY_KEY, value_from_callable=True)
+
+    def _database_count(self):
+        try:
+            return int(self.connection.config_get("databases")["databases"])
+        except Exception:
+            # managed servers often disable CONFIG
+            return DEFAULT_DATABASES
+
+    def copy_keys(self, source, source_prefix, target, target_prefix, batch_size=None):
+        """Copies the keys under the source prefix, pipelining DUMP and RESTORE for each batch of keys"""
+        batch_size = batch_size or BATCH_SIZE
+        # keys come back as bytes
+        strip = len(source_prefix.encode("utf-8"))
+        target_prefix = target_prefix.encode("utf-8")
+        batch = list()
+        for key in self._scan(source, source_prefix, batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                self._copy_batch(source, target, batch, strip, target_prefix)
+                batch = list()
+        if batch:
+            self._copy_batch(source, target, batch, strip, target_prefix)
+
+    def _scan(self, client, prefix, batch_size):
+        """Yields the keys under the prefix, leaving out the registry when it lives in the scanned database"""
+        registry = REGISTRY_KEY.encode("utf-8") if client is self.connection else None
+        for key in client.scan_iter(match=escape_pattern(prefix) + "*", count=batch_size):
+            if key != registry:
+                yield key
+
+    def _copy_batch(self, source, target, keys, strip, target_prefix):
+        with source.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.dump(key)
+                pipe.pttl(key)
+            results = pipe.execute()
+        with target.pipeline(transaction=False) as pipe:
+            for index, key in enumerate(keys):
+                payload, ttl = results[2 * index], results[2 * index + 1]
+                if payload is None or ttl == -2:
+                    # expired since the scan
+                    continue
+                # keys without an expiry have a TTL of -1, which RESTORE takes as 0
+                pipe.restore(target_prefix + key[strip:], max(ttl, 0), payload)
+            pipe.execute()
+
+    def _delete_keys(self, client, prefix, batch_size=None):
+        """Unlinks the keys under the prefix, pipelining a batch of keys per round trip"""
+        batch_size = batch_size or BATCH_SIZE
+        if not prefix:
+            # the database has a logical database of its own
+            client.flushdb(asynchronous=True)
+            return
+        batch = list()
+        with client.pipeline(transaction=False) as pipe:
+            for key in self._scan(client, prefix, batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    pipe.unlink(*batch)
+                    batch = list()
+                    if len(pipe) >= PIPELINE_DEPTH:
+                        pipe.execute()
+            if batch:
+                pipe.unlink(*batch)
+            pipe.execute()
+
+    def delete_database(self, database_name, force=False):
+        if self.database_exists(database_name) is False:
+            raise DatabaseError("Database '{}' does not exist.".format(database_name))
+        client, prefix = self.keyspace(database_name)
+        self._delete_keys(client, prefix)
+        self.connection.hdel(REGISTRY_KEY, database_name)
+        self.record_database(database_name, False)
+        return True
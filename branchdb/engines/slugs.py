@@ -7,6 +7,9 @@ from __future__ import unicode_literals
 
 class SlugRegistry(object):
     POSTGRESQL = "postgres"
+    SQLITE = "sqlite"
+    MYSQL = "mysql"
+    REDIS = "redis"
 
     def register(self, slug, value):
         if hasattr(self, slug):
@@ -0,0 +1,8 @@
+# flake8: noqa
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from .sqlite_engine import SqliteEngine
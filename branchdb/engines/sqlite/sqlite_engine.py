@@ -0,0 +1,219 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import errno
+import shutil
+import sqlite3
+from branchdb.errors import DatabaseError, ConnectionError
+from branchdb.engines import BaseEngine, SlugType
+
+CLONE_STRATEGIES = ("reflink", "copy", "backup")
+# files SQLite keeps next to a database while it is open or was not closed cleanly
+SIDE_FILE_SUFFIXES = ("-wal", "-shm", "-journal")
+# the FICLONE ioctl of Linux, which shares the extents of a file on btrfs, XFS and other CoW filesystems
+FICLONE = 0x40049409
+CHUNK_SIZE = 1024 * 1024
+
+
+def scan(directory):
+    """Returns the name of every entry in the directory, from a single directory read"""
+    if hasattr(os, "scandir"):
+        return list(entry.name for entry in os.scandir(directory))
+    return os.listdir(directory)
+
+
+def reflink(source, target):
+    """Makes the target share the source's blocks, raising OSError where the filesystem can not"""
+    import fcntl
+    fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+
+def kernel_copy(source, target):
+    """Copies the file inside the kernel with `copy_file_range()` or `sendfile()`, or in chunks without them"""
+    size = os.fstat(source.fileno()).st_size
+    copies = list()
+    if hasattr(os, "copy_file_range"):
+        copies.append(lambda offset: os.copy_file_range(source.fileno(), target.fileno(), size - offset))
+    if hasattr(os, "sendfile"):
+        copies.append(lambda offset: os.sendfile(target.fileno(), source.fileno(), offset, size - offset))
+    for copy in copies:
+        offset = 0
+        try:
+            while offset < size:
+                copied = copy(offset)
+                if copied == 0:
+                    break
+                offset += copied
+        except OSError as e:
+            # no kernel support for this pair of files, before anything was copied
+            if offset == 0 and e.errno in (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSOCK):
+                continue
+            raise
+        return
+    shutil.copyfileobj(source, target, CHUNK_SIZE)
+
+
+def backup(source_path, target_path):
+    """Copies a live database with the SQLite backup API, which includes what is still in its write-ahead log"""
+    source = sqlite3.connect(source_path)
+    try:
+        if not hasattr(source, "backup"):
+            raise DatabaseError("Copying a database in use requires the SQLite backup API of Python 3.7+")
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+class SqliteEngine(BaseEngine):
+    """
+    Keeps each database as a file in a directory, named after the database with the `extension` appended.
+    Templates are copied with a reflink where the filesystem supports it and inside the kernel otherwise.
+    Templates that are open (or were not closed cleanly) are copied with the SQLite backup API instead.
+    """
+    slug = SlugType.SQLITE
+    connection = None
+    extension = ".sqlite3"
+
+    @classmethod
+    def connection_params(cls, db_info):
+        return dict(directory=db_info["DIRECTORY"], extension=db_info.get("EXTENSION", cls.extension))
+
+    def connect(self, directory=None, extension=None):
+        if directory is None:
+            raise ConnectionError("Please specify the 'DIRECTORY' of the SQLite databases")
+        directory = os.path.abspath(os.path.expanduser(directory))
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        except OSError:
+            raise ConnectionError("Unable to use '{}' for SQLite databases".format(directory))
+        if extension is not None:
+            self.extension = extension
+        self.connection = directory
+        return self.connection
+
+    def disconnect(self):
+        self.connection = None
+
+    def path(self, database_name):
+        """Returns the file of the database"""
+        if self.connection is None:
+            raise DatabaseError("Must call 'SqliteEngine.connect()' before locating a database")
+        if not database_name or os.path.basename(database_name) != database_name or database_name in (".", ".."):
+            raise DatabaseError("'{}' is not a valid SQLite database name".format(database_name))
+        return os.path.join(self.connection, database_name + self.extension)
+
+    def _scan(self):
+        if self.connection is None:
+            raise DatabaseError("Must call 'SqliteEngine.connect()' before listing the databases")
+        return scan(self.connection)
+
+    def all_databases(self, prefix=None):
+        databases = list()
+        for name in self._scan():
+            if not name.endswith(self.extension):
+                continue
+            database_name = name[:-len(self.extension)]
+            if database_name and (not prefix or database_name.startswith(prefix)):
+                databases.append(database_name)
+        return databases
+
+    @property
+    def clone_strategies(self):
+        """The ways `create_database()` can copy a template: reflinks are only available on Linux"""
+        if hasattr(os, "uname") and os.uname()[0] == "Linux":
+            return CLONE_STRATEGIES
+        return tuple(strategy for strategy in CLONE_STRATEGIES if strategy != "reflink")
+
+    def create_database(self, database_name, template=None, strategy=None):
+        if self.database_exists(database_name) is True:
+            raise DatabaseError("Database '{}' already exists.".format(database_name))
+        if strategy is not None and strategy not in CLONE_STRATEGIES:
+            raise DatabaseError("Unknown clone strategy '{}'".format(strategy))
+        path = self.path(database_name)
+        template_path = None
+        if template is not None:
+            template_path = self.path(template)
+            if not os.path.isfile(template_path):
+                raise DatabaseError("Template '{}' does not exist.".format(template))
+        try:
+            # the exclusive create keeps concurrent creates from overwriting each other
+            target = io.open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644), "wb")
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                raise DatabaseError("Database '{}' already exists.".format(database_name))
+            raise
+        try:
+            with target:
+                if template_path is not None and strategy != "backup" and self._in_use(template) is False:
+                    self._copy(template_path, target, strategy)
+                    template_path = None
+            if template_path is not None:
+                backup(template_path, path)
+        except Exception:
+            self._remove(database_name)
+            raise
+        self.record_database(database_name, True)
+        return True
+
+    def _in_use(self, database_name):
+        """Returns whether the database has a write-ahead log or journal that a file copy would miss"""
+        path = self.path(database_name)
+        return any(os.path.exists(path + suffix) for suffix in SIDE_FILE_SUFFIXES)
+
+    def _copy(self, template_path, target, strategy):
+        with io.open(template_path, "rb") as source:
+            if strategy in (None, "reflink"):
+                try:
+                    reflink(source, target)
+                    return
+                except (ImportError, IOError, OSError):
+                    if strategy == "reflink":
+                        raise DatabaseError("The filesystem of '{}' does not support reflinks".format(self.connection))
+            kernel_copy(source, target)
+
+    def delete_database(self, database_name, force=False):
+        if self.database_exists(database_name) is False:
+            raise DatabaseError("Database '{}' does not exist.".format(database_name))
+        self._remove(database_name)
+        self.record_database(database_name, False)
+        return True
+
+    def delete_databases(self, database_names, force=False):
+        """
+        Removes the databases, along with their write-ahead logs and journals, after a single directory scan.
+        Returns the errors of the databases that were not deleted.
+        """
+        entries = set(self._scan())
+        failures = dict()
+        for database_name in database_names:
+            try:
+                path = self.path(database_name)
+                if os.path.basename(path) not in entries:
+                    raise DatabaseError("Database '{}' does not exist.".format(database_name))
+                for file_path in [path] + list(path + suffix for suffix in SIDE_FILE_SUFFIXES):
+                    if os.path.basename(file_path) in entries:
+                        os.remove(file_path)
+            except Exception as e:
+                failures[database_name] = e
+            else:
+                self.record_database(database_name, False)
+        return failures
+
+    def _remove(self, database_name):
+        path = self.path(database_name)
+        for file_path in [path] + list(path + suffix for suffix in SIDE_FILE_SUFFIXES):
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
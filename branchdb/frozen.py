@@ -0,0 +1,91 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import json
+import threading
+from branchdb import errors, utils
+
+FROZEN_ENVIRONMENT_VARIABLE = "BRANCHDB_FROZEN"
+FROZEN_FILE = "frozen.json"
+FROZEN_VERSION = 1
+
+_artifacts = {}
+_artifacts_lock = threading.Lock()
+
+
+def frozen_path():
+    """Returns the artifact path set in the environment, or None when branchdb should resolve normally"""
+    return os.environ.get(FROZEN_ENVIRONMENT_VARIABLE) or None
+
+
+def load(path):
+    """Returns the contents of the frozen artifact, reading it once per process"""
+    with _artifacts_lock:
+        artifact = _artifacts.get(path)
+        if artifact is None:
+            try:
+                with io.open(path, "rb") as artifact_file:
+                    artifact = json.loads(artifact_file.read().decode("utf-8"))
+            except (IOError, OSError, ValueError):
+                raise errors.ImproperlyConfigured("Unable to read frozen artifact '{}'".format(path))
+            if artifact.get("version") != FROZEN_VERSION:
+                raise errors.ImproperlyConfigured("Unsupported frozen artifact '{}'".format(path))
+            _artifacts[path] = artifact
+    return artifact
+
+
+def clear_cache():
+    with _artifacts_lock:
+        _artifacts.clear()
+
+
+def get_frozen_database(path, slug):
+    databases = load(path)["databases"]
+    db_name = databases.get("" if slug is None else slug, databases.get(""))
+    if db_name is None:
+        error = "Unable to retrieve active branch name. Please add a default database to your settings."
+        raise errors.ImproperlyConfigured(error)
+    return db_name
+
+
+def get_frozen_databases(path):
+    return load(path)["connections"]
+
+
+def _effective_settings(settings):
+    values = dict()
+    for setting in dir(settings._wrapped):
+        if setting.isupper():
+            value = getattr(settings, setting)
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                raise errors.ImproperlyConfigured("Setting '{}' can not be frozen".format(setting))
+            values[setting] = value
+    return values
+
+
+def freeze(project, path=None):
+    """Writes the resolved branch, databases and settings of the project to a self-contained artifact"""
+    from branchdb.conf import settings
+    from branchdb.database import get_current_database, get_current_databases
+
+    if path is None:
+        path = os.path.join(project.branchdb_folder, FROZEN_FILE)
+    connections = get_current_databases(project=project)
+    databases = {"": get_current_database(project=project)}
+    for db_info in connections.values():
+        databases.setdefault(db_info["ENGINE"], get_current_database(slug=db_info["ENGINE"], project=project))
+    artifact = {
+        "version": FROZEN_VERSION,
+        "branch": project.branch,
+        "databases": databases,
+        "connections": connections,
+        "settings": _effective_settings(settings)}
+    utils.atomic_json_dump(artifact, path)
+    return path
@@ -4,25 +4,154 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
 import os
-from git import Repo
+import re
+import stat
 
+HEAD_BRANCH_PREFIX = "ref: refs/heads/"
+GITDIR_PREFIX = "gitdir:"
+# the branch of the stub HEAD file of a reftable repository, which only git itself can resolve
+REFTABLE_HEAD_BRANCH = ".invalid"
+COMMIT_SHA = re.compile(r"^[0-9a-f]{40}(?:[0-9a-f]{24})?$")
 
-def get_repo():
-    """Returns the Repo of the current directory"""
-    call_dir = os.getcwd()
+
+def get_repo(path=None):
+    """Returns the Repo of the given path (default: current directory)"""
+    from git import Repo
+    call_dir = os.getcwd() if path is None else path
     return Repo(call_dir, search_parent_directories=True)
 
 
 def get_project_root(repo=None):
     """Returns the path to the top-level directory of current project"""
     if repo is None:
+        located = find_git_dir(os.getcwd())
+        if located is not None:
+            return located[1]
         repo = get_repo()
     return repo.git.rev_parse(u"--show-toplevel")
 
 
+def get_hooks_dir(repo):
+    """Returns the folder that git runs hooks from, honouring `core.hooksPath` and worktrees"""
+    hooks_dir = repo.git.rev_parse(u"--git-path", u"hooks")
+    return os.path.join(repo.working_tree_dir, hooks_dir)
+
+
+def get_project_id(repo):
+    """
+    Returns a name of the project that every clone and worktree shares: the URL of the 'origin' remote
+    without its scheme, user and '.git' (e.g. 'github.com/owner/project'), or else the folder name of
+    the main work tree
+    """
+    try:
+        url = repo.remotes.origin.url
+    except (AttributeError, IndexError, ValueError):
+        url = None
+    if url:
+        scheme = re.match(r"^[a-z][a-z0-9+.-]*://", url)
+        if scheme is not None:
+            url = url[scheme.end():]
+        url = re.sub(r"^[^@/]*@", "", url)
+        if scheme is None:
+            # scp-like syntax, e.g. git@github.com:owner/project.git
+            url = url.replace(":", "/", 1)
+        url = url.rstrip("/")
+        if url.endswith(".git"):
+            url = url[:-len(".git")]
+        return url
+    common_dir = getattr(repo, "common_dir", None) or repo.git_dir
+    return os.path.basename(os.path.dirname(os.path.abspath(common_dir)))
+
+
+def get_active_branch(repo):
+    """Returns the active branch name of the repo, or None when HEAD is detached"""
+    try:
+        return repo.active_branch.name
+    except TypeError:
+        return None
+
+
 def get_branch_and_root():
     """Returns the active branch name and the current project's root path"""
+    located = find_git_dir(os.getcwd())
+    if located is not None:
+        git_dir, root = located
+        try:
+            return read_head_ref(git_dir), root
+        except ValueError:
+            pass
     repo = get_repo()
     root = get_project_root(repo)
-    return repo.active_branch.name, root
+    return get_active_branch(repo), root
+
+
+def find_git_dir(path):
+    """
+    Walks up from the given path and returns the git directory and the work tree root.
+    Returns None for layouts that can only be resolved by git itself.
+    """
+    if "GIT_DIR" in os.environ or "GIT_WORK_TREE" in os.environ:
+        return None
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        try:
+            mode = os.stat(dot_git).st_mode
+        except OSError:
+            mode = None
+        if mode is not None and stat.S_ISDIR(mode):
+            return dot_git, path
+        if mode is not None and stat.S_ISREG(mode):
+            git_dir = _read_gitdir_file(dot_git)
+            if git_dir is None:
+                return None
+            return git_dir, path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def read_head_ref(git_dir):
+    """
+    Returns the branch name that HEAD points to, or None when HEAD is detached.
+    Raises ValueError when the HEAD file cannot be parsed.
+    """
+    try:
+        with io.open(os.path.join(git_dir, "HEAD"), "r", encoding="utf-8") as head_file:
+            head = head_file.read().strip()
+    except (IOError, OSError):
+        raise ValueError("Unable to read HEAD in '{}'".format(git_dir))
+    if head.startswith(HEAD_BRANCH_PREFIX):
+        branch = head[len(HEAD_BRANCH_PREFIX):]
+        if branch == REFTABLE_HEAD_BRANCH or uses_reftable(git_dir):
+            raise ValueError("The HEAD of '{}' is kept in a reftable".format(git_dir))
+        return branch
+    if COMMIT_SHA.match(head):
+        return None
+    raise ValueError("Unable to parse HEAD in '{}'".format(git_dir))
+
+
+def uses_reftable(git_dir):
+    """Returns whether the refs of the git directory, HEAD included, are kept in reftables (`extensions.refStorage`)"""
+    return os.path.isdir(os.path.join(git_dir, "reftable"))
+
+
+def _read_gitdir_file(path):
+    """Returns the git directory referenced by a `.git` file (used by worktrees and submodules)"""
+    try:
+        with io.open(path, "r", encoding="utf-8") as gitdir_file:
+            content = gitdir_file.read().strip()
+    except (IOError, OSError):
+        return None
+    if content.startswith(GITDIR_PREFIX) is False:
+        return None
+    git_dir = content[len(GITDIR_PREFIX):].strip()
+    if os.path.isabs(git_dir) is False:
+        git_dir = os.path.join(os.path.dirname(path), git_dir)
+    git_dir = os.path.normpath(git_dir)
+    if os.path.isdir(git_dir) is False:
+        return None
+    return git_dir
@@ -0,0 +1,117 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import sys
+import stat
+from branchdb import git_tools
+
+HOOK_NAMES = ("post-checkout", "post-merge", "post-rewrite")
+BLOCK_START = "# >>> branchdb >>>"
+BLOCK_END = "# <<< branchdb <<<"
+CHAINED_SUFFIX = ".branchdb-chained"
+
+
+def hook_block():
+    """
+    Returns the shell lines that refresh the branchdb resolution cache. The hook does nothing once the
+    interpreter it was installed with is gone, such as a removed virtualenv.
+    """
+    command = (
+        "if [ -x \"{python}\" ]; then "
+        "\"{python}\" -m branchdb.commands.branchdb_command hooks run >/dev/null 2>&1 || true; fi").format(
+        python=sys.executable)
+    return "\n".join([BLOCK_START, command, BLOCK_END]) + "\n"
+
+
+def chaining_hook(hook_name):
+    """Returns a hook that runs a previously installed hook before refreshing branchdb"""
+    return "\n".join([
+        "#!/bin/sh",
+        "\"$(dirname \"$0\")/{}{}\" \"$@\"".format(hook_name, CHAINED_SUFFIX),
+        "status=$?",
+        hook_block().rstrip("\n"),
+        "exit $status"]) + "\n"
+
+
+def _read(path):
+    with io.open(path, "r", encoding="utf-8") as file_:
+        return file_.read()
+
+
+def _write_executable(path, content):
+    with io.open(path, "w", encoding="utf-8") as file_:
+        file_.write(content)
+    mode = os.stat(path).st_mode
+    os.chmod(path, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def _strip_block(content):
+    if BLOCK_START not in content:
+        return content
+    before, rest = content.split(BLOCK_START, 1)
+    after = rest.split(BLOCK_END, 1)[1] if BLOCK_END in rest else ""
+    return before + after.lstrip("\n")
+
+
+def install_hook(hooks_dir, hook_name):
+    """
+    Installs (or refreshes) the branchdb block of a single hook. An existing hook is moved aside and run
+    by the installed hook before the block.
+    """
+    path = os.path.join(hooks_dir, hook_name)
+    if os.path.exists(path + CHAINED_SUFFIX):
+        _write_executable(path, chaining_hook(hook_name))
+        return
+    if os.path.exists(path) is False:
+        _write_executable(path, "#!/bin/sh\n" + hook_block())
+        return
+    original = _read(path)
+    content = _strip_block(original)
+    if content.strip() in ("", "#!/bin/sh"):
+        # a hook of our own
+        _write_executable(path, "#!/bin/sh\n" + hook_block())
+        return
+    if content != original:
+        # hooks installed by older versions carry the block at their end
+        _write_executable(path, content)
+    # the block would never run after a hook that ends in `exec` or `exit`, so it runs after the hook instead
+    os.rename(path, path + CHAINED_SUFFIX)
+    _write_executable(path, chaining_hook(hook_name))
+
+
+def uninstall_hook(hooks_dir, hook_name):
+    """Removes the branchdb block of a single hook, restoring a chained hook if there was one"""
+    path = os.path.join(hooks_dir, hook_name)
+    chained = path + CHAINED_SUFFIX
+    if os.path.exists(chained):
+        os.rename(chained, path)
+        return
+    if os.path.exists(path) is False:
+        return
+    original = _read(path)
+    content = _strip_block(original)
+    if content.strip() in ("", "#!/bin/sh"):
+        os.remove(path)
+    else:
+        _write_executable(path, content)
+
+
+def install_hooks(project):
+    hooks_dir = git_tools.get_hooks_dir(project.repo)
+    if os.path.exists(hooks_dir) is False:
+        os.makedirs(hooks_dir)
+    for hook_name in HOOK_NAMES:
+        install_hook(hooks_dir, hook_name)
+    return hooks_dir
+
+
+def uninstall_hooks(project):
+    hooks_dir = git_tools.get_hooks_dir(project.repo)
+    for hook_name in HOOK_NAMES:
+        uninstall_hook(hooks_dir, hook_name)
+    return hooks_dir
@@ -0,0 +1,249 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import stat
+import json
+from contextlib import contextmanager
+from branchdb import cache, errors, utils
+from branchdb.conf import settings
+
+JSON_BACKEND = "json"
+SQLITE_BACKEND = "sqlite"
+POSTGRES_BACKEND = "postgres"
+MAPPING_FILE_MODE = 0o644
+SQLITE_FILE = "mappings.sqlite3"
+
+
+def apply_changes(mapping, changes):
+    """Sets each changed branch to its database, removing the branches changed to None"""
+    for branch, database in changes.items():
+        if database is None:
+            mapping.pop(branch, None)
+        else:
+            mapping[branch] = database
+    return mapping
+
+
+class MappingBackend(object):
+    """
+    Stores the database of each branch of a project. `load()` reads the whole mapping, while `get()`
+    looks up a single branch, which indexed backends answer without reading the rest.
+    """
+    # whether the mapping lives outside the project, where other machines change it
+    shared = False
+
+    def __init__(self, project_root):
+        self.project_root = project_root
+
+    def load(self):
+        raise NotImplementedError
+
+    def get(self, branch):
+        """Returns the database of the branch, or None"""
+        return self.load().get(branch)
+
+    def save(self, changes):
+        """Applies the changes to the stored mapping, keeping the branches other writers saved meanwhile"""
+        raise NotImplementedError
+
+
+class JsonMappingBackend(MappingBackend):
+    """
+    The mapping in `.branchdb/mappings.json`. Every read parses the whole file. Saves replay the changes onto
+    the file under an exclusive lock and replace it atomically, so readers never wait or see a partial file.
+    """
+    __location = None
+
+    @property
+    def location(self):
+        """Returns the location of the mapping file of the project"""
+        if self.__location is None:
+            branchdb_folder = os.path.join(self.project_root, u".branchdb")
+            if os.path.exists(branchdb_folder) is False:
+                os.makedirs(branchdb_folder)
+            self.__location = os.path.join(branchdb_folder, u"mappings.json")
+        return self.__location
+
+    @property
+    def lock_location(self):
+        """Returns the lock file of saves, kept with the generated files that are not committed"""
+        folder = cache.cache_folder(self.project_root)
+        if os.path.exists(folder) is False:
+            os.makedirs(folder)
+        return os.path.join(folder, u"mappings.json.lock")
+
+    def load(self):
+        if os.path.exists(self.location) is False:
+            return {}
+        with io.open(self.location, u"rb") as mapping_file:
+            return json.load(mapping_file)
+
+    def save(self, changes):
+        location = self.location
+        with utils.file_lock(self.lock_location):
+            mapping = apply_changes(self.load(), changes)
+            try:
+                mode = stat.S_IMODE(os.stat(location).st_mode)
+            except OSError:
+                mode = MAPPING_FILE_MODE
+            utils.atomic_json_dump(mapping, location, mode=mode)
+
+
+class SqliteMappingBackend(MappingBackend):
+    """
+    The mapping in `.branchdb/mappings.sqlite3`, indexed by branch (and database), so a lookup reads a few pages
+    instead of the whole mapping. The file is in WAL mode, where readers never wait for writers.
+    """
+
+    @property
+    def location(self):
+        return os.path.join(self.project_root, u".branchdb", SQLITE_FILE)
+
+    @contextmanager
+    def _connect(self, create=False):
+        """Yields a connection to the mapping file, or None when it does not exist and `create` is False"""
+        if create is False and os.path.exists(self.location) is False:
+            yield None
+            return
+        folder = os.path.dirname(self.location)
+        if os.path.exists(folder) is False:
+            os.makedirs(folder)
+        import sqlite3
+        # transactions are started explicitly
+        connection = sqlite3.connect(self.location, isolation_level=None)
+        try:
+            if create is True:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS mappings (branch TEXT PRIMARY KEY, database TEXT NOT NULL) "
+                    "WITHOUT ROWID")
+                connection.execute("CREATE INDEX IF NOT EXISTS mappings_database ON mappings (database)")
+            yield connection
+        finally:
+            connection.close()
+
+    def _query(self, command, params=()):
+        import sqlite3
+        with self._connect() as connection:
+            if connection is None:
+                return []
+            try:
+                return connection.execute(command, params).fetchall()
+            except sqlite3.OperationalError:
+                # the file of a first save that has not created the table yet
+                if connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'mappings'").fetchall():
+                    raise
+                return []
+
+    def load(self):
+        return dict(self._query("SELECT branch, database FROM mappings"))
+
+    def get(self, branch):
+        rows = self._query("SELECT database FROM mappings WHERE branch = ?", (branch,))
+        return rows[0][0] if rows else None
+
+    def save(self, changes):
+        with self._connect(create=True) as connection:
+            # takes the write lock up front, so concurrent saves run one after the other
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for branch, database in changes.items():
+                    if database is None:
+                        connection.execute("DELETE FROM mappings WHERE branch = ?", (branch,))
+                    else:
+                        connection.execute(
+                            "INSERT OR REPLACE INTO mappings (branch, database) VALUES (?, ?)", (branch, database))
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+
+class PostgresMappingBackend(MappingBackend):
+    """
+    The mapping in the `branchdb_catalog` table on a PostgreSQL server, which every machine and worktree
+    of the project shares. MAPPING_CONNECTION names the ALIAS of its DATABASES entry (default: the first
+    PostgreSQL entry) and MAPPING_NAMESPACE the project's rows (default: the URL of the project's origin remote).
+    Queries run on connections leased from the process-wide connection pool.
+    """
+    shared = True
+    __namespace = None
+
+    @property
+    def namespace(self):
+        if self.__namespace is None:
+            namespace = settings.MAPPING_NAMESPACE
+            if namespace is None:
+                from branchdb import git_tools
+                from branchdb.project import get_project
+                namespace = git_tools.get_project_id(get_project(self.project_root).repo)
+            self.__namespace = namespace
+        return self.__namespace
+
+    def _db_info(self):
+        from branchdb.engines import SlugType
+        alias = settings.MAPPING_CONNECTION
+        for db_info in settings.DATABASES:
+            if alias is None and db_info["ENGINE"] == SlugType.POSTGRESQL:
+                return db_info
+            if alias is not None and db_info.get("ALIAS") == alias:
+                if db_info["ENGINE"] != SlugType.POSTGRESQL:
+                    error = "The mapping connection '{}' must be a PostgreSQL database".format(alias)
+                    raise errors.ImproperlyConfigured(error)
+                return db_info
+        if alias is None:
+            raise errors.ImproperlyConfigured("The 'postgres' mapping backend requires a PostgreSQL database")
+        raise errors.ImproperlyConfigured("No database connection has the ALIAS '{}' for the mapping".format(alias))
+
+    @contextmanager
+    def _engine(self):
+        from branchdb.database.shared import connection_pool
+        db_info = self._db_info()
+        engine = connection_pool.acquire(db_info)
+        try:
+            yield engine
+        finally:
+            connection_pool.release(engine, db_info)
+
+    def load(self):
+        with self._engine() as engine:
+            return engine.branch_catalog(self.namespace)
+
+    def get(self, branch):
+        with self._engine() as engine:
+            return engine.branch_catalog(self.namespace, branch)
+
+    def save(self, changes):
+        with self._engine() as engine:
+            engine.update_branch_catalog(self.namespace, changes)
+
+
+BACKENDS = {
+    JSON_BACKEND: JsonMappingBackend,
+    SQLITE_BACKEND: SqliteMappingBackend,
+    POSTGRES_BACKEND: PostgresMappingBackend,
+}
+
+
+def backend_class(name=None):
+    """
+    Returns the mapping backend class named by MAPPING_BACKEND (or `name`):
+    "json", "sqlite", "postgres", or the "module:Class" path of a MappingBackend subclass.
+    """
+    if name is None:
+        name = settings.MAPPING_BACKEND
+    if name in BACKENDS:
+        return BACKENDS[name]
+    if ":" in name:
+        return utils.import_string(name)
+    raise errors.ImproperlyConfigured("Unknown mapping backend '{}', expected one of: {}".format(
+        name, ", ".join(sorted(BACKENDS))))
+
+
+def get_backend(project_root, name=None):
+    return backend_class(name)(project_root)
@@ -0,0 +1,91 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import threading
+from branchdb import git_tools
+
+_UNRESOLVED = object()
+_roots = {}
+_roots_lock = threading.Lock()
+
+
+class Project(object):
+    """The git and branchdb locations of a project, each resolved at most once"""
+
+    def __init__(self, root, git_dir=None, repo=None):
+        self.root = root
+        self.git_dir = git_dir
+        self._repo = repo
+        self._branch = _UNRESOLVED
+
+    def __repr__(self):
+        return "<{cls} \"{root}\">".format(cls=self.__class__.__name__, root=self.root)
+
+    @property
+    def repo(self):
+        if self._repo is None:
+            self._repo = git_tools.get_repo(self.root)
+        return self._repo
+
+    @property
+    def branch(self):
+        """The active branch name, or None when HEAD is detached"""
+        if self._branch is _UNRESOLVED:
+            self._branch = self._resolve_branch()
+        return self._branch
+
+    def _resolve_branch(self):
+        if self.git_dir is not None:
+            try:
+                return git_tools.read_head_ref(self.git_dir)
+            except ValueError:
+                pass
+        return git_tools.get_active_branch(self.repo)
+
+    @property
+    def branchdb_folder(self):
+        return os.path.join(self.root, ".branchdb")
+
+    @property
+    def settings_path(self):
+        return os.path.join(self.branchdb_folder, "settings.py")
+
+    @property
+    def mapping_path(self):
+        return os.path.join(self.branchdb_folder, "mappings.json")
+
+    @property
+    def mapping_database_path(self):
+        """The mapping of the "sqlite" MAPPING_BACKEND"""
+        return os.path.join(self.branchdb_folder, "mappings.sqlite3")
+
+
+def get_project(path=None):
+    """Returns the Project containing the given path (default: current directory)"""
+    if path is None:
+        path = os.getcwd()
+    with _roots_lock:
+        located = _roots.get(path)
+    if located is not None:
+        return Project(*located)
+
+    repo = None
+    located = git_tools.find_git_dir(path)
+    if located is None:
+        repo = git_tools.get_repo(path)
+        root, git_dir = git_tools.get_project_root(repo), None
+    else:
+        git_dir, root = located
+    with _roots_lock:
+        _roots[path] = (root, git_dir)
+    return Project(root, git_dir=git_dir, repo=repo)
+
+
+def clear_cache():
+    """Forgets every project root resolved by this process"""
+    with _roots_lock:
+        _roots.clear()
@@ -4,18 +4,26 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import io
-import os
-import json
-from branchdb import utils
+import re
+import fnmatch
+from collections import OrderedDict
+from branchdb import cache, utils, mapping_backends
 
 
 class RepoMapping(object):
-    __mapping_file_location = None
-
-    def __init__(self, project_root, build=True):
+    """
+    The database of each branch of a project, kept by the MAPPING_BACKEND (default: `.branchdb/mappings.json`).
+    Single branches are looked up in the backend; the whole mapping is only loaded when it is iterated.
+    The sorted views and the database to branches index are built on first use and kept until the mapping changes.
+    Changes are journaled and replayed onto the stored mapping when they are saved, so concurrent writers
+    keep each other's branches.
+    """
+
+    def __init__(self, project_root, build=True, backend=None):
         self.project_root = project_root
-        self.mapping = self._build_mapping() if build is True else {}
+        self._backend = backend
+        # without `build`, the mapping starts empty instead of being loaded
+        self.mapping = None if build is True else {}
         self._changes = False
 
     def __enter__(self):
@@ -26,50 +34,103 @@ class RepoMapping(object):
             self._update_mapping()
 
     def __getitem__(self, key):
-        return self.mapping[key]
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
 
     def __setitem__(self, key, value):
-        self.mapping[key] = value
+        if self._mapping is not None:
+            previous = self._mapping.get(key)
+            self._mapping[key] = value
+            if self._reverse is not None:
+                if previous is not None:
+                    self._unindex(key, previous)
+                self._reverse.setdefault(value, set()).add(key)
+            self._sorted_branches = self._sorted_databases = None
+        self._journal[key] = value
         self._changes = True
 
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.mapping)
+
     def __iter__(self):
         for k, v in self.mapping.items():
             yield k, v
 
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = mapping_backends.get_backend(self.project_root)
+        return self._backend
+
+    @property
+    def mapping(self):
+        if self._mapping is None:
+            self._mapping = mapping_backends.apply_changes(self.backend.load(), self._journal)
+        return self._mapping
+
+    @mapping.setter
+    def mapping(self, mapping):
+        """Replaces the mapping, or with None, loads it again on first use"""
+        self._mapping = mapping
+        # the branches set (to their database) or removed (to None) since the mapping was loaded
+        self._journal = OrderedDict()
+        self._reverse = None
+        self._sorted_branches = self._sorted_databases = None
+
     @property
     def branches(self):
-        branches = list(self.mapping.keys())
-        branches.sort()
-        return branches
+        if self._sorted_branches is None:
+            self._sorted_branches = sorted(self.mapping.keys())
+        return list(self._sorted_branches)
 
     @property
     def databases(self):
-        databases = list(self.mapping.values())
-        databases.sort()
-        return databases
+        if self._sorted_databases is None:
+            self._sorted_databases = sorted(self.mapping.values())
+        return list(self._sorted_databases)
 
     @property
-    def mapping_file_location(self):
-        """Returns the location of the mapping file of the current project"""
-        if self.__mapping_file_location is None:
-            branchdb_folder = os.path.join(self.project_root, u".branchdb")
-            if os.path.exists(branchdb_folder) is False:
-                os.makedirs(branchdb_folder)
-            self.__mapping_file_location = os.path.join(branchdb_folder, u"mappings.json")
-        return self.__mapping_file_location
-
-    def _build_mapping(self):
-        if os.path.exists(self.mapping_file_location) is False:
-            return {}
-        with io.open(self.mapping_file_location, u"rb") as mapping_file:
-            return json.load(mapping_file)
+    def reverse_index(self):
+        """Maps each database to the set of branches that use it"""
+        if self._reverse is None:
+            reverse = dict()
+            for branch, database in self.mapping.items():
+                reverse.setdefault(database, set()).add(branch)
+            self._reverse = reverse
+        return self._reverse
+
+    def _unindex(self, branch, database):
+        branches = self._reverse.get(database)
+        if branches is not None:
+            branches.discard(branch)
+            if not branches:
+                del self._reverse[database]
+
+    def branches_for(self, database):
+        """Returns the branches that use the database, sorted"""
+        return sorted(self.reverse_index.get(database, ()))
 
     def _update_mapping(self):
-        utils.json_dump(self.mapping, self.mapping_file_location)
+        """Saves the changes through the backend, then reloads the mapping on next use to pick up other writers'"""
+        self.backend.save(self._journal)
+        self.mapping = None
+        cache.invalidate(self.project_root)
         self._changes = False
 
-    def get(self, *args, **kwargs):
-        return self.mapping.get(*args, **kwargs)
+    def get(self, branch, default=None):
+        """Returns the database of the branch, looking it up in the backend until the mapping is loaded"""
+        if branch in self._journal:
+            database = self._journal[branch]
+        elif self._mapping is None:
+            database = self.backend.get(branch)
+        else:
+            database = self._mapping.get(branch)
+        return default if database is None else database
 
     def get_or_create(self, branch_name, dry_run=False):
         """Returns the database name for a branch, and saves it to mapping file if none exists"""
@@ -81,19 +142,46 @@ class RepoMapping(object):
                 self[branch_name] = db_name
         return db_name
 
+    def select(self, pattern, regex=False):
+        """
+        Returns the branches whose names match a glob pattern (e.g. 'feature/*'), or contain a match of
+        a regular expression with `regex`, mapped to their databases and sorted by branch.
+        """
+        if regex is True:
+            matches_branch = re.compile(pattern).search
+        else:
+            matches_branch = re.compile(fnmatch.translate(pattern)).match
+        matches = ((branch, database) for branch, database in self.mapping.items() if matches_branch(branch))
+        return OrderedDict(sorted(matches))
+
     def remove(self, *args):
         """Removes branch from the mapping file"""
         for arg in args:
-            if arg in self.mapping:
-                del self.mapping[arg]
+            database = self.get(arg)
+            if database is None:
+                continue
+            if self._mapping is not None:
+                del self._mapping[arg]
+                if self._reverse is not None:
+                    self._unindex(arg, database)
+                self._sorted_branches = self._sorted_databases = None
+            self._journal[arg] = None
+            self._changes = True
 
     def remove_databases(self, *args):
-        """Removes branch from the mapping file based off the database name"""
+        """Removes every branch that uses one of the databases from the mapping file"""
+        reverse_index = self.reverse_index
         branches = list()
-        for branch, database in self.mapping.items():
-            if len(branches) == len(args):
-                # we have found all the databases that were requested
-                break
-            if database in args:
-                branches.append(branch)
+        for database in set(args):
+            branches.extend(reverse_index.get(database, ()))
         self.remove(*branches)
+
+
+def import_mapping(project_root, backend_name):
+    """Copies every branch kept by another mapping backend into the configured one, returning how many were copied"""
+    source = mapping_backends.get_backend(project_root, backend_name)
+    branches = source.load()
+    with RepoMapping(project_root, build=False) as mapping:
+        for branch, database in branches.items():
+            mapping[branch] = database
+    return len(branches)
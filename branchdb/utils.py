@@ -5,9 +5,10 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import io
+import os
 import six
 import json
-import slugify
+from contextlib import contextmanager
 try:
     import importlib.util
 except ImportError:
@@ -21,6 +22,63 @@ def json_dump(content, file_loc):
         json.dump(content, file_)
 
 
+def atomic_json_dump(content, file_loc, mode=None):
+    """Writes the json to a temporary file before moving it in place, so readers never see a partial file"""
+    _atomic_replace(file_loc, lambda temp_loc: json_dump(content, temp_loc), mode)
+
+
+def atomic_write(content, file_loc):
+    """Writes the bytes to a temporary file before moving it in place, so readers never see a partial file"""
+    def write(temp_loc):
+        with io.open(temp_loc, "wb") as file_:
+            file_.write(content)
+    _atomic_replace(file_loc, write)
+
+
+def _atomic_replace(file_loc, write, mode=None):
+    import tempfile
+    folder, name = os.path.split(file_loc)
+    fd, temp_loc = tempfile.mkstemp(prefix=".{}.".format(name), dir=folder)
+    os.close(fd)
+    try:
+        write(temp_loc)
+        if mode is not None:
+            # temporary files are only readable by their owner
+            os.chmod(temp_loc, mode)
+        replace_file(temp_loc, file_loc)
+    except Exception:
+        os.remove(temp_loc)
+        raise
+
+
+def replace_file(source, destination):
+    """Atomically moves source over destination"""
+    if six.PY2:
+        os.rename(source, destination)
+    else:
+        os.replace(source, destination)
+
+
+@contextmanager
+def file_lock(lock_loc):
+    """
+    Holds an exclusive advisory lock on the file (created if needed) while the block runs.
+    Nothing is locked where `fcntl` is unavailable, such as on Windows.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    fd = os.open(lock_loc, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # closing the file releases the lock
+        os.close(fd)
+
+
 def import_source_file(name, path):
     """Returns the imported module from the provided path. Useful for single file imports"""
     if six.PY2:
@@ -32,7 +90,27 @@ def import_source_file(name, path):
         return module
 
 
+def import_string(path):
+    """Returns the attribute referenced by a "module:attribute" (or "module.attribute") path"""
+    import importlib
+    if ":" in path:
+        module_name, attribute = path.split(":", 1)
+    else:
+        module_name, attribute = path.rsplit(".", 1)
+    module = importlib.import_module(module_name)
+    for name in attribute.split("."):
+        module = getattr(module, name)
+    return module
+
+
+def like_prefix(prefix):
+    """Returns a LIKE pattern matching the names that start with the prefix"""
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
 def get_database_name(branch_name):
+    import slugify
     from branchdb.conf import settings
     normalized_branch_name = slugify.slugify(branch_name, separator=settings.NAME_SEPARATOR)
     return settings.NAME_SCHEME.format(
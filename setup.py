@@ -2,6 +2,7 @@
 
 import io
 import os
+import re
 from setuptools import find_packages, setup
 try: # for pip >= 10
     from pip._internal.req import parse_requirements
@@ -19,6 +20,11 @@ def get_requirements(filename):
     return list(str(ir.req) for ir in install_reqs)
 
 
+def get_version():
+    with io.open(local_path("branchdb", "__init__.py")) as init_file:
+        return re.search(r"^__version__ = \"(.+)\"$", init_file.read(), re.MULTILINE).group(1)
+
+
 reqs = get_requirements("requirements.txt")
 test_reqs = get_requirements("requirements-test.txt")
 
@@ -30,7 +36,7 @@ os.chdir(os.path.normpath(os.path.join(os.path.abspath(__file__), os.pardir)))
 
 setup(
     name='branchdb',
-    version="0.0.1",
+    version=get_version(),
     packages=find_packages(exclude=["tests"]),
     include_package_data=True,
     license="MIT License",
@@ -43,6 +49,17 @@ setup(
     scripts=[
         "bin/branchdb"
     ],
+    entry_points={
+        "branchdb.engines": [
+            "postgres = branchdb.engines.postgres:PostgresEngine",
+            "sqlite = branchdb.engines.sqlite:SqliteEngine",
+            "mysql = branchdb.engines.mysql:MysqlEngine",
+            "redis = branchdb.engines.redis:RedisEngine",
+        ],
+        "branchdb.async_engines": [
+            "postgres = branchdb.engines.postgres.async_postgres_engine:AsyncPostgresEngine",
+        ],
+    },
     classifiers=[
         "Intended Audience :: Developers",
         "License :: OSI Approved :: MIT License",
@@ -56,5 +73,9 @@ setup(
         "Programming Language :: Python :: 3.6"
     ],
     install_requires=reqs,
+    extras_require={
+        "mysql": ["PyMySQL"],
+        "redis": ["redis>=3.0"],
+    },
     tests_require=test_reqs
 )
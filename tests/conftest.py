@@ -7,12 +7,43 @@ from __future__ import unicode_literals
 import os
 import pytest
 import mock
+import six
+from branchdb import cache, database, frozen, project
 from . import data_folder, mocking
 
+# the asyncio engines and operations use syntax that Python 2 can not parse
+collect_ignore = ["test_async_postgres.py", os.path.join("test_database", "test_aio.py")] if six.PY2 else []
+
 
 @pytest.fixture(scope="session", autouse=True)
 def mock_project():
     project_root = os.path.join(data_folder, "mock_project_root")
     mock_repo = mocking.MockRepo(active_branch_name="test", project_root=project_root)
-    with mock.patch("branchdb.git_tools.get_repo", return_value=mock_repo) as _fixture:
-        yield _fixture
+    with mock.patch("branchdb.git_tools.find_git_dir", return_value=None):
+        with mock.patch("branchdb.git_tools.get_repo", return_value=mock_repo) as _fixture:
+            yield _fixture
+
+
+@pytest.fixture(scope="session", autouse=True)
+def settings_cache_outside_data(tmp_path_factory):
+    """Keeps the settings cache of the fixture projects out of the source tree"""
+    cache_root = str(tmp_path_factory.mktemp("settings_cache"))
+    settings_cache_path = cache._settings_cache_path
+
+    def redirect(settings_path):
+        path = settings_cache_path(settings_path)
+        if os.path.commonprefix([os.path.abspath(path), data_folder]) == data_folder:
+            return os.path.join(cache_root, os.path.relpath(path, data_folder))
+        return path
+
+    with mock.patch("branchdb.cache._settings_cache_path", side_effect=redirect):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_project_cache():
+    project.clear_cache()
+    database.invalidate()
+    frozen.clear_cache()
+    yield
+    database.close_connections()
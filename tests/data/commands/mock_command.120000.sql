@@ -0,0 +1 @@
+SELECT {} FROM ONLY {arg2}
@@ -0,0 +1 @@
+SELECT {} FROM {arg2} TABLESAMPLE SYSTEM (1)
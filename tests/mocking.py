@@ -86,6 +86,9 @@ def mock_postgres_cursor(fetchall_return=None):
         def fetchall(self, *args, **kwargs):
             return fetchall_return
 
+        def close(self):
+            pass
+
     return MockCursor
 
 
@@ -94,6 +97,8 @@ class MockConnectionInfo(object):
 
 
 class MockConnection(object):
+    server_version = 90600
+
     def __init__(self, *args, **kwargs):
         self.info = MockConnectionInfo()
 
@@ -107,3 +112,9 @@ class MockConnection(object):
 class MockEngine(BaseEngine):
     slug = "mock"
     connection = None
+
+    def disconnect(self):
+        pass
+
+    def all_databases(self, prefix=None):
+        return []
@@ -0,0 +1,96 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+import os
+import mock
+import pytest
+import psycopg2.extensions
+from branchdb.errors import DatabaseError
+from branchdb.engines import get_async_engine
+from branchdb.engines.postgres import async_postgres_engine
+from branchdb.engines.postgres.async_postgres_engine import AsyncPostgresEngine
+from .mocking import mock_postgres_cursor, MockConnection
+
+
+class MockAsyncConnection(MockConnection):
+    def __init__(self, states=None):
+        super(MockAsyncConnection, self).__init__()
+        self.states = list(states or [])
+        self.cursor = mock_postgres_cursor([["db1"], ["db2"]])
+
+    def poll(self):
+        if self.states:
+            return self.states.pop(0)
+        return psycopg2.extensions.POLL_OK
+
+    def fileno(self):
+        return self.fd
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def connected_engine():
+    engine = AsyncPostgresEngine()
+    engine.connection = MockAsyncConnection()
+    engine._lock = asyncio.Lock()
+    return engine
+
+
+def test_get_async_engine():
+    assert get_async_engine("postgres") is AsyncPostgresEngine
+
+
+def test_wait__waits_for_the_socket():
+    read_fd, write_fd = os.pipe()
+    try:
+        connection = MockAsyncConnection(states=[psycopg2.extensions.POLL_READ])
+        connection.fd = read_fd
+        os.write(write_fd, b"x")
+        run(async_postgres_engine.wait(connection))
+        assert connection.states == []
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def test_all_databases():
+    async def all_databases():
+        engine = connected_engine()
+        return await engine.all_databases()
+    assert run(all_databases()) == ["db1", "db2"]
+
+
+@mock.patch("branchdb.engines.postgres.async_postgres_engine.AsyncPostgresEngine._execute")
+def test_create_database(mock_execute):
+    async def execute(command, params=None, fetch=False):
+        return [["db1"]]
+    mock_execute.side_effect = execute
+
+    async def create_database():
+        engine = connected_engine()
+        return await engine.create_database("jazz", template="template_db")
+    assert run(create_database()) is True
+    assert mock_execute.call_count == 3
+
+
+def test_delete_database__does_not_exist():
+    async def delete_database():
+        engine = connected_engine()
+        return await engine.delete_database("jazz")
+    with pytest.raises(DatabaseError, match="Database 'jazz' does not exist."):
+        run(delete_database())
+
+
+def test_execute__not_connected():
+    with pytest.raises(DatabaseError):
+        run(AsyncPostgresEngine().all_databases())
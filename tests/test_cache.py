@@ -0,0 +1,175 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import time
+import mock
+import threading
+import pytest
+from branchdb import cache, database
+from branchdb.conf import settings
+from branchdb.project import Project
+from branchdb.repo_mapping import RepoMapping
+from .mocking import make_temp_mapping_file
+
+
+@pytest.fixture
+def project(tmp_path):
+    git_dir = tmp_path / ".git"
+    git_dir.mkdir()
+    (git_dir / "HEAD").write_text(u"ref: refs/heads/test1\n")
+    content = {"master": "branch_master", "test1": "branch_test1"}
+    with make_temp_mapping_file(tmp_path, content=content):
+        (tmp_path / ".branchdb" / "settings.py").write_text(u"DATABASES = []\n")
+    return Project(str(tmp_path), git_dir=str(git_dir))
+
+
+def test_resolution_signature__no_git_dir(tmp_path):
+    assert cache.resolution_signature(Project(str(tmp_path))) is None
+
+
+def test_cached_database(project):
+    signature = cache.resolution_signature(project)
+    assert cache.get_cached_database(project, None, signature) is None
+
+    cache.set_cached_database(project, None, "branch_test1", signature)
+    cache.set_cached_database(project, "postgres", "branch_test1_pg", signature)
+    assert cache.get_cached_database(project, None, signature) == "branch_test1"
+    assert cache.get_cached_database(project, "postgres", signature) == "branch_test1_pg"
+
+
+def test_cached_database__branch_change(project):
+    signature = cache.resolution_signature(project)
+    cache.set_cached_database(project, None, "branch_test1", signature)
+
+    head = os.path.join(project.git_dir, "HEAD")
+    os.remove(head)
+    with open(head, "w") as head_file:
+        head_file.write("ref: refs/heads/master\n")
+    signature = cache.resolution_signature(project)
+    assert cache.get_cached_database(project, None, signature) is None
+
+
+def test_cached_database__mapping_update(project):
+    signature = cache.resolution_signature(project)
+    cache.set_cached_database(project, None, "branch_test1", signature)
+
+    with RepoMapping(project.root) as mapping:
+        mapping["test1"] = "branch_other"
+    assert os.path.exists(os.path.join(cache.cache_folder(project.root), cache.RESOLUTION_FILE)) is False
+
+
+@mock.patch("branchdb.database.read.get_default_database")
+def test_get_current_database__warm(mock_default, project):
+    mock_default.return_value = None
+    assert database.get_current_database(project=project) == "branch_test1"
+
+    wrapped = settings._wrapped
+    settings._wrapped = None
+    try:
+        with mock.patch("branchdb.database.read.repo_mapping.RepoMapping") as mock_mapping:
+            assert database.get_current_database(project=project) == "branch_test1"
+        # a warm lookup never loads the settings
+        assert settings._wrapped is None
+    finally:
+        settings._wrapped = wrapped
+    assert mock_mapping.called is False
+    assert mock_default.call_count == 1
+
+
+def test_resolution_memo(project):
+    memo = cache.ResolutionMemo()
+    memo.set(project, None, "branch_test1", ["signature"])
+    assert memo.get(project, None, ["signature"]) == "branch_test1"
+    assert memo.get(project, None, ["changed"]) is None
+    assert memo.get(project, "postgres", ["signature"]) is None
+
+    memo.invalidate()
+    assert memo.get(project, None, ["signature"]) is None
+
+
+def test_resolution_memo__no_signature(project):
+    memo = cache.ResolutionMemo()
+    memo.set(project, None, "branch_test1", None)
+    assert memo.get(project, None, None) is None
+
+    memo.ttl = 60
+    assert memo.get(project, None, None) == "branch_test1"
+
+    # an entry's own ttl wins over the memo's
+    memo.set(project, None, "branch_test1", None, ttl=5)
+    with mock.patch("branchdb.cache.time.time", return_value=time.time() + 30):
+        assert memo.get(project, None, None) is None
+
+
+@mock.patch("branchdb.cache.time.time")
+def test_resolution_memo__ttl(mock_time, project):
+    mock_time.return_value = 1000
+    memo = cache.ResolutionMemo(ttl=5)
+    memo.set(project, None, "branch_test1", ["signature"])
+
+    mock_time.return_value = 1005
+    assert memo.get(project, None, ["signature"]) == "branch_test1"
+    mock_time.return_value = 1006
+    assert memo.get(project, None, ["signature"]) is None
+
+
+@mock.patch("branchdb.database.read.get_default_database")
+def test_get_current_database__memoized(mock_default, project):
+    mock_default.return_value = None
+    assert database.get_current_database(project=project) == "branch_test1"
+
+    with mock.patch("branchdb.database.read.cache.get_cached_database") as mock_cached:
+        assert database.get_current_database(project=project) == "branch_test1"
+        assert mock_cached.called is False
+
+        database.invalidate()
+        mock_cached.return_value = "branch_test1"
+        assert database.get_current_database(project=project) == "branch_test1"
+        assert mock_cached.called is True
+
+
+@mock.patch("branchdb.database.read.get_default_database")
+def test_get_current_database__threads(mock_default, project):
+    mock_default.return_value = None
+    results = []
+
+    def resolve():
+        for _ in range(50):
+            results.append(database.get_current_database(project=project))
+
+    threads = [threading.Thread(target=resolve) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["branch_test1"] * 400
+
+
+def test_clone_strategy(tmp_path):
+    assert cache.get_clone_strategy(str(tmp_path), "main") is None
+    cache.set_clone_strategy(str(tmp_path), "main", "file_copy", {"wal_log": 2.0, "file_copy": 1.0})
+    cache.set_clone_strategy(str(tmp_path), "replica", "wal_log", {"wal_log": 1.0, "file_copy": 2.0})
+    assert cache.get_clone_strategy(str(tmp_path), "main") == "file_copy"
+    assert cache.get_clone_strategy(str(tmp_path), "replica") == "wal_log"
+
+
+@mock.patch("branchdb.database.read.mapping_backends.backend_class")
+@mock.patch("branchdb.database.read.get_default_database")
+def test_get_current_database__shared_mapping(mock_default, mock_backend_class, project):
+    mock_default.return_value = None
+    mock_backend_class.return_value.shared = True
+    mock_backend_class.return_value.return_value.get.return_value = "branch_test1"
+    assert database.get_current_database(project=project) == "branch_test1"
+    # other machines change a shared mapping, so only this process remembers it, for a while
+    assert os.path.exists(os.path.join(cache.cache_folder(project.root), cache.RESOLUTION_FILE)) is False
+    with mock.patch("branchdb.database.read.repo_mapping.RepoMapping") as mock_mapping:
+        assert database.get_current_database(project=project) == "branch_test1"
+        assert mock_mapping.called is False
+
+        with mock.patch("branchdb.cache.time.time", return_value=time.time() + 60):
+            database.get_current_database(project=project)
+        assert mock_mapping.called is True
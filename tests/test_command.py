@@ -12,7 +12,9 @@ import six
 import json
 from branchdb.commands.branchdb_command import (
     run_tools_command, run_init_command,
-    run_create_command, run_delete_command)
+    run_create_command, run_delete_command,
+    run_hooks_command, run_pool_command, print_copy_progress)
+from branchdb import database
 from . import mocking, data_folder
 
 command_data_folder = os.path.join(os.path.realpath(".."), "branchdb", "commands", "data")
@@ -27,10 +29,10 @@ class Args(object):
 
 @mock.patch("branchdb.commands.branchdb_command.database.get_current_database")
 def test_run_tools_command__current_branch(mock_current):
-    run_tools_command(Args(current=False, set=None))
+    run_tools_command(Args(current=False, set=None, bench_clone=False, import_mapping=None))
     assert mock_current.called is False
 
-    run_tools_command(Args(current=True, set=None))
+    run_tools_command(Args(current=True, set=None, bench_clone=False, import_mapping=None))
     assert mock_current.called is True
 
 
@@ -56,6 +58,9 @@ def test_run_init_command(mock_root, tmp_path):
     with io.open(mapping_location, "rb") as file_:
         assert json.loads(file_.read()) == {}
 
+    with io.open(os.path.join(str(tmp_path), ".branchdb", ".gitignore"), "rb") as file_:
+        assert file_.read() == b".cache/\nmappings.sqlite3*\nfrozen.json\n"
+
 
 @mock.patch("branchdb.commands.branchdb_command.git_tools.get_project_root")
 def test_run_init_command__empty(mock_root, tmp_path):
@@ -95,21 +100,32 @@ def test_run_init_command__existing_setup(mock_root, tmp_path):
 def test_run_create_command(mock_create):
     args = Args(branch=None, template_branch=None, template_database=None)
     run_create_command(args, dry_run=True)
-    mock_create.assert_called_with("test", template=None, dry_run=True)
+    mock_create.assert_called_with("test", template=None, dry_run=True, project=mock.ANY, progress=print_copy_progress)
+
+
+def test_print_copy_progress(capsys):
+    from branchdb.engines.postgres.template_copy import CopyProgress
+    progress = CopyProgress(
+        template="tpl", database="branch_test", tables=4, copied_tables=1,
+        total_bytes=8 * 1024 * 1024, copied_bytes=3 * 1024 * 1024, elapsed=2.0)
+    print_copy_progress(progress)
+    assert capsys.readouterr().out == "Copying 'tpl' into 'branch_test': 1/4 tables, 3.0 MB at 1.5 MB/s\n"
 
 
 @mock.patch("branchdb.commands.branchdb_command.database.create_databases")
 def test_run_create_command__template__database(mock_create):
     args = Args(branch=None, template_branch=None, template_database="branch_master")
     run_create_command(args, dry_run=True)
-    mock_create.assert_called_with("test", template="branch_master", dry_run=True)
+    mock_create.assert_called_with(
+        "test", template="branch_master", dry_run=True, project=mock.ANY, progress=print_copy_progress)
 
 
 @mock.patch("branchdb.commands.branchdb_command.database.create_databases")
 def test_run_create_command__template__branch(mock_create):
     args = Args(branch=None, template_branch="jazz", template_database=None)
     run_create_command(args, dry_run=True)
-    mock_create.assert_called_with("test", template="branch_jazz", dry_run=True)
+    mock_create.assert_called_with(
+        "test", template="branch_jazz", dry_run=True, project=mock.ANY, progress=print_copy_progress)
 
 
 @mock.patch("branchdb.commands.branchdb_command.database.create_databases")
@@ -134,15 +150,15 @@ def test_run_create_command__specified_branch(mock_repo, mock_create):
     mock_repo.return_value = mocking.MockRepo(active_branch_name="test1", project_root=project_root)
     args = Args(branch="test2", template_branch=None, template_database=None)
     run_create_command(args, dry_run=True)
-    mock_create.assert_called_with("test2", template=None, dry_run=True)
+    mock_create.assert_called_with("test2", template=None, dry_run=True, project=mock.ANY, progress=print_copy_progress)
 
 
 @mock.patch("branchdb.commands.branchdb_command.database.clean_databases")
 @mock.patch("branchdb.commands.branchdb_command.database.delete_databases")
 def test_run_delete_command(mock_delete, mock_clean):
-    args = Args(branch=None, clean=False, all=False)
+    args = Args(branch=None, clean=False, all=False, force=None, match=None, regex=False)
     run_delete_command(args)
-    mock_delete.assert_called_with("test")
+    mock_delete.assert_called_with("test", project=mock.ANY, force=None)
     assert mock_clean.called is False
 
 
@@ -151,9 +167,9 @@ def test_run_delete_command(mock_delete, mock_clean):
 @mock.patch("branchdb.commands.branchdb_command.git_tools.get_repo")
 def test_run_delete_command__specified_branch(mock_repo, mock_delete, mock_clean):
     mock_repo.return_value = mocking.MockRepo(active_branch_name="test1", project_root=project_root)
-    args = Args(branch="test2", clean=False, all=False)
+    args = Args(branch="test2", clean=False, all=False, force=None, match=None, regex=False)
     run_delete_command(args)
-    mock_delete.assert_called_with("test2")
+    mock_delete.assert_called_with("test2", project=mock.ANY, force=None)
     assert mock_clean.called is False
 
 
@@ -161,7 +177,7 @@ def test_run_delete_command__specified_branch(mock_repo, mock_delete, mock_clean
 @mock.patch("branchdb.commands.branchdb_command.database.delete_databases")
 @mock.patch("branchdb.commands.branchdb_command.database.delete_all_databases")
 def test_run_delete_command__all(mock_delete_all, mock_delete, mock_clean):
-    args = Args(branch="test2", clean=True, all=True)
+    args = Args(branch="test2", clean=True, all=True, force=None, match=None, regex=False)
     run_delete_command(args)
     assert mock_delete_all.called is True
     assert mock_delete.called is False
@@ -171,7 +187,7 @@ def test_run_delete_command__all(mock_delete_all, mock_delete, mock_clean):
 @mock.patch("branchdb.commands.branchdb_command.database.clean_databases")
 @mock.patch("branchdb.commands.branchdb_command.database.delete_databases")
 def test_run_delete_command__clean(mock_delete, mock_clean):
-    args = Args(branch=None, clean=True, all=False)
+    args = Args(branch=None, clean=True, all=False, force=None, match=None, regex=False)
     run_delete_command(args)
     assert mock_delete.called is False
     assert mock_clean.called is True
@@ -182,7 +198,73 @@ def test_run_delete_command__clean(mock_delete, mock_clean):
 @mock.patch("branchdb.commands.branchdb_command.git_tools.get_repo")
 def test_run_delete_command__clean_and_delete(mock_repo, mock_delete, mock_clean):
     mock_repo.return_value = mocking.MockRepo(active_branch_name="test1", project_root=project_root)
-    args = Args(branch="test2", clean=True, all=False)
+    args = Args(branch="test2", clean=True, all=False, force=None, match=None, regex=False)
     run_delete_command(args)
-    mock_delete.assert_called_with("test2")
+    mock_delete.assert_called_with("test2", project=mock.ANY, force=None)
     assert mock_clean.called is True
+
+
+@mock.patch("branchdb.commands.branchdb_command.database.clean_databases")
+@mock.patch("branchdb.commands.branchdb_command.database.delete_databases")
+def test_run_delete_command__force(mock_delete, mock_clean):
+    args = Args(branch=None, clean=True, all=False, force=True, match=None, regex=False)
+    run_delete_command(args)
+    mock_clean.assert_called_with(project=mock.ANY, force=True)
+
+
+@mock.patch("branchdb.commands.branchdb_command.database.bench_clone_strategies")
+def test_run_tools_command__bench_clone(mock_bench, capsys):
+    mock_bench.return_value = [
+        database.CloneBenchmark("main", "file_copy", {"wal_log": 3.0, "file_copy": 1.0}, {})]
+    run_tools_command(Args(current=False, set=None, bench_clone=True, import_mapping=None))
+    assert capsys.readouterr().out == "main: file_copy (file_copy 1.00s, wal_log 3.00s)\n"
+
+
+@mock.patch("branchdb.commands.branchdb_command.repo_mapping.import_mapping")
+def test_run_tools_command__import_mapping(mock_import, capsys):
+    mock_import.return_value = 3
+    run_tools_command(Args(current=False, set=None, bench_clone=False, import_mapping="json"))
+    mock_import.assert_called_with(mock.ANY, "json")
+    assert capsys.readouterr().out == "Imported 3 branches from the 'json' mapping\n"
+
+
+@mock.patch("branchdb.commands.branchdb_command.database.refill_pools")
+def test_run_pool_command__refill(mock_refill, capsys):
+    mock_refill.return_value = database.ExecutionResult(total=2, success=2)
+    run_pool_command(Args(action="refill", background=False))
+    assert mock_refill.called is True
+    assert capsys.readouterr().out == "Successfully cloned or dropped '2' spare databases\n"
+
+
+@mock.patch("branchdb.commands.branchdb_command.database.refill_pools")
+@mock.patch("branchdb.commands.branchdb_command.subprocess.Popen")
+def test_run_pool_command__background(mock_popen, mock_refill):
+    run_pool_command(Args(action="refill", background=True))
+    assert mock_refill.called is False
+    command = mock_popen.call_args[0][0]
+    assert command[1:] == ["-m", "branchdb.commands.branchdb_command", "pool", "refill"]
+
+
+@mock.patch("branchdb.commands.branchdb_command.hooks.install_hooks")
+def test_run_hooks_command__install(mock_install):
+    run_hooks_command(Args(action="install"))
+    assert mock_install.called is True
+
+
+@mock.patch("branchdb.commands.branchdb_command.database.get_current_database")
+@mock.patch("branchdb.commands.branchdb_command.database.get_current_databases")
+def test_run_hooks_command__run(mock_databases, mock_current):
+    run_hooks_command(Args(action="run"))
+    assert mock_databases.called is True
+    assert mock_current.called is True
+
+
+@mock.patch("branchdb.commands.branchdb_command.database.delete_databases")
+@mock.patch("branchdb.commands.branchdb_command.database.delete_matching_databases")
+def test_run_delete_command__match(mock_delete_matching, mock_delete, capsys):
+    mock_delete_matching.return_value = database.ExecutionResult(total=3, success=3)
+    args = Args(branch=None, clean=False, all=False, force=None, match="feature/*", regex=False)
+    run_delete_command(args)
+    mock_delete_matching.assert_called_with("feature/*", project=mock.ANY, force=None, regex=False)
+    assert mock_delete.called is False
+    assert capsys.readouterr().out == "Successfully deleted '3' databases\n"
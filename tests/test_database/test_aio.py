@@ -0,0 +1,160 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+import mock
+import pytest
+import threading
+from branchdb import errors
+from branchdb.conf import settings
+from branchdb.database import aio
+from branchdb.engines.async_engine import BaseAsyncEngine
+from .. import mocking
+from . import mock_db_info
+
+
+class MockAsyncEngine(BaseAsyncEngine):
+    slug = "mock"
+    databases = ()
+    running = 0
+    most_running = 0
+
+    def __init__(self):
+        self.created = list()
+        self.deleted = list()
+
+    async def connect(self, user=None, password=None, host="localhost", port=""):
+        if user is None:
+            raise errors.ConnectionError("Unable to connect")
+        self.connection = user
+
+    async def disconnect(self):
+        self.connection = None
+
+    async def all_databases(self, prefix=None):
+        return list(self.databases)
+
+    async def create_database(self, database_name, template=None):
+        MockAsyncEngine.running += 1
+        MockAsyncEngine.most_running = max(MockAsyncEngine.running, MockAsyncEngine.most_running)
+        # long enough for the other connections to resolve their clone strategy on the executor
+        await asyncio.sleep(0.05)
+        MockAsyncEngine.running -= 1
+        if template == "broken":
+            raise errors.DatabaseError("Unable to create")
+        self.created.append((database_name, template))
+        return True
+
+    async def delete_database(self, database_name, force=False):
+        self.deleted.append(database_name)
+        return True
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def engines():
+    created = list()
+    original = MockAsyncEngine.connect
+
+    async def connect(self, *args, **kwargs):
+        created.append(self)
+        return await original(self, *args, **kwargs)
+
+    MockAsyncEngine.most_running = 0
+    with mock.patch.object(MockAsyncEngine, "connect", connect):
+        yield created
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+def test_create_databases(engines):
+    result = run(aio.create_databases("jazz", dry_run=True))
+    assert result.total == 2
+    assert result.success == 2
+    assert set(engine.created[0] for engine in engines) == {
+        ("branch_jazz", None),
+        ("branch_jazz", "test_template")}
+    assert all(engine.connected is False for engine in engines)
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=[dict(info, TEMPLATE="broken") for info in mock_db_info])
+def test_create_databases__bad_create(engines):
+    result = run(aio.create_databases("jazz", dry_run=True))
+    assert result.total == 2
+    assert result.success == 0
+    assert set(error.database for error in result.errors) == {"branch_jazz"}
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=[mock_db_info[0], dict(mock_db_info[1], USER=None)])
+def test_create_databases__bad_connect(engines):
+    result = run(aio.create_databases("jazz", dry_run=True))
+    assert result.total == 2
+    assert result.success == 1
+    assert len(result.errors) == 1
+    assert result.errors[0].database == "branch_jazz"
+    assert isinstance(result.errors[0].error, errors.ConnectionError)
+    assert sorted(len(engine.created) for engine in engines) == [0, 1]
+    assert all(engine.connected is False for engine in engines)
+
+
+@mocking.monkey_patch(o=settings, k="MAX_CONCURRENCY", v=1)
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+def test_create_databases__max_concurrency(engines):
+    run(aio.create_databases("jazz", dry_run=True))
+    assert MockAsyncEngine.most_running == 1
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+def test_create_databases__concurrent(engines):
+    run(aio.create_databases("jazz", dry_run=True))
+    assert MockAsyncEngine.most_running == 2
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("branchdb.database.aio._stale_databases")
+def test_clean_databases(mock_stale, engines):
+    mock_stale.return_value.__enter__.return_value = ["branch_test1", "branch_test2"]
+    result = run(aio.clean_databases())
+    assert result.total == 4
+    assert result.success == 4
+    assert all(engine.deleted == ["branch_test1", "branch_test2"] for engine in engines)
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("branchdb.database.aio._stale_databases")
+def test_clean_databases__executor(mock_stale, engines):
+    # git and the mapping are only touched from the executor, off the event loop's thread
+    threads = list()
+
+    def enter():
+        threads.append(threading.current_thread())
+        return ["branch_test1"]
+
+    mock_stale.return_value.__enter__.side_effect = enter
+    mock_stale.return_value.__exit__.side_effect = lambda *args: threads.append(threading.current_thread())
+    result = run(aio.clean_databases())
+    assert result.success == 2
+    assert len(threads) == 2
+    assert threading.current_thread() not in threads
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("branchdb.repo_mapping.RepoMapping.remove")
+@mock.patch("branchdb.git_tools.get_repo")
+def test_delete_databases(mock_repo, mock_remove, engines, tmp_path):
+    with mocking.make_temp_mapping_file(tmp_path, content={"test1": "branch_test1"}):
+        mock_repo.return_value = mocking.MockRepo(project_root=str(tmp_path))
+
+    result = run(aio.delete_databases("test1"))
+    assert result.total == 2
+    assert all(engine.deleted == ["branch_test1"] for engine in engines)
+    mock_remove.assert_called_once_with("test1")
@@ -6,8 +6,9 @@ from __future__ import unicode_literals
 
 import mock
 import pytest
-from branchdb import database, errors
+from branchdb import cache, database, errors
 from branchdb.conf import settings
+from branchdb.project import Project
 from .. import mocking
 from . import mock_db_info
 
@@ -28,7 +29,7 @@ def test_create_databases(mock_connect, mock_create):
     expected_calls = [
         mock.call("branch_jazz", template="test_template"),
         mock.call("branch_jazz", template=None)]
-    mock_create.assert_has_calls(expected_calls)
+    mock_create.assert_has_calls(expected_calls, any_order=True)
 
 
 @mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
@@ -38,9 +39,12 @@ def test_create_databases__bad_connect(mock_connect, mock_create):
     mock_connect.side_effect = [errors.ConnectionError(), True]
     mock_create.side_effect = [True, True]
 
-    with pytest.raises(errors.ConnectionError):
-        database.create_databases("jazz", dry_run=True)
-    assert mock_create.called is False
+    result = database.create_databases("jazz", dry_run=True)
+    # the unreachable connection fails its database without holding back the other one
+    assert result.total == 2
+    assert result.success == 1
+    assert isinstance(result.errors[0].error, errors.ConnectionError)
+    assert mock_create.call_count == 1
 
 
 @mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
@@ -48,10 +52,130 @@ def test_create_databases__bad_connect(mock_connect, mock_create):
 @mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
 def test_create_databases__bad_create(mock_connect, mock_create):
     mock_connect.side_effect = [True, True]
-    mock_create.side_effect = [Exception(), True]
+    error = Exception("Unable to create")
+    mock_create.side_effect = [error, True]
 
     result = database.create_databases("jazz", dry_run=True)
     assert result.total == 2
     assert result.success == 1
     assert mock_connect.call_count == 2
     assert mock_create.call_count == 2
+    assert len(result.errors) == 1
+    assert result.errors[0].database == "branch_jazz"
+    assert result.errors[0].error is error
+    assert sorted(engine.success for engine in result.engines) == [0, 1]
+
+
+strategy_db_info = [
+    dict(mock_db_info[0], CLONE_STRATEGY="file_copy"),
+    dict(mock_db_info[1], TEMPLATE="test_template")]
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=strategy_db_info)
+@mock.patch("tests.mocking.MockEngine.clone_strategies", ("wal_log", "file_copy"))
+@mock.patch("branchdb.engines.base_engine.BaseEngine.create_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_create_databases__clone_strategy(mock_connect, mock_create, tmp_path):
+    project = Project(str(tmp_path))
+    cache.set_clone_strategy(project.root, "mock@localhost:8002", "wal_log", {"wal_log": 1.0, "file_copy": 2.0})
+
+    result = database.create_databases("jazz", dry_run=True, project=project)
+    assert result.success == 2
+    expected_calls = [
+        mock.call("branch_jazz", template="test_template", strategy="file_copy"),
+        # "auto" uses the benchmark's winner
+        mock.call("branch_jazz", template="test_template", strategy="wal_log")]
+    mock_create.assert_has_calls(expected_calls, any_order=True)
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=[dict(mock_db_info[0], CLONE_STRATEGY="copy")])
+@mock.patch("tests.mocking.MockEngine.clone_strategies", ("wal_log", "file_copy"))
+@mock.patch("branchdb.engines.base_engine.BaseEngine.create_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_create_databases__unknown_clone_strategy(mock_connect, mock_create, tmp_path):
+    with pytest.raises(errors.ImproperlyConfigured, match="Unknown clone strategy 'copy'"):
+        database.create_databases("jazz", dry_run=True, project=Project(str(tmp_path)))
+    assert mock_create.called is False
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=[mock_db_info[0]])
+@mocking.monkey_patch(o=settings, k="CLONE_STRATEGY", v="file_copy")
+@mock.patch("tests.mocking.MockEngine.clone_strategies", ("dump",))
+@mock.patch("branchdb.engines.base_engine.BaseEngine.create_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_create_databases__global_clone_strategy_unsupported(mock_connect, mock_create, tmp_path):
+    result = database.create_databases("jazz", dry_run=True, project=Project(str(tmp_path)))
+    assert result.success == 1
+    mock_create.assert_called_once_with("branch_jazz", template="test_template")
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("tests.mocking.MockEngine.clone_strategies", ("wal_log", "file_copy"))
+@mock.patch("branchdb.engines.base_engine.BaseEngine.delete_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.create_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.database_exists")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+@mock.patch("branchdb.database.create.timeit.default_timer")
+def test_bench_clone_strategies(mock_timer, mock_connect, mock_exists, mock_create, mock_delete, tmp_path):
+    # wal_log takes 3 seconds, file_copy takes 1 second
+    mock_timer.side_effect = [0.0, 3.0, 10.0, 11.0]
+    mock_exists.side_effect = [False, True, False, True]
+    project = Project(str(tmp_path))
+
+    benchmarks = database.bench_clone_strategies(project=project)
+    assert len(benchmarks) == 1
+    assert benchmarks[0].connection == "mock@localhost:8001"
+    assert benchmarks[0].strategy == "file_copy"
+    assert benchmarks[0].timings == {"wal_log": 3.0, "file_copy": 1.0}
+    db_name = mock_create.call_args[0][0]
+    # the scratch database is outside the naming scheme
+    assert db_name.startswith("branchdb_bench_")
+    mock_create.assert_has_calls([
+        mock.call(db_name, template="test_template", strategy="wal_log"),
+        mock.call(db_name, template="test_template", strategy="file_copy")])
+    mock_delete.assert_has_calls([mock.call(db_name, force=True)] * 2)
+    assert cache.get_clone_strategy(project.root, "mock@localhost:8001") == "file_copy"
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("tests.mocking.MockEngine.clone_strategies", ("wal_log", "file_copy"))
+@mock.patch("branchdb.engines.base_engine.BaseEngine.delete_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.create_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.database_exists")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_bench_clone_strategies__existing_database(mock_connect, mock_exists, mock_create, mock_delete, tmp_path):
+    mock_exists.return_value = True
+
+    benchmarks = database.bench_clone_strategies(project=Project(str(tmp_path)))
+    # a database that the benchmark did not create is never dropped
+    assert benchmarks[0].strategy is None
+    assert set(benchmarks[0].errors) == {"wal_log", "file_copy"}
+    assert mock_create.called is False
+    assert mock_delete.called is False
+
+
+copy_db_info = [
+    dict(mock_db_info[0], ALIAS="local", TEMPLATE_SERVER="remote", COPY_JOBS=2),
+    dict(mock_db_info[1], ALIAS="remote")]
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=copy_db_info)
+@mock.patch("branchdb.engines.base_engine.BaseEngine.copy_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.create_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_create_databases__template_server(mock_connect, mock_create, mock_copy):
+    progress = mock.Mock()
+    result = database.create_databases("jazz", dry_run=True, progress=progress)
+    assert result.success == 2
+    source = dict(user="user2", password="password2", host="localhost", port="8002")
+    mock_copy.assert_called_once_with("branch_jazz", "test_template", source, jobs=2, progress=progress)
+    mock_create.assert_called_once_with("branch_jazz", template=None)
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=[dict(mock_db_info[0], TEMPLATE_SERVER="missing")])
+@mock.patch("branchdb.engines.base_engine.BaseEngine.copy_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_create_databases__unknown_template_server(mock_connect, mock_copy):
+    with pytest.raises(errors.ImproperlyConfigured, match="No database connection has the ALIAS 'missing'"):
+        database.create_databases("jazz", dry_run=True)
+    assert mock_copy.called is False
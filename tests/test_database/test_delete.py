@@ -7,7 +7,7 @@ from __future__ import unicode_literals
 import mock
 import pytest
 import six
-from branchdb import database, errors
+from branchdb import database, errors, repo_mapping
 from branchdb.conf import settings
 from branchdb.database.delete import _stale_databases
 from .. import mocking
@@ -18,7 +18,7 @@ from . import mock_db_info
 @mock.patch("branchdb.repo_mapping.RepoMapping.remove")
 @mock.patch("branchdb.engines.base_engine.BaseEngine.delete_database")
 @mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
-@mock.patch("branchdb.database.delete.git_tools.get_repo")
+@mock.patch("branchdb.git_tools.get_repo")
 def test_delete_all_databases(mock_repo, mock_connect, mock_delete, mock_remove, tmp_path):
     mock_connect.side_effect = [True, True]
     mock_delete.side_effect = [True] * 8
@@ -43,7 +43,7 @@ def test_delete_all_databases(mock_repo, mock_connect, mock_delete, mock_remove,
 @mock.patch("branchdb.repo_mapping.RepoMapping.remove")
 @mock.patch("branchdb.engines.base_engine.BaseEngine.delete_database")
 @mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
-@mock.patch("branchdb.database.delete.git_tools.get_repo")
+@mock.patch("branchdb.git_tools.get_repo")
 def test_delete_all_databases__bad_connect(mock_repo, mock_connect, mock_delete, mock_remove, tmp_path):
     mock_connect.side_effect = [errors.ConnectionError(), True]
     mock_delete.side_effect = [True] * 8
@@ -56,17 +56,19 @@ def test_delete_all_databases__bad_connect(mock_repo, mock_connect, mock_delete,
     with mocking.make_temp_mapping_file(tmp_path, content=content):
         mock_repo.return_value = mocking.MockRepo(project_root=str(tmp_path))
 
-    with pytest.raises(errors.ConnectionError):
-        database.delete_all_databases()
-    assert mock_delete.called is False
-    assert mock_remove.called is False
+    result = database.delete_all_databases()
+    # the unreachable connection fails its databases without holding back the other one
+    assert result.total == 8
+    assert result.success == 4
+    assert all(isinstance(error.error, errors.ConnectionError) for error in result.errors)
+    assert mock_delete.call_count == 4
 
 
 @mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
 @mock.patch("branchdb.repo_mapping.RepoMapping.remove")
 @mock.patch("branchdb.engines.base_engine.BaseEngine.delete_database")
 @mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
-@mock.patch("branchdb.database.delete.git_tools.get_repo")
+@mock.patch("branchdb.git_tools.get_repo")
 def test_delete_all_databases__bad_delete(mock_repo, mock_connect, mock_delete, mock_remove, tmp_path):
     mock_connect.side_effect = [True, True]
     mock_delete.side_effect = [True, True, True, Exception(), True, True, True, True]
@@ -125,10 +127,13 @@ def test_delete_databases__bad_connect(mock_connect, mock_delete, mock_remove):
     mock_connect.side_effect = [errors.ConnectionError(), True]
     mock_delete.side_effect = [True, True]
 
-    with pytest.raises(errors.ConnectionError):
-        result = database.delete_databases("jazz")
-    assert mock_delete.called is False
-    assert mock_remove.called is False
+    result = database.delete_databases("jazz")
+    assert result.total == 2
+    assert result.success == 1
+    assert result.errors[0].database == "branch_jazz"
+    assert isinstance(result.errors[0].error, errors.ConnectionError)
+    assert mock_delete.call_count == 1
+    mock_remove.assert_called_once_with("jazz")
 
 
 @mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
@@ -190,7 +195,7 @@ def test_clean_databases__multiple_engines(mock_connect, mock_delete, mock_stale
         mock.call("branch_test1"),
         mock.call("branch_test2"),
         mock.call("branch_test3")]
-    mock_delete.assert_has_calls(expected_calls)
+    mock_delete.assert_has_calls(expected_calls, any_order=True)
 
 
 @mocking.monkey_patch(o=settings, k="DATABASES", v=[mock_db_info[0]])
@@ -202,8 +207,9 @@ def test_clean_databases__bad_connect(mock_connect, mock_delete, mock_stale):
     mock_connect.side_effect = errors.ConnectionError()
     mock_delete.side_effect = [True, True, True]
 
-    with pytest.raises(errors.ConnectionError):
-        result = database.clean_databases()
+    result = database.clean_databases()
+    assert result.total == 3
+    assert result.success == 0
     assert mock_delete.called is False
 
 
@@ -227,8 +233,24 @@ def test_clean_databases__bad_delete(mock_connect, mock_delete, mock_stale):
     mock_delete.assert_has_calls(expected_calls)
 
 
+@mocking.monkey_patch(o=settings, k="DATABASES", v=[mock_db_info[0]])
+@mock.patch("branchdb.database.delete._stale_databases")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.delete_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_clean_databases__force(mock_connect, mock_delete, mock_stale):
+    mock_stale.return_value.__enter__.return_value = ["branch_test1", "branch_test2", "branch_test1"]
+
+    result = database.clean_databases(force=True)
+    assert result.total == 2
+    assert result.success == 2
+    expected_calls = [
+        mock.call("branch_test1", force=True),
+        mock.call("branch_test2", force=True)]
+    assert mock_delete.call_args_list == expected_calls
+
+
 @mock.patch("branchdb.repo_mapping.RepoMapping.remove_databases")
-@mock.patch("branchdb.database.delete.git_tools.get_repo")
+@mock.patch("branchdb.git_tools.get_repo")
 def test_stale_databases(mock_repo, mock_remove, tmp_path):
     content = {
         "master": "branch_master",
@@ -251,3 +273,37 @@ def test_stale_databases(mock_repo, mock_remove, tmp_path):
             mock_remove.assert_called_once_with(*reversed(expected))
         else:
             raise e
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("branchdb.engines.base_engine.BaseEngine.delete_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+@mock.patch("branchdb.git_tools.get_repo")
+def test_delete_matching_databases(mock_repo, mock_connect, mock_delete, tmp_path):
+    content = {
+        "master": "branch_master",
+        "feature/jazz": "branch_feature_jazz",
+        "feature/blues": "branch_feature_blues",
+        "hotfix/feature": "branch_hotfix_feature"}
+    with mocking.make_temp_mapping_file(tmp_path, content=content):
+        mock_repo.return_value = mocking.MockRepo(project_root=str(tmp_path))
+
+    result = database.delete_matching_databases("feature/*")
+    assert result.total == 4
+    assert result.success == 4
+    mock_delete.assert_has_calls([mock.call("branch_feature_blues"), mock.call("branch_feature_jazz")])
+    with repo_mapping.RepoMapping(str(tmp_path)) as mapping:
+        assert mapping.branches == ["hotfix/feature", "master"]
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("branchdb.engines.base_engine.BaseEngine.delete_database")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+@mock.patch("branchdb.git_tools.get_repo")
+def test_delete_matching_databases__no_match(mock_repo, mock_connect, mock_delete, tmp_path):
+    with mocking.make_temp_mapping_file(tmp_path, content={"master": "branch_master"}):
+        mock_repo.return_value = mocking.MockRepo(project_root=str(tmp_path))
+
+    with pytest.raises(Exception, match="No database registered for branches matching 'feature/\\*'"):
+        database.delete_matching_databases("feature/*")
+    assert mock_connect.called is False
@@ -0,0 +1,180 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import mock
+import pytest
+from branchdb import database, errors
+from branchdb.conf import settings
+from branchdb.database import pool
+from branchdb.project import Project
+from branchdb.repo_mapping import RepoMapping
+from .. import mocking
+
+pool_db_info = [{
+    "ENGINE": "mock-pool",
+    "TEMPLATE": "template_db",
+    "POOL_SIZE": 2,
+    "USER": "user1",
+    "PASSWORD": "password1",
+    "HOST": "localhost",
+    "PORT": "8001"}]
+
+
+class MockPoolEngine(mocking.MockEngine):
+    """Keeps its databases, and their comments, in memory"""
+    slug = "mock-pool"
+    supports_pool = True
+    databases = dict()
+
+    def connect(self, user=None, password=None, host="localhost", port=""):
+        self.connection = True
+
+    def all_databases(self, prefix=None):
+        return list(self.databases)
+
+    def commented_databases(self, prefix):
+        return dict((name, comment) for name, comment in self.databases.items() if (comment or "").startswith(prefix))
+
+    def comment_database(self, database_name, comment):
+        self.databases[database_name] = comment
+
+    def rename_database(self, database_name, new_name):
+        if database_name not in self.databases:
+            raise errors.DatabaseError("Database '{}' does not exist.".format(database_name))
+        self.databases[new_name] = self.databases.pop(database_name)
+        self.record_database(database_name, False)
+        self.record_database(new_name, True)
+
+    def create_database(self, database_name, template=None, strategy=None):
+        if self.database_exists(database_name):
+            raise errors.DatabaseError("Database '{}' already exists.".format(database_name))
+        self.databases[database_name] = None
+        self.record_database(database_name, True)
+
+    def delete_database(self, database_name, force=False):
+        del self.databases[database_name]
+        self.record_database(database_name, False)
+
+
+@pytest.fixture
+def databases():
+    MockPoolEngine.databases = {"template_db": None}
+    return MockPoolEngine.databases
+
+
+def spares(databases):
+    return sorted(name for name, comment in databases.items() if comment is not None)
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=pool_db_info)
+def test_refill_pools(databases, tmp_path):
+    result = database.refill_pools(project=Project(str(tmp_path)))
+    assert result.total == 2
+    assert result.success == 2
+    assert len(spares(databases)) == 2
+    assert all(name.startswith("branch_spare_") for name in spares(databases))
+
+    # a full pool is left alone
+    before = spares(databases)
+    result = database.refill_pools(project=Project(str(tmp_path)))
+    assert result.total == 0
+    assert spares(databases) == before
+
+
+@mocking.monkey_patch(o=settings, k="POOL_MAX_AGE", v=3600)
+@mocking.monkey_patch(o=settings, k="DATABASES", v=[dict(pool_db_info[0], POOL_TEMPLATE_VERSION="v2")])
+@mock.patch("branchdb.database.pool.time.time")
+def test_refill_pools__stale(mock_time, databases, tmp_path):
+    mock_time.return_value = 10000.0
+    options = pool.PoolOptions(size=2, template="template_db", version="v2", max_age=3600)
+    fresh, expired, old_version, other_template = (pool.spare_name(digit * 12) for digit in "1234")
+    databases.update({
+        fresh: pool.spare_comment(options, created=9000.0),
+        expired: pool.spare_comment(options, created=1000.0),
+        old_version: pool.spare_comment(options._replace(version="v1"), created=9000.0),
+        other_template: pool.spare_comment(options._replace(template="other"), created=9000.0),
+        "branch_jazz": None})
+
+    result = database.refill_pools(project=Project(str(tmp_path)))
+    assert result.total == 4
+    assert result.success == 4
+    assert fresh in databases
+    assert "branch_jazz" in databases
+    assert not set([expired, old_version, other_template]) & set(databases)
+    assert len(spares(databases)) == 2
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=pool_db_info)
+def test_create_databases__claims_spare(databases, tmp_path):
+    project = Project(str(tmp_path))
+    database.refill_pools(project=project)
+    claimed = pool.spare_databases(MockPoolEngine(), pool.pool_options(pool_db_info[0]))[0][0]
+
+    with mock.patch.object(MockPoolEngine, "create_database") as mock_create:
+        result = database.create_databases("jazz", project=project)
+    assert result.success == 1
+    assert mock_create.called is False
+    assert claimed not in databases
+    assert databases["branch_jazz"] is None
+    assert len(spares(databases)) == 1
+    assert RepoMapping(project.root)["jazz"] == "branch_jazz"
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=pool_db_info)
+def test_create_databases__claimed_spare_keeps_tag(databases, tmp_path):
+    project = Project(str(tmp_path))
+    database.refill_pools(project=project)
+
+    def comment_database(database_name, comment):
+        if comment is None:
+            raise errors.DatabaseError("connection lost")
+        databases[database_name] = comment
+
+    with mock.patch.object(MockPoolEngine, "comment_database", side_effect=comment_database):
+        with mock.patch.object(MockPoolEngine, "create_database") as mock_create:
+            result = database.create_databases("jazz", dry_run=True, project=project)
+    assert result.success == 1
+    assert mock_create.called is False
+    assert databases["branch_jazz"].startswith(pool.SPARE_MARKER)
+
+    # the branch's database still has the tag, but not the name, of a spare
+    usable, stale = pool.spare_databases(MockPoolEngine(), pool.pool_options(pool_db_info[0]))
+    assert "branch_jazz" not in usable + stale
+    database.drain_pools()
+    assert "branch_jazz" in databases
+
+
+def test_is_spare_name():
+    assert pool.is_spare_name(pool.spare_name("0123456789ab")) is True
+    assert pool.is_spare_name("branch_spare_0123456789ab") is True
+    assert pool.is_spare_name("branch_spare_0123456789abc") is False
+    assert pool.is_spare_name("branch_jazz") is False
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=pool_db_info)
+def test_create_databases__empty_pool(databases, tmp_path):
+    result = database.create_databases("jazz", dry_run=True, project=Project(str(tmp_path)))
+    assert result.success == 1
+    assert databases == {"template_db": None, "branch_jazz": None}
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=pool_db_info)
+def test_create_databases__other_template(databases, tmp_path):
+    project = Project(str(tmp_path))
+    database.refill_pools(project=project)
+
+    result = database.create_databases("jazz", template="other_db", dry_run=True, project=project)
+    assert result.success == 1
+    assert len(spares(databases)) == 2
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=pool_db_info)
+def test_drain_pools(databases, tmp_path):
+    database.refill_pools(project=Project(str(tmp_path)))
+    result = database.drain_pools()
+    assert result.total == 2
+    assert result.success == 2
+    assert databases == {"template_db": None}
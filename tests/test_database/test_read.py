@@ -16,7 +16,7 @@ mock_db_info = [
     {"ENGINE": "mongodb", "DEFAULT": "master_db2"}]
 
 
-@mock.patch("branchdb.database.read.git_tools.get_repo")
+@mock.patch("branchdb.git_tools.get_repo")
 def test_get_current_database(mock_repo, tmp_path):
     content = {
         "master": "branch_master",
@@ -31,7 +31,7 @@ def test_get_current_database(mock_repo, tmp_path):
 
 
 @mock.patch("branchdb.database.read.get_default_database")
-@mock.patch("branchdb.database.read.git_tools.get_repo")
+@mock.patch("branchdb.git_tools.get_repo")
 def test_get_current_database__default_fallback(mock_repo, mock_default, tmp_path):
     mock_default.return_value = "branch_master"
     content = {
@@ -47,7 +47,7 @@ def test_get_current_database__default_fallback(mock_repo, mock_default, tmp_pat
 
 
 @mock.patch("branchdb.database.read.get_default_database")
-@mock.patch("branchdb.database.read.git_tools.get_repo")
+@mock.patch("branchdb.git_tools.get_repo")
 def test_get_current_database__no_default_fallback(mock_repo, mock_default, tmp_path):
     mock_default.return_value = None
     content = {
@@ -97,3 +97,38 @@ def test_get_database_for_slug():
 def test_get_database_for_slug__no_matching_database():
     database = read._get_database_for_slug("sqlite")
     assert database == None
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=[
+    {"ENGINE": "postgres", "ALIAS": "default", "HOST": "db1", "DEFAULT": "master_db"},
+    {"ENGINE": "postgres", "ALIAS": "replica", "HOST": "db2"},
+    {"ENGINE": "mongodb", "HOST": "db3"}])
+@mocking.monkey_patch(o=settings, k="DEFAULT_DATABASE_NAME", v="fallback_db")
+@mock.patch("branchdb.git_tools.get_repo")
+def test_get_current_databases(mock_repo, tmp_path):
+    with mocking.make_temp_mapping_file(tmp_path, content={"test1": "branch_test1"}):
+        mock_repo.return_value = mocking.MockRepo(active_branch_name="test1", project_root=str(tmp_path))
+    databases = database.get_current_databases()
+    assert databases == {
+        "default": {
+            "ENGINE": "postgres", "ALIAS": "default", "HOST": "db1", "DEFAULT": "master_db", "NAME": "branch_test1"},
+        "replica": {"ENGINE": "postgres", "ALIAS": "replica", "HOST": "db2", "NAME": "branch_test1"},
+        "mongodb": {"ENGINE": "mongodb", "HOST": "db3", "NAME": "branch_test1"}}
+
+    mock_repo.return_value = mocking.MockRepo(active_branch_name="bad", project_root=str(tmp_path))
+    database.invalidate()
+    databases = database.get_current_databases()
+    assert databases["default"]["NAME"] == "master_db"
+    assert databases["replica"]["NAME"] == "fallback_db"
+    assert databases["mongodb"]["NAME"] == "fallback_db"
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=[
+    {"ENGINE": "postgres", "DEFAULT": "db"},
+    {"ENGINE": "postgres", "DEFAULT": "db"}])
+@mock.patch("branchdb.git_tools.get_repo")
+def test_get_current_databases__conflicting_keys(mock_repo, tmp_path):
+    with mocking.make_temp_mapping_file(tmp_path):
+        mock_repo.return_value = mocking.MockRepo(active_branch_name="test1", project_root=str(tmp_path))
+    with pytest.raises(errors.ImproperlyConfigured, match="Multiple databases are keyed as 'postgres'"):
+        database.get_current_databases()
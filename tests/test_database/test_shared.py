@@ -4,8 +4,10 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import time
 import mock
 import pytest
+import threading
 from branchdb import database, errors
 from branchdb.conf import settings
 from .. import mocking
@@ -16,8 +18,12 @@ from . import mock_db_info
 @mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
 def test_get_database_connections(mock_connect):
     mock_connect.side_effect = [True, True]
-    connections = list(database.get_database_connections())
+    manager = database.ConnectionManager(max_connections=2)
+    with database.get_database_connections(manager) as leased:
+        connections = list(leased)
     assert mock_connect.call_count == 2
+    # the connections go back to the pool, so later leases do not wait for them
+    assert manager.acquire(mock_db_info[0], block=False) is connections[0][0]
 
     assert str(connections[0][0]) == "<MockEngine unconnected>"
     expected_connect = dict(user="user1", password="password1", host="localhost", port="8001")
@@ -32,7 +38,8 @@ def test_get_database_connections(mock_connect):
 def test_get_database_connections__bad_connect(mock_connect):
     mock_connect.side_effect = [errors.ConnectionError(), True]
     with pytest.raises(errors.ConnectionError):
-        connections = list(database.get_database_connections())
+        with database.get_database_connections(database.ConnectionManager()) as connections:
+            list(connections)
 
 
 @mocking.monkey_patch(o=settings, k="DATABASES", v=[])
@@ -40,5 +47,264 @@ def test_get_database_connections__bad_connect(mock_connect):
 def test_get_database_connections__no_databases(mock_connect):
     error = "Please specify at least one database connection in your settings file."
     with pytest.raises(errors.ImproperlyConfigured, match=error):
-        connections = list(database.get_database_connections())
+        with database.get_database_connections() as connections:
+            list(connections)
     assert mock_connect.called is False
+
+
+@mocking.monkey_patch(o=settings, k="MAX_CONCURRENCY", v=2)
+def test_run_on_connections__bounded():
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def operation(engine, db_info):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return database.run_for_databases(lambda name: None, engine, db_info, ["branch_jazz"])
+
+    connections = [(mocking.MockEngine(), info) for info in mock_db_info * 3]
+    result = database.run_on_connections(operation, connections)
+    assert result.total == 6
+    assert result.success == 6
+    assert len(result.engines) == 6
+    assert peak[0] == 2
+
+
+def test_run_for_databases():
+    error = Exception("bad")
+
+    def operation(db_name):
+        if db_name == "branch_bad":
+            raise error
+
+    result = database.run_for_databases(operation, mocking.MockEngine(), mock_db_info[0], ["branch_jazz", "branch_bad"])
+    assert result.connection == "mock@localhost:8001"
+    assert result.total == 2
+    assert result.success == 1
+    assert result.errors == (database.ExecutionError("mock@localhost:8001", "branch_bad", error),)
+
+
+@mock.patch("tests.mocking.MockEngine.all_databases")
+def test_run_for_databases__catalog_snapshot(mock_all):
+    mock_all.return_value = ["branch_jazz"]
+    engine = mocking.MockEngine()
+    exists = dict()
+
+    def operation(db_name):
+        exists[db_name] = engine.database_exists(db_name)
+
+    result = database.run_for_databases(operation, engine, mock_db_info[0], ["branch_jazz", "branch_blues"])
+    assert result.success == 2
+    assert exists == {"branch_jazz": True, "branch_blues": False}
+    assert mock_all.call_count == 1
+
+
+@mock.patch("tests.mocking.MockEngine.all_databases")
+def test_run_for_databases__bad_snapshot(mock_all):
+    error = Exception("bad")
+    mock_all.side_effect = error
+    operation = mock.Mock()
+
+    result = database.run_for_databases(operation, mocking.MockEngine(), mock_db_info[0], ["branch_jazz"])
+    assert result.success == 0
+    assert result.errors[0].error is error
+    assert operation.called is False
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_get_database_connections__lazy(mock_connect):
+    with database.get_database_connections(database.ConnectionManager()) as connections:
+        next(connections)
+        assert mock_connect.call_count == 1
+        next(connections)
+        assert mock_connect.call_count == 2
+
+
+@mock.patch("tests.mocking.MockEngine.disconnect")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_connection_manager__reuse(mock_connect, mock_disconnect):
+    with database.ConnectionManager() as manager:
+        engine = manager.acquire(mock_db_info[0])
+        # a leased connection is never handed out twice
+        other = manager.acquire(mock_db_info[0])
+        assert other is not engine
+        assert mock_connect.call_count == 2
+
+        manager.release(engine, mock_db_info[0])
+        assert manager.acquire(mock_db_info[0]) is engine
+        assert mock_connect.call_count == 2
+        assert manager.open_connections == 2
+    assert mock_disconnect.call_count == 2
+    assert manager.open_connections == 0
+
+
+@mock.patch("tests.mocking.MockEngine.disconnect")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_connection_manager__limit(mock_connect, mock_disconnect):
+    manager = database.ConnectionManager(max_connections=1)
+    engine = manager.acquire(mock_db_info[0])
+    assert manager.acquire(mock_db_info[1], block=False) is None
+
+    # idle connections are closed to make room
+    manager.release(engine, mock_db_info[0])
+    manager.acquire(mock_db_info[1])
+    assert mock_disconnect.call_count == 1
+    assert manager.open_connections == 1
+
+
+@mock.patch("tests.mocking.MockEngine.disconnect")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_connection_manager__waits(mock_connect, mock_disconnect):
+    manager = database.ConnectionManager(max_connections=1)
+    engine = manager.acquire(mock_db_info[0])
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(manager.acquire(mock_db_info[0])))
+    waiter.start()
+    time.sleep(0.05)
+    assert acquired == []
+
+    manager.release(engine, mock_db_info[0])
+    waiter.join(5)
+    assert acquired == [engine]
+    assert mock_connect.call_count == 1
+
+
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_connection_manager__failed_connect_frees_slot(mock_connect):
+    mock_connect.side_effect = [errors.ConnectionError(), True]
+    manager = database.ConnectionManager(max_connections=1)
+    with pytest.raises(errors.ConnectionError):
+        manager.acquire(mock_db_info[0])
+    assert manager.acquire(mock_db_info[0], block=False) is not None
+
+
+@mock.patch("tests.mocking.MockEngine.is_alive")
+@mock.patch("tests.mocking.MockEngine.disconnect")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_connection_manager__dead_connection(mock_connect, mock_disconnect, mock_alive):
+    with database.ConnectionManager() as manager:
+        engine = manager.acquire(mock_db_info[0])
+        manager.release(engine, mock_db_info[0])
+        mock_alive.return_value = False
+
+        # the server dropped the idle connection, so it is replaced instead of handed out
+        other = manager.acquire(mock_db_info[0])
+        assert other is not engine
+        assert mock_disconnect.call_count == 1
+        assert mock_connect.call_count == 2
+        assert manager.open_connections == 1
+
+
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_acquire_connection__bounded(mock_connect):
+    manager = database.ConnectionManager(max_connections=2)
+    engine = manager.acquire(mock_db_info[0])
+    other = engine.acquire_connection()
+    assert other is not None
+    assert other is not engine
+    # parallel work never waits for, or goes past, the manager's limit
+    assert engine.acquire_connection() is None
+
+    engine.release_connection(other)
+    assert engine.acquire_connection() is other
+    assert mock_connect.call_count == 2
+
+
+@mock.patch("tests.mocking.MockEngine.disconnect")
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_connection_manager__reserve(mock_connect, mock_disconnect):
+    manager = database.ConnectionManager(max_connections=3)
+    engine = manager.acquire(mock_db_info[0])
+    manager.release(engine, mock_db_info[0])
+    with manager.reserve(5) as reserved:
+        # the idle connection is closed to make room
+        assert reserved == 3
+        assert mock_disconnect.call_count == 1
+        assert manager.acquire(mock_db_info[0], block=False) is None
+    assert manager.acquire(mock_db_info[0], block=False) is not None
+
+    with database.ConnectionManager() as unlimited:
+        with unlimited.reserve(5) as reserved:
+            assert reserved == 5
+
+
+@mocking.monkey_patch(o=settings, k="MAX_CONNECTIONS", v=1)
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_run_on_connections__leases_in_workers(mock_connect):
+    manager = database.ConnectionManager()
+    seen = []
+
+    def operation(engine, db_info):
+        seen.append(manager.open_connections)
+        time.sleep(0.01)
+        return database.engine_result(db_info, ["jazz"], {})
+
+    result = database.run_on_connections(operation, max_concurrency=2, manager=manager)
+    # the workers take turns on the single connection instead of failing
+    assert result.total == 2
+    assert result.success == 2
+    assert seen == [1, 1]
+    assert manager.open_connections == 1
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_run_on_connections__releases(mock_connect):
+    manager = database.ConnectionManager()
+
+    def operation(engine, db_info):
+        raise Exception("bad")
+
+    with pytest.raises(Exception, match="bad"):
+        with database.get_database_connections(manager) as connections:
+            database.run_on_connections(operation, connections)
+    assert manager.open_connections == 2
+
+    with pytest.raises(Exception, match="bad"):
+        database.run_on_connections(operation, manager=manager)
+    assert manager.open_connections == 2
+
+    database.run_on_connections(
+        lambda engine, db_info: database.run_for_databases(lambda name: None, engine, db_info, []),
+        manager=manager)
+    assert mock_connect.call_count == 2
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("branchdb.engines.base_engine.BaseEngine.connect")
+def test_run_on_connections__unreachable(mock_connect):
+    mock_connect.side_effect = [errors.ConnectionError("down"), True]
+    operation = mock.Mock(side_effect=lambda engine, db_info: database.engine_result(db_info, ["jazz"], {}))
+
+    result = database.run_on_connections(
+        operation, max_concurrency=1, manager=database.ConnectionManager(), databases=["jazz"])
+    assert result.total == 2
+    assert result.success == 1
+    assert result.errors[0].database == "jazz"
+    assert str(result.errors[0].error) == "down"
+    assert operation.call_count == 1
+
+    # without the databases, the connection itself fails
+    mock_connect.side_effect = [errors.ConnectionError("down"), True]
+    result = database.run_on_connections(operation, max_concurrency=1, manager=database.ConnectionManager())
+    assert result.total == 1
+    assert result.errors[0].database is None
+
+
+def test_connection_manager__engine_connection_params(tmp_path):
+    jazz = {"ENGINE": "sqlite", "DIRECTORY": str(tmp_path / "jazz")}
+    blues = {"ENGINE": "sqlite", "DIRECTORY": str(tmp_path / "blues")}
+    with database.ConnectionManager() as manager:
+        engine = manager.acquire(jazz)
+        assert engine.connection == str(tmp_path / "jazz")
+        manager.release(engine, jazz)
+        # entries are told apart by the parameters their engine connects with
+        assert manager.acquire(blues) is not engine
+        assert manager.acquire(jazz) is engine
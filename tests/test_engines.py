@@ -0,0 +1,77 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import mock
+import pytest
+from branchdb import errors
+from branchdb.engines import base_engine, get_engine
+from branchdb.engines.command_registry import CommandRegistry
+from . import data_folder
+from .mocking import MockEngine
+
+
+def test_get_engine__registered():
+    assert get_engine("mock") is MockEngine
+
+
+@mock.patch.dict(base_engine.engine_register)
+def test_get_engine__builtin():
+    from branchdb.engines.postgres import PostgresEngine
+    base_engine.engine_register.clear()
+    assert get_engine("postgres") is PostgresEngine
+
+
+@mock.patch.dict(base_engine.engine_register)
+def test_get_engine__path():
+    assert get_engine("tests.mocking:MockEngine") is MockEngine
+    assert base_engine.engine_register["tests.mocking:MockEngine"] is MockEngine
+
+
+@mock.patch.dict(base_engine.engine_register)
+@mock.patch("branchdb.engines.base_engine._entry_point_path")
+def test_get_engine__entry_point(mock_entry_point):
+    mock_entry_point.return_value = "tests.mocking:MockEngine"
+    assert get_engine("third-party") is MockEngine
+    mock_entry_point.assert_called_once_with("third-party", "branchdb.engines")
+
+    # the engine is only looked up once
+    assert get_engine("third-party") is MockEngine
+    assert mock_entry_point.call_count == 1
+
+
+@mock.patch("branchdb.engines.base_engine._entry_point_path")
+def test_get_engine__unknown(mock_entry_point):
+    mock_entry_point.return_value = None
+    with pytest.raises(errors.ImproperlyConfigured, match="No engine is registered for 'unknown'"):
+        get_engine("unknown")
+
+
+def test_command_registry():
+    registry = CommandRegistry(os.path.join(data_folder, "commands"))
+    assert registry.get("mock_command") == "SELECT {} FROM {arg2}\n"
+    assert registry.get("mock_command", 90400) == "SELECT {} FROM {arg2}\n"
+    assert registry.get("mock_command", 110000) == "SELECT {} FROM {arg2} TABLESAMPLE SYSTEM (1)\n"
+    assert registry.get("mock_command", 130002) == "SELECT {} FROM ONLY {arg2}\n"
+
+
+def test_command_registry__reads_once():
+    registry = CommandRegistry(os.path.join(data_folder, "commands"))
+    with mock.patch("branchdb.engines.command_registry.io.open", wraps=io.open) as mock_open:
+        registry.get("mock_command")
+        registry.get("mock_command", 130002)
+    assert mock_open.call_count == 3
+
+
+def test_command_registry__unsupported(tmp_path):
+    (tmp_path / "force.130000.sql").write_bytes(b"DROP DATABASE {database} WITH (FORCE)")
+    registry = CommandRegistry(str(tmp_path))
+    assert registry.supports("force", 130000) is True
+    assert registry.supports("force", 120000) is False
+    assert registry.supports("force") is False
+    with pytest.raises(errors.DatabaseError, match="Unknown command 'missing'"):
+        registry.get("missing")
@@ -0,0 +1,76 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import json
+import mock
+import pytest
+from branchdb import conf, database, errors, frozen
+from branchdb.conf import settings
+from branchdb.project import get_project
+from . import mocking
+
+mock_db_info = [
+    {"ENGINE": "postgres", "ALIAS": "default", "HOST": "db1"},
+    {"ENGINE": "mongodb", "HOST": "db2", "DEFAULT": "mongo_master"}]
+
+
+@mocking.monkey_patch(o=settings, k="DATABASES", v=mock_db_info)
+@mock.patch("branchdb.git_tools.get_repo")
+def test_freeze(mock_repo, tmp_path):
+    with mocking.make_temp_mapping_file(tmp_path, content={"test1": "branch_test1"}):
+        mock_repo.return_value = mocking.MockRepo(active_branch_name="test1", project_root=str(tmp_path))
+    path = frozen.freeze(get_project())
+    assert path == os.path.join(str(tmp_path), ".branchdb", frozen.FROZEN_FILE)
+
+    with open(path) as artifact_file:
+        artifact = json.load(artifact_file)
+    assert artifact["branch"] == "test1"
+    assert artifact["databases"] == {"": "branch_test1", "postgres": "branch_test1", "mongodb": "branch_test1"}
+    assert artifact["connections"]["default"]["NAME"] == "branch_test1"
+    assert artifact["settings"]["DATABASES"] == mock_db_info
+    assert artifact["settings"]["NAME_PREFIX"] == "branch"
+
+
+def write_artifact(tmp_path, databases):
+    path = tmp_path / frozen.FROZEN_FILE
+    path.write_text(json.dumps({
+        "version": frozen.FROZEN_VERSION,
+        "branch": "test1",
+        "databases": databases,
+        "connections": {"default": {"ENGINE": "postgres", "NAME": "branch_test1"}},
+        "settings": {"DATABASES": [{"ENGINE": "postgres"}], "NAME_PREFIX": "frozen"}}))
+    return str(path)
+
+
+@mock.patch("branchdb.database.read.get_project")
+def test_get_current_database__frozen(mock_project, tmp_path):
+    path = write_artifact(tmp_path, {"": "branch_test1", "mongodb": "mongo_master"})
+    with mock.patch.dict(os.environ, {frozen.FROZEN_ENVIRONMENT_VARIABLE: path}):
+        assert database.get_current_database() == "branch_test1"
+        assert database.get_current_database(slug="mongodb") == "mongo_master"
+        assert database.get_current_database(slug="postgres") == "branch_test1"
+        assert database.get_current_databases() == {"default": {"ENGINE": "postgres", "NAME": "branch_test1"}}
+    assert mock_project.called is False
+
+
+def test_get_current_database__frozen_without_default(tmp_path):
+    path = write_artifact(tmp_path, {})
+    with mock.patch.dict(os.environ, {frozen.FROZEN_ENVIRONMENT_VARIABLE: path}):
+        with pytest.raises(errors.ImproperlyConfigured):
+            database.get_current_database()
+
+
+@mock.patch("branchdb.conf.project_settings_module")
+def test_lazy_settings__frozen(mock_module, tmp_path):
+    path = write_artifact(tmp_path, {"": "branch_test1"})
+    lazy_settings = conf.LazySettings()
+    with mock.patch.dict(os.environ, {frozen.FROZEN_ENVIRONMENT_VARIABLE: path}):
+        assert lazy_settings.NAME_PREFIX == "frozen"
+        assert lazy_settings.NAME_SCHEME == conf.default_settings.NAME_SCHEME
+        assert lazy_settings.DATABASES == [{"ENGINE": "postgres"}]
+    assert type(lazy_settings._wrapped) is conf.FrozenSettings
+    assert mock_module.called is False
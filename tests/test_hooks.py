@@ -0,0 +1,92 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import subprocess
+import mock
+from branchdb import hooks
+
+
+def read(path):
+    with io.open(str(path), "r", encoding="utf-8") as file_:
+        return file_.read()
+
+
+def test_install_hook(tmp_path):
+    hooks.install_hook(str(tmp_path), "post-checkout")
+    hook = tmp_path / "post-checkout"
+    assert read(hook) == "#!/bin/sh\n" + hooks.hook_block()
+    assert os.access(str(hook), os.X_OK) is True
+
+
+def test_install_hook__existing_shell_hook(tmp_path):
+    hook = tmp_path / "post-merge"
+    hook.write_text(u"#!/bin/sh\necho merged")
+    hooks.install_hook(str(tmp_path), "post-merge")
+    assert read(hook) == hooks.chaining_hook("post-merge")
+    assert read(str(hook) + hooks.CHAINED_SUFFIX) == "#!/bin/sh\necho merged"
+
+    # reinstalling refreshes the hook instead of chaining it again
+    hooks.install_hook(str(tmp_path), "post-merge")
+    assert read(hook) == hooks.chaining_hook("post-merge")
+
+    hooks.uninstall_hook(str(tmp_path), "post-merge")
+    assert read(hook) == "#!/bin/sh\necho merged"
+
+
+def test_install_hook__exec_hook(tmp_path):
+    marker = tmp_path / "refreshed"
+    python = tmp_path / "python"
+    python.write_text(u"#!/bin/sh\ntouch \"{}\"\n".format(marker))
+    os.chmod(str(python), 0o755)
+    hooks_dir = tmp_path / "hooks"
+    hooks_dir.mkdir()
+    hook = hooks_dir / "post-checkout"
+    # like the hooks generated by pre-commit
+    hook.write_text(u"#!/usr/bin/env bash\nexec true \"$@\"\n")
+    os.chmod(str(hook), 0o755)
+
+    with mock.patch("branchdb.hooks.sys.executable", str(python)):
+        hooks.install_hook(str(hooks_dir), "post-checkout")
+    subprocess.check_call([str(hook), "old", "new", "1"])
+    assert marker.exists() is True
+
+    # the hook stays quiet once the interpreter is gone
+    marker.unlink()
+    python.unlink()
+    output = subprocess.check_output([str(hook), "old", "new", "1"], stderr=subprocess.STDOUT)
+    assert output == b""
+    assert marker.exists() is False
+
+
+def test_install_hook__appended_block(tmp_path):
+    hook = tmp_path / "post-merge"
+    hook.write_text(u"#!/bin/sh\necho merged\n" + hooks.hook_block())
+    hooks.install_hook(str(tmp_path), "post-merge")
+    assert read(hook) == hooks.chaining_hook("post-merge")
+    assert read(str(hook) + hooks.CHAINED_SUFFIX) == "#!/bin/sh\necho merged\n"
+
+
+def test_install_hook__existing_foreign_hook(tmp_path):
+    hook = tmp_path / "post-rewrite"
+    hook.write_text(u"#!/usr/bin/env python\nprint('rewritten')\n")
+    hooks.install_hook(str(tmp_path), "post-rewrite")
+    assert read(hook) == hooks.chaining_hook("post-rewrite")
+    assert read(str(hook) + hooks.CHAINED_SUFFIX) == "#!/usr/bin/env python\nprint('rewritten')\n"
+
+    hooks.install_hook(str(tmp_path), "post-rewrite")
+    assert read(hook) == hooks.chaining_hook("post-rewrite")
+
+    hooks.uninstall_hook(str(tmp_path), "post-rewrite")
+    assert read(hook) == "#!/usr/bin/env python\nprint('rewritten')\n"
+    assert os.path.exists(str(hook) + hooks.CHAINED_SUFFIX) is False
+
+
+def test_uninstall_hook__removes_own_hook(tmp_path):
+    hooks.install_hook(str(tmp_path), "post-checkout")
+    hooks.uninstall_hook(str(tmp_path), "post-checkout")
+    assert os.path.exists(str(tmp_path / "post-checkout")) is False
@@ -0,0 +1,48 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import subprocess
+import pytest
+import branchdb
+
+# the read path is imported by every settings file; it measures about 60ms, so the budget leaves little headroom
+READ_PATH_BUDGET_US = 75000
+HEAVY_MODULES = ("git", "psycopg2", "slugify", "sqlite3", "uuid", "multiprocessing")
+
+requires_importtime = pytest.mark.skipif(sys.version_info < (3, 7), reason="'-X importtime' requires Python 3.7+")
+
+
+def import_times(statement):
+    """Returns the cumulative import time in microseconds for each module imported by the statement"""
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(branchdb.__file__)))
+    env = dict(os.environ, PYTHONPATH=package_root)
+    output = subprocess.check_output(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stderr=subprocess.STDOUT,
+        env=env)
+    times = dict()
+    for line in output.decode("utf-8").splitlines():
+        if line.startswith("import time:") is False or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative.strip())
+    return times
+
+
+@requires_importtime
+def test_read_path__skips_heavy_modules():
+    times = import_times("from branchdb.database import get_current_database")
+    imported = set(module.split(".")[0] for module in times)
+    assert imported.isdisjoint(HEAVY_MODULES)
+
+
+@requires_importtime
+def test_read_path__budget():
+    # the fastest of a few runs leaves out the noise of other processes
+    fastest = min(import_times("from branchdb.database import get_current_database")["branchdb"] for _ in range(3))
+    assert fastest < READ_PATH_BUDGET_US
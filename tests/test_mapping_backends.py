@@ -0,0 +1,163 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import re
+import pytest
+import mock
+from contextlib import contextmanager
+from branchdb import mapping_backends
+from branchdb.conf import settings
+from branchdb.errors import ImproperlyConfigured
+from branchdb.mapping_backends import JsonMappingBackend, SqliteMappingBackend, PostgresMappingBackend
+from .mocking import monkey_patch, make_temp_mapping_file
+from . import data_folder
+
+project_root = os.path.join(data_folder, "mock_project_root")
+
+
+@mock.patch("branchdb.mapping_backends.os.makedirs")
+@mock.patch("branchdb.mapping_backends.os.path.exists")
+def test_json_location__no_branchdb_folder(mock_exists, mock_make):
+    mock_exists.return_value = False
+
+    location = JsonMappingBackend(project_root).location
+    assert bool(re.match(r".*\/.branchdb\/mappings\.json", location)) is True
+    assert mock_exists.called is True
+    assert mock_make.called is True
+
+
+@mock.patch("branchdb.mapping_backends.os.path.exists")
+def test_json_location__cache_location(mock_exists):
+    mock_exists.return_value = True
+
+    backend = JsonMappingBackend(project_root)
+    assert bool(re.match(r".*\/.branchdb\/mappings\.json", backend.location)) is True
+    assert mock_exists.called is True
+
+    mock_exists.reset_mock()
+    assert bool(re.match(r".*\/.branchdb\/mappings\.json", backend.location)) is True
+    assert mock_exists.called is False
+
+
+def test_json_load(tmp_path):
+    assert JsonMappingBackend(str(tmp_path / "empty")).load() == {}
+    with make_temp_mapping_file(tmp_path, {"master": "branch_master"}):
+        backend = JsonMappingBackend(str(tmp_path))
+        assert backend.load() == {"master": "branch_master"}
+        assert backend.get("master") == "branch_master"
+        assert backend.get("jazz") is None
+
+
+@mock.patch("branchdb.mapping_backends.utils.file_lock")
+def test_json_save__locks(mock_lock, tmp_path):
+    events = []
+
+    @contextmanager
+    def lock(path):
+        events.append("lock")
+        yield
+        events.append("unlock")
+
+    mock_lock.side_effect = lock
+    backend = JsonMappingBackend(str(tmp_path))
+    dump = mock.Mock(side_effect=lambda *args, **kwargs: events.append("dump"))
+    with mock.patch("branchdb.mapping_backends.utils.atomic_json_dump", dump):
+        backend.save({"master": "branch_master"})
+    mock_lock.assert_called_once_with(os.path.join(str(tmp_path), ".branchdb", ".cache", "mappings.json.lock"))
+    dump.assert_called_once_with({"master": "branch_master"}, backend.location, mode=0o644)
+    assert events == ["lock", "dump", "unlock"]
+
+
+def test_sqlite_load__no_file(tmp_path):
+    backend = SqliteMappingBackend(str(tmp_path))
+    assert backend.load() == {}
+    assert backend.get("master") is None
+    # reads never create the file
+    assert os.path.exists(backend.location) is False
+
+
+def test_sqlite_save(tmp_path):
+    backend = SqliteMappingBackend(str(tmp_path))
+    backend.save({"master": "branch_master", "old": "branch_old"})
+    SqliteMappingBackend(str(tmp_path)).save({"old": None, "test": "branch_test", "master": "branch_other"})
+    assert backend.load() == {"master": "branch_other", "test": "branch_test"}
+    assert backend.get("test") == "branch_test"
+    assert backend.get("old") is None
+
+
+def test_sqlite_get__indexed(tmp_path):
+    backend = SqliteMappingBackend(str(tmp_path))
+    backend.save({"master": "branch_master"})
+    with backend._connect() as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        plan = connection.execute("EXPLAIN QUERY PLAN SELECT database FROM mappings WHERE branch = ?", ("master",))
+        assert "SCAN" not in " ".join(str(row[-1]) for row in plan.fetchall())
+
+
+def test_sqlite_save__rolls_back(tmp_path):
+    backend = SqliteMappingBackend(str(tmp_path))
+    backend.save({"master": "branch_master"})
+    changes = mock.Mock()
+    changes.items.return_value = iter([("test", "branch_test"), ("broken", object())])
+    with pytest.raises(Exception):
+        backend.save(changes)
+    assert backend.load() == {"master": "branch_master"}
+
+
+@contextmanager
+def postgres_backend(databases):
+    engine = mock.Mock()
+    with mock.patch("branchdb.database.shared.connection_pool") as mock_pool:
+        mock_pool.acquire.return_value = engine
+        with mock.patch.object(settings, "DATABASES", databases):
+            yield PostgresMappingBackend(project_root), engine, mock_pool
+
+
+@mock.patch("branchdb.project.get_project")
+@mock.patch("branchdb.git_tools.get_project_id")
+def test_postgres_backend(mock_project_id, mock_get_project):
+    mock_project_id.return_value = "github.com/owner/shop"
+    databases = [{"ENGINE": "sqlite", "DIRECTORY": "/tmp"}, {"ENGINE": "postgres", "USER": "user"}]
+    with postgres_backend(databases) as (backend, engine, mock_pool):
+        engine.branch_catalog.return_value = "branch_master"
+        assert backend.get("master") == "branch_master"
+        backend.save({"master": None})
+    # the namespace defaults to the project's id, and the connections come from the pool
+    mock_get_project.assert_called_once_with(project_root)
+    engine.branch_catalog.assert_called_once_with("github.com/owner/shop", "master")
+    engine.update_branch_catalog.assert_called_once_with("github.com/owner/shop", {"master": None})
+    mock_pool.acquire.assert_called_with(databases[1])
+    mock_pool.release.assert_has_calls([mock.call(engine, databases[1])] * 2)
+    assert engine.disconnect.called is False
+
+
+@monkey_patch(o=settings, k="MAPPING_CONNECTION", v="catalog")
+@monkey_patch(o=settings, k="MAPPING_NAMESPACE", v="shop")
+def test_postgres_backend__connection():
+    databases = [{"ENGINE": "postgres", "ALIAS": "main"}, {"ENGINE": "postgres", "ALIAS": "catalog", "HOST": "db"}]
+    with postgres_backend(databases) as (backend, engine, mock_pool):
+        backend.load()
+    mock_pool.acquire.assert_called_once_with(databases[1])
+    engine.branch_catalog.assert_called_once_with("shop")
+
+
+@monkey_patch(o=settings, k="MAPPING_CONNECTION", v="cache")
+def test_postgres_backend__improperly_configured():
+    with postgres_backend([{"ENGINE": "redis", "ALIAS": "cache"}]) as (backend, _, _):
+        with pytest.raises(ImproperlyConfigured):
+            backend.load()
+    with postgres_backend([]) as (backend, _, _):
+        with pytest.raises(ImproperlyConfigured):
+            backend.load()
+
+
+def test_backend_class():
+    assert mapping_backends.backend_class() is JsonMappingBackend
+    assert mapping_backends.backend_class("sqlite") is SqliteMappingBackend
+    assert mapping_backends.backend_class("branchdb.mapping_backends:PostgresMappingBackend") is PostgresMappingBackend
+    with pytest.raises(ImproperlyConfigured):
+        mapping_backends.backend_class("yaml")
@@ -0,0 +1,200 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import pytest
+import mock
+from branchdb.errors import DatabaseError, ImproperlyConfigured
+from branchdb.engines import get_engine
+from branchdb.engines.mysql import mysql_engine, MysqlEngine
+
+integration = pytest.mark.skipif(
+    "BRANCHDB_TEST_MYSQL_HOST" not in os.environ,
+    reason="set BRANCHDB_TEST_MYSQL_HOST (and _PORT, _USER, _PASSWORD) to test against a MySQL or MariaDB server")
+
+
+class RecordingConnection(object):
+    """Connection whose cursors record the statements and answer queries from canned rows"""
+
+    def __init__(self, results=None):
+        self.results = results or dict()
+        self.statements = list()
+
+    def cursor(self):
+        connection = self
+
+        class RecordingCursor(object):
+            rows = ()
+
+            def execute(self, command, params=None):
+                connection.statements.append((command.strip(), params))
+                for start, rows in connection.results.items():
+                    if command.startswith(start):
+                        self.rows = rows
+                        return
+
+            def fetchall(self):
+                return self.rows
+
+            def close(self):
+                pass
+
+        return RecordingCursor()
+
+    def close(self):
+        pass
+
+
+def connected_engine(results=None):
+    engine = MysqlEngine()
+    engine.connection = RecordingConnection(results)
+    engine._connection_params = dict(user="root", password="secret", host="localhost", port=3306)
+    return engine
+
+
+def test_get_engine():
+    assert get_engine("mysql") is MysqlEngine
+
+
+def test_compose():
+    command = "INSERT INTO {database}.{table} ({columns}) ON DELETE {rule}"
+    composed = mysql_engine.compose(
+        command, database="branch_jazz", table="odd`name", columns=["id", "name"], rule=mysql_engine.Keyword("CASCADE"))
+    assert composed == "INSERT INTO `branch_jazz`.`odd``name` (`id`, `name`) ON DELETE CASCADE"
+
+
+def test_connect__missing_driver():
+    with mock.patch.dict("sys.modules", {"pymysql": None}):
+        with pytest.raises(ImproperlyConfigured, match="requires PyMySQL"):
+            MysqlEngine().connect(user="root")
+
+
+def test_databases_exist():
+    engine = connected_engine({"SELECT SCHEMA_NAME": [("branch_jazz",)]})
+    assert engine.databases_exist(["branch_jazz", "branch_blues"]) == {"branch_jazz"}
+    assert engine.connection.statements == [(
+        "SELECT SCHEMA_NAME FROM information_schema.SCHEMATA WHERE SCHEMA_NAME IN %s",
+        [["branch_jazz", "branch_blues"]])]
+
+
+def test_all_databases__prefix():
+    engine = connected_engine({"SELECT SCHEMA_NAME": [("branch_jazz",)]})
+    assert engine.all_databases(prefix="branch_") == ["branch_jazz"]
+    assert engine.connection.statements[0][1] == ["branch\\_%"]
+
+
+def test_create_database__template():
+    engine = connected_engine({
+        "SELECT SCHEMA_NAME": [],
+        "SELECT DEFAULT_CHARACTER_SET_NAME": [("utf8mb4", "utf8mb4_general_ci")],
+        "SELECT TABLE_NAME FROM": [("songs",), ("artists",)],
+        "SELECT TABLE_NAME, COLUMN_NAME": [("artists", "id"), ("songs", "id"), ("songs", "artist_id")],
+        "SELECT k.TABLE_NAME": [(
+            "songs", "songs_artist", "artist_id", "main", "artists", "id", "CASCADE", "NO ACTION")],
+    })
+    engine.create_database("branch_jazz", template="main", max_concurrency=1)
+    statements = list(statement for statement, _ in engine.connection.statements)
+    assert "CREATE DATABASE `branch_jazz` CHARACTER SET `utf8mb4` COLLATE `utf8mb4_general_ci`" in statements
+    assert statements.index("CREATE TABLE `branch_jazz`.`songs` LIKE `main`.`songs`") < \
+        statements.index("CREATE TABLE `branch_jazz`.`artists` LIKE `main`.`artists`")
+    assert "INSERT INTO `branch_jazz`.`songs` (`id`, `artist_id`) SELECT `id`, `artist_id` FROM `main`.`songs`" \
+        in statements
+    assert statements[-2:] == [
+        "ALTER TABLE `branch_jazz`.`songs` ADD CONSTRAINT `songs_artist` FOREIGN KEY (`artist_id`) "
+        "REFERENCES `branch_jazz`.`artists` (`id`) ON UPDATE CASCADE ON DELETE NO ACTION",
+        "SET SESSION foreign_key_checks = 1, unique_checks = 1"]
+
+
+def test_create_database__leased_worker():
+    results = {
+        "SELECT SCHEMA_NAME": [],
+        "SELECT DEFAULT_CHARACTER_SET_NAME": [("utf8mb4", "utf8mb4_general_ci")],
+        "SELECT TABLE_NAME FROM": [("songs",), ("artists",)],
+        "SELECT TABLE_NAME, COLUMN_NAME": [("artists", "id"), ("songs", "id")],
+        "SELECT k.TABLE_NAME": []}
+    engine = connected_engine(results)
+    worker = connected_engine(results)
+    engine.manager = mock.Mock()
+    engine.manager.acquire.return_value = worker
+
+    engine.create_database("branch_jazz", template="main", max_concurrency=2)
+    # the second worker's connection is leased from the manager, and handed back with its checks restored
+    engine.manager.acquire.assert_called_once_with(engine.db_info, block=False)
+    engine.manager.release.assert_called_once_with(worker, engine.db_info)
+    assert worker.connection.statements[-1][0] == "SET SESSION foreign_key_checks = 1, unique_checks = 1"
+
+
+def test_create_database__failure_drops_database():
+    engine = connected_engine({
+        "SELECT SCHEMA_NAME": [],
+        "SELECT DEFAULT_CHARACTER_SET_NAME": [("utf8mb4", "utf8mb4_general_ci")]})
+    with mock.patch.object(engine, "_clone_tables", side_effect=DatabaseError("Table is full")):
+        with pytest.raises(DatabaseError, match="Table is full"):
+            engine.create_database("branch_jazz", template="main")
+    assert engine.connection.statements[-1][0] == "DROP DATABASE IF EXISTS `branch_jazz`"
+
+
+def test_create_database__missing_template():
+    engine = connected_engine({"SELECT SCHEMA_NAME": [], "SELECT DEFAULT_CHARACTER_SET_NAME": []})
+    with pytest.raises(DatabaseError, match="Template 'main' does not exist"):
+        engine.create_database("branch_jazz", template="main")
+
+
+@mock.patch("branchdb.engines.mysql.mysql_engine.pipe")
+def test_create_database__dump(mock_pipe):
+    engine = connected_engine({
+        "SELECT SCHEMA_NAME": [],
+        "SELECT DEFAULT_CHARACTER_SET_NAME": [("utf8mb4", "utf8mb4_general_ci")]})
+    engine.create_database("branch_jazz", template="main", strategy="dump")
+    dump_command, dump_environment, restore_command, _ = mock_pipe.call_args[0]
+    assert dump_command == [
+        "mysqldump", "--single-transaction", "--routines", "--triggers",
+        "--user=root", "--host=localhost", "--port=3306", "main"]
+    assert restore_command == ["mysql", "--user=root", "--host=localhost", "--port=3306", "branch_jazz"]
+    assert dump_environment["MYSQL_PWD"] == "secret"
+
+
+def test_delete_databases__force():
+    engine = connected_engine({"SELECT SCHEMA_NAME": [("branch_jazz",)], "SELECT ID": [(12,)]})
+    failures = engine.delete_databases(["branch_jazz", "branch_blues"], force=True)
+    assert list(failures) == ["branch_blues"]
+    assert engine.connection.statements[1:] == [
+        ("SELECT ID FROM information_schema.PROCESSLIST WHERE DB IN %s AND ID <> CONNECTION_ID()", [["branch_jazz"]]),
+        ("KILL %s", [12]),
+        ("DROP DATABASE IF EXISTS `branch_jazz`", None)]
+
+
+@integration
+def test_create_database__server():
+    engine = MysqlEngine()
+    engine.connect(
+        user=os.environ.get("BRANCHDB_TEST_MYSQL_USER", "root"),
+        password=os.environ.get("BRANCHDB_TEST_MYSQL_PASSWORD"),
+        host=os.environ["BRANCHDB_TEST_MYSQL_HOST"],
+        port=os.environ.get("BRANCHDB_TEST_MYSQL_PORT", ""))
+    names = ["branchdb_test_template", "branchdb_test_clone"]
+    engine.delete_databases(names)
+    try:
+        engine.create_database("branchdb_test_template")
+        with engine.get_cursor() as cursor:
+            cursor.execute("CREATE TABLE branchdb_test_template.artists (id INT PRIMARY KEY)")
+            cursor.execute(
+                "CREATE TABLE branchdb_test_template.songs (id INT PRIMARY KEY, artist_id INT, "
+                "FOREIGN KEY (artist_id) REFERENCES branchdb_test_template.artists (id))")
+            cursor.execute("INSERT INTO branchdb_test_template.artists VALUES (1), (2)")
+            cursor.execute("INSERT INTO branchdb_test_template.songs VALUES (1, 2)")
+
+        engine.create_database("branchdb_test_clone", template="branchdb_test_template", max_concurrency=2)
+        with engine.get_cursor() as cursor:
+            cursor.execute("SELECT id, artist_id FROM branchdb_test_clone.songs")
+            assert list(cursor.fetchall()) == [(1, 2)]
+            cursor.execute(
+                "SELECT REFERENCED_TABLE_SCHEMA FROM information_schema.KEY_COLUMN_USAGE "
+                "WHERE TABLE_SCHEMA = 'branchdb_test_clone' AND REFERENCED_TABLE_NAME IS NOT NULL")
+            assert list(cursor.fetchall()) == [("branchdb_test_clone",)]
+    finally:
+        assert engine.delete_databases(names, force=True) == {}
+        engine.disconnect()
@@ -4,11 +4,13 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
 import pytest
 import mock
 from psycopg2.sql import Composed, Identifier, SQL
 from branchdb.errors import DatabaseError
 from branchdb.engines.postgres import postgres_engine, PostgresEngine
+from . import data_folder
 from .mocking import mock_postgres_cursor, MockConnection
 
 
@@ -112,3 +114,252 @@ def test_delete_database__existing(mock_exists):
     engine = PostgresEngine()
     with pytest.raises(DatabaseError, match="Database 'jazz' does not exist."):
         engine.delete_database("jazz")
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._execute")
+def test_databases_exist(mock_execute):
+    engine = PostgresEngine()
+    with mock.patch.object(engine, "get_cursor") as mock_cursor:
+        mock_cursor.return_value.__enter__ = mock_postgres_cursor([["db1"]])
+        result = engine.databases_exist(["db1", "db2"])
+    assert result == {"db1"}
+    mock_execute.assert_called_once_with(
+        mock.ANY,
+        Composed([SQL("SELECT datname FROM pg_database WHERE datname = ANY(%s)\n")]),
+        [["db1", "db2"]])
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._execute")
+def test_databases_exist__none(mock_execute):
+    assert PostgresEngine().databases_exist([]) == set()
+    assert mock_execute.called is False
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._execute")
+def test_all_databases__prefix(mock_execute):
+    engine = PostgresEngine()
+    with mock.patch.object(engine, "get_cursor") as mock_cursor:
+        mock_cursor.return_value.__enter__ = mock_postgres_cursor([["branch_jazz"]])
+        result = engine.all_databases(prefix="branch_")
+    assert result == ["branch_jazz"]
+    mock_execute.assert_called_once_with(
+        mock.ANY,
+        Composed([SQL("SELECT datname FROM pg_database WHERE datname LIKE %s\n")]),
+        ["branch\\_%"])
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.databases_exist")
+def test_catalog_snapshot(mock_exist):
+    mock_exist.return_value = {"jazz"}
+    engine = PostgresEngine()
+    with engine.catalog_snapshot(["jazz", "blues"]):
+        assert engine.database_exists("jazz") is True
+        assert engine.database_exists("blues") is False
+        engine.record_database("blues", True)
+        assert engine.database_exists("blues") is True
+    assert mock_exist.call_count == 1
+    assert engine.catalog is None
+
+
+def connected_engine(server_version):
+    engine = PostgresEngine()
+    engine.connection = MockConnection()
+    engine.connection.server_version = server_version
+    return engine
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._execute")
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.databases_exist")
+def test_delete_databases__force(mock_exist, mock_execute):
+    mock_exist.return_value = {"jazz", "blues"}
+    engine = connected_engine(130002)
+    with mock.patch.object(engine, "get_cursor") as mock_cursor:
+        mock_cursor.return_value.__enter__ = mock_postgres_cursor()
+        failures = engine.delete_databases(["jazz", "blues", "rock"], force=True, max_concurrency=1)
+
+    assert list(failures) == ["rock"]
+    assert str(failures["rock"]) == "Database 'rock' does not exist."
+    assert mock_exist.call_count == 1
+    mock_execute.assert_any_call(
+        mock.ANY,
+        Composed([SQL("DROP DATABASE IF EXISTS "), Identifier("jazz"), SQL(" WITH (FORCE)\n")]))
+    assert mock_execute.call_count == 2
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._execute")
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.databases_exist")
+def test_delete_databases__force_terminates_backends(mock_exist, mock_execute):
+    mock_exist.return_value = {"jazz", "blues"}
+    engine = connected_engine(120005)
+    with mock.patch.object(engine, "get_cursor") as mock_cursor:
+        mock_cursor.return_value.__enter__ = mock_postgres_cursor()
+        failures = engine.delete_databases(["jazz", "blues"], force=True, max_concurrency=1)
+
+    assert failures == {}
+    assert mock_execute.call_args_list[0] == mock.call(
+        mock.ANY,
+        Composed([SQL(
+            "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+            "WHERE datname = ANY(%s) AND pid <> pg_backend_pid()\n")]),
+        [["jazz", "blues"]])
+    mock_execute.assert_any_call(
+        mock.ANY,
+        Composed([SQL("DROP DATABASE IF EXISTS "), Identifier("blues"), SQL("\n")]))
+    assert mock_execute.call_count == 3
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._drop_batch_on_other_connection")
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._drop_batch")
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.databases_exist")
+def test_delete_databases__parallel(mock_exist, mock_drop, mock_drop_new):
+    names = ["db{}".format(index) for index in range(5)]
+    mock_exist.return_value = set(names)
+    error = DatabaseError("bad")
+    mock_drop.return_value = {}
+    # the second batch can not get a connection of its own, the third fails to drop
+    mock_drop_new.side_effect = lambda batch, force: batch if "db1" in batch else {batch[0]: error}
+
+    failures = connected_engine(130002).delete_databases(names, max_concurrency=3)
+    assert failures == {"db2": error}
+    mock_drop.assert_has_calls([mock.call(["db0", "db3"], False), mock.call(["db1", "db4"], False)], any_order=True)
+    assert mock_drop_new.call_count == 2
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._drop_batch")
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.databases_exist")
+def test_delete_databases__connection_limit(mock_exist, mock_drop):
+    names = ["db{}".format(index) for index in range(4)]
+    mock_exist.return_value = set(names)
+    mock_drop.return_value = {}
+    engine = connected_engine(130002)
+    engine.manager = mock.Mock()
+    # the manager has no room for another connection
+    engine.manager.acquire.return_value = None
+
+    assert engine.delete_databases(names, max_concurrency=2) == {}
+    engine.manager.acquire.assert_called_once_with(engine.db_info, block=False)
+    mock_drop.assert_has_calls([mock.call(["db0", "db2"], False), mock.call(["db1", "db3"], False)], any_order=True)
+
+
+def test_get_command__positional_arguments():
+    with mock.patch.object(postgres_engine.commands, "folder", os.path.join(data_folder, "commands")):
+        with mock.patch.object(postgres_engine.commands, "_commands", None):
+            command = postgres_engine.get_command("mock_command", "datname", arg2="pg_database")
+    assert command == Composed([
+        SQL("SELECT "),
+        Identifier("datname"),
+        SQL(" FROM "),
+        Identifier("pg_database"),
+        SQL("\n")])
+
+
+def test_command__server_version():
+    engine = connected_engine(130002)
+    assert engine.command("delete_database_force", database="jazz") == Composed([
+        SQL("DROP DATABASE "),
+        Identifier("jazz"),
+        SQL(" WITH (FORCE)\n")])
+    engine = connected_engine(120005)
+    with pytest.raises(DatabaseError, match="not supported by server version 120005"):
+        engine.command("delete_database_force", database="jazz")
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._execute")
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.database_exists")
+def test_create_database__strategy(mock_exists, mock_execute):
+    mock_exists.return_value = False
+    engine = connected_engine(150001)
+    with mock.patch.object(engine, "get_cursor") as mock_cursor:
+        mock_cursor.return_value.__enter__ = mock_postgres_cursor()
+        engine.create_database("jazz2", template="jazz1", strategy="file_copy")
+
+    composed_create = Composed([
+        SQL("CREATE DATABASE "),
+        Identifier("jazz2"),
+        SQL(" TEMPLATE "),
+        Identifier("jazz1"),
+        SQL(" STRATEGY "),
+        Identifier("file_copy"),
+        SQL("\n")])
+    mock_execute.assert_any_call(mock.ANY, composed_create)
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._execute")
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.database_exists")
+def test_create_database__strategy_unsupported(mock_exists, mock_execute):
+    mock_exists.return_value = False
+    engine = connected_engine(140007)
+    assert engine.clone_strategies == ()
+    with mock.patch.object(engine, "get_cursor") as mock_cursor:
+        mock_cursor.return_value.__enter__ = mock_postgres_cursor()
+        engine.create_database("jazz2", template="jazz1", strategy="file_copy")
+
+    composed_create = Composed([
+        SQL("CREATE DATABASE "),
+        Identifier("jazz2"),
+        SQL(" TEMPLATE "),
+        Identifier("jazz1"),
+        SQL("\n")])
+    mock_execute.assert_any_call(mock.ANY, composed_create)
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.database_exists")
+def test_create_database__unknown_strategy(mock_exists):
+    mock_exists.return_value = False
+    with pytest.raises(DatabaseError, match="Unknown clone strategy 'copy'"):
+        connected_engine(150001).create_database("jazz2", template="jazz1", strategy="copy")
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._execute")
+def test_commented_databases(mock_execute):
+    engine = connected_engine(130002)
+    with mock.patch.object(engine, "get_cursor") as mock_cursor:
+        mock_cursor.return_value.__enter__ = mock_postgres_cursor([["spare", "branchdb-spare:{}"]])
+        result = engine.commented_databases("branchdb-spare:")
+    assert result == {"spare": "branchdb-spare:{}"}
+    mock_execute.assert_called_once_with(mock.ANY, mock.ANY, ["branchdb-spare:%"])
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._execute")
+def test_rename_database(mock_execute):
+    engine = connected_engine(130002)
+    with mock.patch.object(engine, "get_cursor") as mock_cursor:
+        mock_cursor.return_value.__enter__ = mock_postgres_cursor()
+        engine.rename_database("spare", "jazz")
+        engine.comment_database("jazz", None)
+
+    mock_execute.assert_any_call(mock.ANY, Composed([
+        SQL("ALTER DATABASE "),
+        Identifier("spare"),
+        SQL(" RENAME TO "),
+        Identifier("jazz"),
+        SQL("\n")]))
+    mock_execute.assert_any_call(
+        mock.ANY,
+        Composed([SQL("COMMENT ON DATABASE "), Identifier("jazz"), SQL(" IS %s\n")]),
+        [None])
+
+
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine._execute")
+def test_update_branch_catalog(mock_execute):
+    engine = connected_engine(130002)
+    with mock.patch.object(engine, "get_cursor") as mock_cursor:
+        mock_cursor.return_value.__enter__ = mock_postgres_cursor()
+        engine.update_branch_catalog("branch_", {"master": "branch_master", "old": None})
+
+    commands = list(call[0][1] for call in mock_execute.call_args_list)
+    assert commands[0].as_string(None).startswith("CREATE TABLE IF NOT EXISTS branchdb_catalog")
+    mock_execute.assert_any_call(mock.ANY, mock.ANY, ["branch_", "master", "branch_master"])
+    mock_execute.assert_any_call(mock.ANY, mock.ANY, ["branch_", "old"])
+    assert engine.connection.autocommit is True
+
+
+def test_branch_catalog__no_table():
+    engine = connected_engine(130002)
+    error = postgres_engine.psycopg2.ProgrammingError()
+    with mock.patch.object(engine, "_execute", side_effect=error):
+        with mock.patch.object(type(error), "pgcode", "42P01"):
+            with mock.patch.object(engine, "get_cursor") as mock_cursor:
+                mock_cursor.return_value.__enter__ = mock_postgres_cursor()
+                assert engine.branch_catalog("branch_") == {}
+                assert engine.branch_catalog("branch_", "master") is None
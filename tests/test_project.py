@@ -0,0 +1,63 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import mock
+from branchdb import project
+from . import mocking
+
+
+@mock.patch("branchdb.git_tools.find_git_dir")
+def test_get_project__root_resolved_once(mock_find, tmp_path):
+    git_dir = tmp_path / ".git"
+    git_dir.mkdir()
+    (git_dir / "HEAD").write_text(u"ref: refs/heads/jazz\n")
+    mock_find.return_value = (str(git_dir), str(tmp_path))
+
+    first = project.get_project(str(tmp_path))
+    second = project.get_project(str(tmp_path))
+    assert mock_find.call_count == 1
+    assert first.root == second.root == str(tmp_path)
+    assert first.branch == "jazz"
+    assert first.settings_path == os.path.join(str(tmp_path), ".branchdb", "settings.py")
+    assert first.mapping_path == os.path.join(str(tmp_path), ".branchdb", "mappings.json")
+
+
+@mock.patch("branchdb.git_tools.get_repo")
+def test_get_project__fallback(mock_repo):
+    mock_repo.return_value = mocking.MockRepo(active_branch_name="jazz", project_root="/repo")
+    result = project.get_project()
+    assert result.root == "/repo"
+    assert result.branch == "jazz"
+
+    # the root is cached, while the branch is resolved for each project
+    mock_repo.reset_mock()
+    assert project.get_project().root == "/repo"
+    assert mock_repo.called is False
+
+
+def test_project__branch_resolved_once():
+    repo = mocking.MockRepo(active_branch_name="jazz", project_root="/repo")
+    result = project.Project("/repo", repo=repo)
+    assert result.branch == "jazz"
+    repo.active_branch_name = "blues"
+    assert result.branch == "jazz"
+
+
+@mock.patch("branchdb.git_tools.get_repo")
+def test_project__repo_of_root(mock_repo):
+    result = project.Project("/elsewhere")
+    assert result.repo is mock_repo.return_value
+    mock_repo.assert_called_once_with("/elsewhere")
+
+
+def test_project__reftable_branch(tmp_path):
+    git_dir = tmp_path / ".git"
+    (git_dir / "reftable").mkdir(parents=True)
+    (git_dir / "HEAD").write_text(u"ref: refs/heads/.invalid\n")
+    repo = mocking.MockRepo(active_branch_name="jazz", project_root=str(tmp_path))
+    # only git can read the HEAD of a reftable repository
+    assert project.Project(str(tmp_path), git_dir=str(git_dir), repo=repo).branch == "jazz"
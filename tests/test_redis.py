@@ -0,0 +1,282 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import fnmatch
+import pytest
+import mock
+from branchdb.errors import DatabaseError, ImproperlyConfigured
+from branchdb.engines import get_engine
+from branchdb.engines.redis import redis_engine, RedisEngine
+
+integration = pytest.mark.skipif(
+    "BRANCHDB_TEST_REDIS_HOST" not in os.environ,
+    reason="set BRANCHDB_TEST_REDIS_HOST (and _PORT, _PASSWORD) to test against a Redis server")
+
+
+def encode(value):
+    return value.encode("utf-8") if not isinstance(value, bytes) else value
+
+
+class FakePipeline(object):
+    def __init__(self, client, transaction=True):
+        self.client = client
+        self.commands = list()
+        self.buffering = not transaction
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def __len__(self):
+        return len(self.commands)
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            if self.buffering is False:
+                return method(*args, **kwargs)
+            self.commands.append((method, args, kwargs))
+            return self
+        return call
+
+    def multi(self):
+        self.buffering = True
+
+    def execute(self):
+        self.client.round_trips += 1
+        results = list(method(*args, **kwargs) for method, args, kwargs in self.commands)
+        self.commands = list()
+        return results
+
+
+class FakeRedis(object):
+    """The handful of Redis commands the engine uses, over a dict of logical databases"""
+
+    def __init__(self, server, db=0):
+        self.server = server
+        self.db = db
+        self.round_trips = 0
+        self.connection_pool = mock.Mock()
+
+    @property
+    def keys(self):
+        return self.server.setdefault(self.db, dict())
+
+    def ping(self):
+        return True
+
+    def set(self, key, value, px=None):
+        self.keys[encode(key)] = (value, px if px is not None else -1)
+
+    def get(self, key):
+        return self.keys.get(encode(key), (None,))[0]
+
+    def pttl(self, key):
+        return self.keys[encode(key)][1] if encode(key) in self.keys else -2
+
+    def dump(self, key):
+        return self.keys.get(encode(key), (None,))[0]
+
+    def restore(self, key, ttl, payload):
+        assert encode(key) not in self.keys
+        self.keys[encode(key)] = (payload, ttl or -1)
+
+    def unlink(self, *keys):
+        return sum(1 for key in keys if self.keys.pop(encode(key), None) is not None)
+
+    def scan_iter(self, match=None, count=None):
+        pattern = match.replace("\\", "")
+        return list(key for key in self.keys if fnmatch.fnmatchcase(key.decode("utf-8"), pattern))
+
+    def flushdb(self, asynchronous=False):
+        self.keys.clear()
+
+    def dbsize(self):
+        return len(self.keys)
+
+    def config_get(self, name):
+        return {"databases": "4"}
+
+    def hash(self, name):
+        return self.keys.setdefault(encode(name), (dict(), -1))[0]
+
+    def hgetall(self, name):
+        return dict(self.hash(name))
+
+    def hget(self, name, field):
+        return self.hash(name).get(encode(field))
+
+    def hmget(self, name, fields):
+        return list(self.hash(name).get(encode(field)) for field in fields)
+
+    def hexists(self, name, field):
+        return encode(field) in self.hash(name)
+
+    def hvals(self, name):
+        return list(self.hash(name).values())
+
+    def hset(self, name, field, value):
+        self.hash(name)[encode(field)] = encode(str(value))
+
+    def hsetnx(self, name, field, value):
+        if encode(field) in self.hash(name):
+            return False
+        self.hset(name, field, value)
+        return True
+
+    def hdel(self, name, field):
+        return self.hash(name).pop(encode(field), None) is not None
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self, transaction)
+
+    def transaction(self, func, *watches, **kwargs):
+        pipe = self.pipeline()
+        pipe.buffering = False
+        value = func(pipe)
+        pipe.execute()
+        return value
+
+
+def connected_engine(mode=redis_engine.PREFIX_MODE):
+    server = dict()
+    engine = RedisEngine()
+    engine.mode = mode
+    engine._clients = dict((db, FakeRedis(server, db)) for db in range(4))
+    engine.connection = engine._clients[0]
+    return engine
+
+
+def test_get_engine():
+    assert get_engine("redis") is RedisEngine
+
+
+def test_connection_params():
+    db_info = {"ENGINE": "redis", "HOST": "cache", "PORT": 6380, "MODE": "index"}
+    assert RedisEngine.connection_params(db_info) == dict(
+        user=None, password=None, host="cache", port=6380, db=0, mode="index")
+
+
+def test_connect__unknown_mode():
+    with pytest.raises(ImproperlyConfigured, match="Unknown Redis mode 'shard'"):
+        RedisEngine().connect(mode="shard")
+
+
+def test_escape_pattern():
+    assert redis_engine.escape_pattern("branch_[x]*?:") == "branch_\\[x\\]\\*\\?:"
+
+
+def test_create_database__prefix():
+    engine = connected_engine()
+    engine.connection.set("main:user:1", b"payload1")
+    engine.connection.set("main:session:1", b"payload2", px=5000)
+    engine.connection.set("other:user:1", b"payload3")
+
+    engine.create_database("branch_jazz", template="main")
+    assert engine.all_databases() == ["branch_jazz"]
+    assert engine.connection.get("branch_jazz:user:1") == b"payload1"
+    assert engine.connection.pttl("branch_jazz:session:1") == 5000
+    assert engine.connection.pttl("branch_jazz:user:1") == -1
+    assert engine.connection.get("branch_jazz:other:user:1") is None
+
+
+def test_copy_keys__batches():
+    engine = connected_engine()
+    for index in range(25):
+        engine.connection.set("main:{}".format(index), b"payload")
+    engine.copy_keys(engine.connection, "main:", engine.connection, "copy:", batch_size=10)
+    # a DUMP and a RESTORE round trip for each of the three batches
+    assert engine.connection.round_trips == 6
+    assert len(engine.connection.scan_iter(match="copy:*")) == 25
+
+
+def test_create_database__existing():
+    engine = connected_engine()
+    engine.create_database("branch_jazz")
+    with pytest.raises(DatabaseError, match="already exists"):
+        engine.create_database("branch_jazz")
+
+
+def test_create_database__failure_cleans_up():
+    engine = connected_engine()
+    engine.connection.set("main:user:1", b"payload1")
+    with mock.patch.object(engine, "_copy_batch", side_effect=Exception("BUSYKEY")):
+        with pytest.raises(Exception, match="BUSYKEY"):
+            engine.create_database("branch_jazz", template="main")
+    assert engine.database_exists("branch_jazz") is False
+
+
+def test_delete_database__prefix():
+    engine = connected_engine()
+    engine.connection.set("main:user:1", b"payload1")
+    engine.create_database("branch_jazz", template="main")
+    engine.create_database("branch_blues", template="main")
+
+    engine.delete_database("branch_jazz")
+    assert engine.all_databases() == ["branch_blues"]
+    assert engine.connection.scan_iter(match="branch_jazz:*") == []
+    assert engine.connection.get("branch_blues:user:1") == b"payload1"
+    assert engine.connection.get("main:user:1") == b"payload1"
+
+
+def test_registry_left_out_of_scans():
+    engine = connected_engine()
+    engine.connection.set("branchdb:user:1", b"payload1")
+    engine.create_database("branch_jazz", template="branchdb")
+    assert engine.connection.get("branch_jazz:user:1") == b"payload1"
+    assert engine.connection.get("branch_jazz:databases") is None
+
+    # the prefix of a database named "branchdb" covers the registry
+    engine.connection.unlink("branchdb:user:1")
+    engine.create_database("branchdb")
+    engine.delete_database("branchdb")
+    assert engine.all_databases() == ["branch_jazz"]
+
+
+def test_create_database__index():
+    engine = connected_engine(redis_engine.INDEX_MODE)
+    engine._clients[1].set("user:1", b"payload1")
+
+    engine.create_database("branch_jazz", template="1")
+    # the registry's database and databases holding keys are skipped
+    assert engine.connection.hget(redis_engine.REGISTRY_KEY, "branch_jazz") == b"2"
+    assert engine._clients[2].get("user:1") == b"payload1"
+
+    engine.create_database("branch_blues", template="branch_jazz")
+    assert engine.connection.hget(redis_engine.REGISTRY_KEY, "branch_blues") == b"3"
+    with pytest.raises(DatabaseError, match="No empty logical database is left"):
+        engine.create_database("branch_rock")
+
+    engine.delete_database("branch_jazz")
+    assert engine._clients[2].dbsize() == 0
+    assert engine.databases_exist(["branch_jazz", "branch_blues"]) == {"branch_blues"}
+
+
+@integration
+def test_create_database__server():
+    engine = RedisEngine()
+    engine.connect(
+        password=os.environ.get("BRANCHDB_TEST_REDIS_PASSWORD"),
+        host=os.environ["BRANCHDB_TEST_REDIS_HOST"],
+        port=os.environ.get("BRANCHDB_TEST_REDIS_PORT", ""))
+    names = ["branchdb_test_clone"]
+    engine.delete_databases(list(engine.databases_exist(names)))
+    try:
+        for index in range(2500):
+            engine.connection.set("branchdb_test_template:{}".format(index), index)
+        engine.connection.set("branchdb_test_template:expiring", "value", px=60000)
+
+        engine.create_database("branchdb_test_clone", template="branchdb_test_template")
+        assert engine.connection.get("branchdb_test_clone:2499") == b"2499"
+        assert 0 < engine.connection.pttl("branchdb_test_clone:expiring") <= 60000
+    finally:
+        assert engine.delete_databases(list(engine.databases_exist(names))) == {}
+        engine._delete_keys(engine.connection, "branchdb_test_template:")
+        engine.disconnect()
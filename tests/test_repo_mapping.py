@@ -5,13 +5,13 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
-import re
+import json
+import stat
 import pytest
 import mock
-from mock import PropertyMock
 from contextlib import contextmanager
 from branchdb.conf import settings
-from branchdb.repo_mapping import RepoMapping
+from branchdb.repo_mapping import RepoMapping, import_mapping
 from branchdb import utils
 from .mocking import monkey_patch, make_temp_mapping_file
 from . import data_folder
@@ -51,87 +51,82 @@ def test_as_context__no_update(mock_update):
     assert mock_update.called is False
 
 
-@mock.patch(u"branchdb.repo_mapping.os.makedirs")
-@mock.patch(u"branchdb.repo_mapping.os.path.exists")
-def test_mapping_file_location__no_branchdb_folder(mock_exists, mock_make):
-    mock_exists.return_value = False
+def test_update_mapping():
+    backend = mock.Mock()
+    repo_mapping = RepoMapping(project_root, build=False, backend=backend)
+    repo_mapping[u"master"] = u"branch_master"
+    repo_mapping.remove(u"master")
+    repo_mapping[u"test"] = u"branch_test"
 
-    mapping = RepoMapping(project_root, build=False)
-    file_loc = mapping.mapping_file_location
-    expected = r".*\/.branchdb\/mappings\.json"
-    assert bool(re.match(expected, file_loc)) is True
-    assert mock_exists.called is True
-    assert mock_make.called is True
-
-
-@mock.patch(u"branchdb.repo_mapping.os.makedirs")
-@mock.patch(u"branchdb.repo_mapping.os.path.exists")
-def test_mapping_file_location__matching_file(mock_exists, mock_make, tmp_path):
-    mock_exists.return_value = True
-    expected = r".*\/.branchdb\/mappings\.json"
-
-    with make_temp_mapping_file(tmp_path, {u"master": u"branch_master"}):
-        mapping = RepoMapping(str(tmp_path), build=False)
-    file_loc = mapping.mapping_file_location
-
-    assert bool(re.match(expected, file_loc)) is True
-    assert mock_exists.called is True
-    assert mock_make.called is False
-
-
-@mock.patch(u"branchdb.repo_mapping.os.path.exists")
-def test_mapping_file_location__cache_location(mock_exists, tmp_path):
-    mock_exists.return_value = True
-    expected = r".*\/.branchdb\/mappings\.json"
-
-    mapping = RepoMapping(project_root, build=False)
-    with make_temp_mapping_file(tmp_path, {u"master": u"branch_master"}):
-        file_loc = mapping.mapping_file_location
-    assert bool(re.match(expected, file_loc)) is True
-    assert mock_exists.called is True
-
-    mock_exists.reset_mock()
-    file_loc = mapping.mapping_file_location
-    assert bool(re.match(expected, file_loc)) is True
-    assert mock_exists.called is False
-
-
-@mock.patch(u"branchdb.repo_mapping.json.load")
-@mock.patch(u"branchdb.repo_mapping.os.path.exists")
-@mock.patch(u"branchdb.repo_mapping.RepoMapping.mapping_file_location", new_callable=PropertyMock)
-def test_build_mapping__path_does_not_exist(mock_loc, mock_exists, mock_load):
-    mock_exists.return_value = False
-    mock_loc.return_value = u"/example/mapping.json"
+    repo_mapping._update_mapping()
+    backend.save.assert_called_once_with({u"master": None, u"test": u"branch_test"})
+    assert repo_mapping._changes is False
 
-    repo_mapping = RepoMapping(project_root, build=False)
-    mapping = repo_mapping._build_mapping()
-    assert mapping == {}
-    assert mock_load.called is False
+    backend.load.return_value = {u"test": u"branch_test", u"other": u"branch_other"}
+    assert repo_mapping.mapping == {u"test": u"branch_test", u"other": u"branch_other"}
 
 
-@mock.patch(u"branchdb.repo_mapping.os.path.exists")
-@mock.patch(u"branchdb.repo_mapping.RepoMapping.mapping_file_location", new_callable=PropertyMock)
-def test_build_mapping__path_exist(mock_loc, mock_exists):
-    mock_exists.return_value = True
-    mock_loc.return_value = os.path.join(data_folder, u"mappings.json")
+def test_get__lazy():
+    backend = mock.Mock()
+    backend.get.side_effect = {u"master": u"branch_master"}.get
+    repo_mapping = RepoMapping(project_root, backend=backend)
+    assert repo_mapping.get(u"master") == u"branch_master"
+    assert repo_mapping.get(u"jazz", u"default") == u"default"
+    assert u"master" in repo_mapping
+    with pytest.raises(KeyError):
+        repo_mapping[u"jazz"]
 
-    repo_mapping = RepoMapping(project_root, build=False)
-    mapping = repo_mapping._build_mapping()
-    assert mapping == {u"master": u"branch_master", u"test": u"branch_test"}
+    repo_mapping[u"jazz"] = u"branch_jazz"
+    repo_mapping.remove(u"master")
+    assert repo_mapping[u"jazz"] == u"branch_jazz"
+    assert repo_mapping.get(u"master") is None
+    assert backend.load.called is False
 
 
-@mock.patch(u"branchdb.repo_mapping.utils.json_dump")
-@mock.patch(u"branchdb.repo_mapping.RepoMapping.mapping_file_location", new_callable=PropertyMock)
-def test_update_mapping(mock_loc, mock_dump):
-    mock_loc.return_value = u"/example/mapping.json"
+def test_mapping__applies_changes_on_load():
+    backend = mock.Mock()
+    backend.get.side_effect = {u"master": u"branch_master", u"old": u"branch_old"}.get
+    backend.load.return_value = {u"master": u"branch_master", u"old": u"branch_old"}
+    repo_mapping = RepoMapping(project_root, backend=backend)
+    repo_mapping[u"test"] = u"branch_test"
+    repo_mapping.remove(u"old")
+    assert repo_mapping.branches == [u"master", u"test"]
+    assert repo_mapping.branches_for(u"branch_test") == [u"test"]
 
-    repo_mapping = RepoMapping(project_root, build=False)
-    repo_mapping.mapping = {u"master": u"branch_master"}
-    repo_mapping._changes = True
 
-    repo_mapping._update_mapping()
-    mock_dump.assert_called_with({u"master": u"branch_master"}, u"/example/mapping.json")
-    assert repo_mapping._changes is False
+@monkey_patch(o=settings, k=u"MAPPING_BACKEND", v=u"sqlite")
+def test_import_mapping(tmp_path):
+    with make_temp_mapping_file(tmp_path, {u"master": u"branch_master"}):
+        with RepoMapping(str(tmp_path)) as mapping:
+            mapping[u"test"] = u"branch_test"
+        assert import_mapping(str(tmp_path), u"json") == 1
+        assert RepoMapping(str(tmp_path)).mapping == {u"master": u"branch_master", u"test": u"branch_test"}
+
+
+def test_update_mapping__merges_concurrent_changes(tmp_path):
+    with make_temp_mapping_file(tmp_path, {u"master": u"branch_master", u"old": u"branch_old"}) as file_:
+        first = RepoMapping(str(tmp_path))
+        second = RepoMapping(str(tmp_path))
+        with first:
+            first[u"feature1"] = u"branch_feature1"
+        with second:
+            second[u"feature2"] = u"branch_feature2"
+            second.remove(u"old")
+        expected = {u"master": u"branch_master", u"feature1": u"branch_feature1", u"feature2": u"branch_feature2"}
+        assert json.loads(file_.read_text()) == expected
+        assert second.mapping == expected
+        assert second._journal == {}
+
+
+def test_update_mapping__keeps_file_mode(tmp_path):
+    with make_temp_mapping_file(tmp_path) as file_:
+        os.chmod(str(file_), 0o640)
+        with RepoMapping(str(tmp_path)) as repo_mapping:
+            repo_mapping[u"master"] = u"branch_master"
+        assert stat.S_IMODE(os.stat(str(file_)).st_mode) == 0o640
+        # the lock file is kept out of the committed files
+        assert sorted(os.listdir(str(tmp_path / u".branchdb"))) == [u".cache", u"mappings.json"]
+        assert os.listdir(str(tmp_path / u".branchdb" / u".cache")) == [u"mappings.json.lock"]
 
 
 def test_get_or_create__existing_branch():
@@ -170,3 +165,65 @@ def test_remove_databases():
     repo_mapping.mapping = {u"master": u"branch_master", u"test1": u"branch_test1"}
     repo_mapping.remove_databases(u"branch_test1", u"branch_bad")
     assert repo_mapping.mapping == {u"master": u"branch_master"}
+
+
+def test_remove__changes():
+    repo_mapping = RepoMapping(project_root, build=False)
+    repo_mapping.mapping = {u"master": u"branch_master"}
+    repo_mapping.remove(u"bad")
+    assert repo_mapping._changes is False
+    repo_mapping.remove(u"master")
+    assert repo_mapping._changes is True
+
+
+def test_remove_databases__shared_database():
+    repo_mapping = RepoMapping(project_root, build=False)
+    repo_mapping.mapping = {
+        u"master": u"branch_master",
+        u"test1": u"branch_shared",
+        u"test2": u"branch_shared",
+        u"test3": u"branch_test3"}
+    repo_mapping.remove_databases(u"branch_shared", u"branch_bad")
+    assert repo_mapping.mapping == {u"master": u"branch_master", u"test3": u"branch_test3"}
+
+
+def test_sorted_views__invalidated():
+    repo_mapping = RepoMapping(project_root, build=False)
+    repo_mapping.mapping = {u"test": u"branch_test", u"master": u"branch_master"}
+    assert repo_mapping.branches == [u"master", u"test"]
+    assert repo_mapping.databases == [u"branch_master", u"branch_test"]
+
+    repo_mapping[u"jazz"] = u"branch_jazz"
+    assert repo_mapping.branches == [u"jazz", u"master", u"test"]
+    repo_mapping.remove(u"test")
+    assert repo_mapping.databases == [u"branch_jazz", u"branch_master"]
+    repo_mapping.mapping = {u"blues": u"branch_blues"}
+    assert repo_mapping.branches == [u"blues"]
+
+
+def test_branches_for():
+    repo_mapping = RepoMapping(project_root, build=False)
+    repo_mapping.mapping = {u"master": u"branch_master", u"test1": u"branch_shared"}
+    assert repo_mapping.branches_for(u"branch_shared") == [u"test1"]
+
+    repo_mapping[u"test2"] = u"branch_shared"
+    repo_mapping[u"test1"] = u"branch_test1"
+    assert repo_mapping.branches_for(u"branch_shared") == [u"test2"]
+    assert repo_mapping.branches_for(u"branch_test1") == [u"test1"]
+    assert repo_mapping.branches_for(u"branch_bad") == []
+
+
+def test_select():
+    repo_mapping = RepoMapping(project_root, build=False)
+    repo_mapping.mapping = {
+        u"master": u"branch_master",
+        u"feature/jazz": u"branch_feature_jazz",
+        u"feature/blues": u"branch_feature_blues",
+        u"hotfix/feature": u"branch_hotfix_feature"}
+    assert list(repo_mapping.select(u"feature/*").items()) == [
+        (u"feature/blues", u"branch_feature_blues"),
+        (u"feature/jazz", u"branch_feature_jazz")]
+    assert list(repo_mapping.select(u"feature", regex=True)) == [
+        u"feature/blues", u"feature/jazz", u"hotfix/feature"]
+    assert list(repo_mapping.select(u"^(master|hotfix/.*)$", regex=True)) == [u"hotfix/feature", u"master"]
+    assert repo_mapping.select(u"release/*") == {}
@@ -6,6 +6,7 @@ from __future__ import unicode_literals
 
 import os
 import mock
+import threading
 import pytest
 from branchdb import conf, errors
 from . import data_folder
@@ -52,6 +53,25 @@ def test_lazy_settings__cache(mock_root):
     assert mock_root.called is False
 
 
+@mock.patch("branchdb.conf.project_settings_module")
+def test_lazy_settings__threads(mock_root):
+    path_to_settings = ("mock_project_root", ".branchdb", "settings.py")
+    mock_root.return_value = os.path.join(data_folder, *path_to_settings)
+    settings = conf.LazySettings()
+    results = []
+
+    def read_settings():
+        results.append(settings.AUTO_CREATE)
+
+    threads = [threading.Thread(target=read_settings) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert mock_root.call_count == 1
+    assert results == [False] * 8
+
+
 def test_lazy_settings__configured():
     settings = conf.LazySettings()
     assert settings._wrapped is None
@@ -68,3 +88,47 @@ def test_settings__ordering():
     assert conf.default_settings.AUTO_CREATE is True
     assert settings.AUTO_CREATE is False
     assert settings.NAME_SCHEME == conf.default_settings.NAME_SCHEME
+
+
+def make_settings_module(tmp_path, content):
+    d = tmp_path / ".branchdb"
+    if d.exists() is False:
+        d.mkdir()
+    file_ = d / "settings.py"
+    file_.write_text(content)
+    return str(file_)
+
+
+def test_settings__cached(tmp_path):
+    settings_module = make_settings_module(tmp_path, u"AUTO_CREATE = False\nNAME_PREFIX = 'cached'\n")
+    settings = conf.Settings(settings_module, use_cache=True)
+    assert settings.NAME_PREFIX == "cached"
+
+    with mock.patch("branchdb.conf.utils.import_source_file") as mock_import:
+        settings = conf.Settings(settings_module, use_cache=True)
+    assert mock_import.called is False
+    assert settings.NAME_PREFIX == "cached"
+    assert settings.AUTO_CREATE is False
+    assert settings.NAME_SCHEME == conf.default_settings.NAME_SCHEME
+
+
+def test_settings__cache_invalidated(tmp_path):
+    settings_module = make_settings_module(tmp_path, u"NAME_PREFIX = 'cached'\n")
+    conf.Settings(settings_module, use_cache=True)
+
+    make_settings_module(tmp_path, u"NAME_PREFIX = 'changed'\n")
+    settings = conf.Settings(settings_module, use_cache=True)
+    assert settings.NAME_PREFIX == "changed"
+
+
+def test_settings__uncacheable(tmp_path):
+    settings_module = make_settings_module(tmp_path, u"import os\nNAME_PREFIX = 'x'\nJOIN = os.sep.join\n")
+    with mock.patch("branchdb.conf.cache.set_cached_settings", wraps=conf.cache.set_cached_settings) as mock_set:
+        settings = conf.Settings(settings_module, use_cache=True)
+        assert settings.NAME_PREFIX == "x"
+        assert mock_set.call_count == 1
+
+        # the settings module is executed again, but the cache is not rewritten
+        settings = conf.Settings(settings_module, use_cache=True)
+        assert settings.NAME_PREFIX == "x"
+        assert mock_set.call_count == 1
@@ -0,0 +1,160 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import errno
+import sqlite3
+import pytest
+import mock
+from branchdb.errors import DatabaseError, ConnectionError
+from branchdb.engines import get_engine
+from branchdb.engines.sqlite import sqlite_engine, SqliteEngine
+
+
+def connected_engine(tmp_path):
+    engine = SqliteEngine()
+    engine.connect(directory=str(tmp_path))
+    return engine
+
+
+def make_database(engine, name, rows=("jazz", "blues"), journal_mode=None):
+    connection = sqlite3.connect(engine.path(name))
+    if journal_mode is not None:
+        connection.execute("PRAGMA journal_mode={}".format(journal_mode))
+    connection.execute("CREATE TABLE genres (name TEXT)")
+    connection.executemany("INSERT INTO genres VALUES (?)", [(row,) for row in rows])
+    connection.commit()
+    return connection
+
+
+def genres(engine, name):
+    connection = sqlite3.connect(engine.path(name))
+    try:
+        return sorted(row[0] for row in connection.execute("SELECT name FROM genres"))
+    finally:
+        connection.close()
+
+
+def test_get_engine():
+    assert get_engine("sqlite") is SqliteEngine
+
+
+def test_connection_params():
+    db_info = {"ENGINE": "sqlite", "DIRECTORY": "/tmp/databases"}
+    assert SqliteEngine.connection_params(db_info) == dict(directory="/tmp/databases", extension=".sqlite3")
+
+
+def test_connect__creates_directory(tmp_path):
+    directory = tmp_path / "databases"
+    engine = SqliteEngine()
+    engine.connect(directory=str(directory))
+    assert engine.connected is True
+    assert directory.is_dir()
+
+
+def test_connect__no_directory():
+    with pytest.raises(ConnectionError):
+        SqliteEngine().connect()
+
+
+def test_all_databases(tmp_path):
+    engine = connected_engine(tmp_path)
+    for name in ("branch_jazz.sqlite3", "branch_blues.sqlite3", "branch_jazz.sqlite3-wal", "main.sqlite3", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    assert sorted(engine.all_databases()) == ["branch_blues", "branch_jazz", "main"]
+    assert sorted(engine.all_databases(prefix="branch_")) == ["branch_blues", "branch_jazz"]
+    assert engine.databases_exist(["branch_jazz", "branch_rock"]) == {"branch_jazz"}
+
+
+def test_path__invalid_name(tmp_path):
+    engine = connected_engine(tmp_path)
+    for name in ("", "..", "../outside", "nested/name"):
+        with pytest.raises(DatabaseError, match="is not a valid SQLite database name"):
+            engine.path(name)
+
+
+def test_create_database(tmp_path):
+    engine = connected_engine(tmp_path)
+    assert engine.create_database("branch_jazz") is True
+    assert engine.database_exists("branch_jazz") is True
+    with pytest.raises(DatabaseError, match="already exists"):
+        engine.create_database("branch_jazz")
+
+
+def test_create_database__template(tmp_path):
+    engine = connected_engine(tmp_path)
+    make_database(engine, "main").close()
+    engine.create_database("branch_jazz", template="main")
+    assert genres(engine, "branch_jazz") == ["blues", "jazz"]
+
+
+@mock.patch("branchdb.engines.sqlite.sqlite_engine.reflink")
+def test_create_database__reflink_unsupported(mock_reflink, tmp_path):
+    mock_reflink.side_effect = OSError(errno.EOPNOTSUPP, "Operation not supported")
+    engine = connected_engine(tmp_path)
+    make_database(engine, "main").close()
+
+    engine.create_database("branch_jazz", template="main")
+    assert genres(engine, "branch_jazz") == ["blues", "jazz"]
+    with pytest.raises(DatabaseError, match="does not support reflinks"):
+        engine.create_database("branch_blues", template="main", strategy="reflink")
+    assert engine.database_exists("branch_blues") is False
+
+
+def test_kernel_copy__fallback(tmp_path):
+    source_path = tmp_path / "source"
+    source_path.write_bytes(b"jazz" * 1000)
+    unsupported = OSError(errno.ENOSYS, "Function not implemented")
+    with mock.patch.object(sqlite_engine.os, "copy_file_range", side_effect=unsupported, create=True), \
+            mock.patch.object(sqlite_engine.os, "sendfile", side_effect=unsupported, create=True):
+        with open(str(source_path), "rb") as source, open(str(tmp_path / "target"), "wb") as target:
+            sqlite_engine.kernel_copy(source, target)
+    assert (tmp_path / "target").read_bytes() == b"jazz" * 1000
+
+
+@pytest.mark.skipif(not hasattr(sqlite3.Connection, "backup"), reason="requires the SQLite backup API")
+def test_create_database__template_in_use(tmp_path):
+    engine = connected_engine(tmp_path)
+    connection = make_database(engine, "main", journal_mode="WAL")
+    try:
+        # the rows only live in the write-ahead log until a checkpoint
+        assert os.path.exists(engine.path("main") + "-wal")
+        with mock.patch("branchdb.engines.sqlite.sqlite_engine.kernel_copy") as mock_copy:
+            engine.create_database("branch_jazz", template="main")
+        assert mock_copy.called is False
+        assert genres(engine, "branch_jazz") == ["blues", "jazz"]
+    finally:
+        connection.close()
+
+
+def test_create_database__missing_template(tmp_path):
+    engine = connected_engine(tmp_path)
+    with pytest.raises(DatabaseError, match="Template 'main' does not exist"):
+        engine.create_database("branch_jazz", template="main")
+    assert engine.database_exists("branch_jazz") is False
+
+
+def test_delete_database(tmp_path):
+    engine = connected_engine(tmp_path)
+    engine.create_database("branch_jazz")
+    (tmp_path / "branch_jazz.sqlite3-wal").write_bytes(b"")
+    assert engine.delete_database("branch_jazz") is True
+    assert os.listdir(str(tmp_path)) == []
+    with pytest.raises(DatabaseError, match="does not exist"):
+        engine.delete_database("branch_jazz")
+
+
+def test_delete_databases(tmp_path):
+    engine = connected_engine(tmp_path)
+    engine.create_database("branch_jazz")
+    engine.create_database("branch_blues")
+    (tmp_path / "branch_blues.sqlite3-shm").write_bytes(b"")
+
+    with mock.patch("branchdb.engines.sqlite.sqlite_engine.scan", wraps=sqlite_engine.scan) as mock_scan:
+        failures = engine.delete_databases(["branch_jazz", "branch_blues", "branch_rock"])
+    assert mock_scan.call_count == 1
+    assert list(failures) == ["branch_rock"]
+    assert os.listdir(str(tmp_path)) == []
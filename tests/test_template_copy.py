@@ -0,0 +1,187 @@
+# coding=utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import subprocess
+import pytest
+import mock
+from branchdb import database
+from branchdb.errors import DatabaseError
+from branchdb.engines.postgres import template_copy
+from branchdb.engines.postgres.template_copy import CopyProgress, DatabaseCopy
+from .test_postgres import connected_engine
+
+source = dict(user="reader", password="secret", host="remote", port=5433)
+target = dict(user="writer", password=None, host="localhost", port="")
+
+
+def test_libpq_environment():
+    environment = template_copy.libpq_environment(source, "template")
+    assert environment["PGUSER"] == "reader"
+    assert environment["PGPASSWORD"] == "secret"
+    assert environment["PGHOST"] == "remote"
+    assert environment["PGPORT"] == "5433"
+    assert environment["PGDATABASE"] == "template"
+
+
+def test_copy_progress__throughput():
+    progress = CopyProgress("template", "jazz", 2, 1, 100, 50, 2.0)
+    assert progress.throughput == 25.0
+    assert progress._replace(elapsed=0).throughput == 0.0
+
+
+def mock_process(returncode=0, stderr=b""):
+    process = mock.Mock(returncode=returncode)
+    process.communicate.return_value = (None, stderr)
+    process.stderr.read.return_value = stderr
+    return process
+
+
+@mock.patch("branchdb.engines.pipes.subprocess.Popen")
+def test_stream_section(mock_popen):
+    dump = mock_process()
+    restore = mock_process()
+    mock_popen.side_effect = [dump, restore]
+    template_copy.stream_section("pre-data", source, "template", target, "jazz", snapshot="00000003-1")
+
+    dump_call, restore_call = mock_popen.call_args_list
+    assert dump_call[0][0] == [
+        "pg_dump", "--section=pre-data", "--no-owner", "--no-privileges", "--snapshot=00000003-1"]
+    assert dump_call[1]["stdout"] is subprocess.PIPE
+    assert dump_call[1]["env"]["PGDATABASE"] == "template"
+    assert restore_call[0][0][0] == "psql"
+    assert restore_call[1]["stdin"] is dump.stdout
+    assert restore_call[1]["env"]["PGDATABASE"] == "jazz"
+    dump.stdout.close.assert_called_once_with()
+
+
+@mock.patch("branchdb.engines.pipes.subprocess.Popen")
+def test_stream_section__restore_failure(mock_popen):
+    mock_popen.side_effect = [mock_process(), mock_process(returncode=3, stderr=b"relation exists")]
+    with pytest.raises(DatabaseError, match="psql failed: relation exists"):
+        template_copy.stream_section("post-data", source, "template", target, "jazz")
+
+
+@mock.patch("branchdb.engines.pipes.subprocess.Popen")
+def test_stream_section__dump_failure(mock_popen):
+    def popen(command, **kwargs):
+        if command[0] == "pg_dump":
+            # the dump's errors go to a file, which can't fill up while the restore runs
+            kwargs["stderr"].write(b"permission denied")
+            return mock_process(returncode=1)
+        return mock_process()
+
+    mock_popen.side_effect = popen
+    with pytest.raises(DatabaseError, match="pg_dump failed: permission denied"):
+        template_copy.stream_section("pre-data", source, "template", target, "jazz")
+
+
+@mock.patch("branchdb.engines.pipes.subprocess.Popen")
+def test_stream_section__missing_pg_dump(mock_popen):
+    mock_popen.side_effect = OSError("No such file or directory")
+    with pytest.raises(DatabaseError, match="Unable to run pg_dump"):
+        template_copy.stream_section("pre-data", source, "template", target, "jazz")
+
+
+class CopyCursor(object):
+    """Cursor whose COPY TO writes the rows and whose COPY FROM collects what it reads"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def copy_expert(self, command, file_):
+        if self.connection.rows is not None:
+            for row in self.connection.rows:
+                file_.write(row)
+            if self.connection.error is not None:
+                raise self.connection.error
+        else:
+            self.connection.received = file_.read()
+
+
+class CopyConnection(object):
+    def __init__(self, rows=None, error=None):
+        self.rows = rows
+        self.error = error
+        self.received = None
+        self.commit = mock.Mock()
+        self.rollback = mock.Mock()
+
+    def cursor(self):
+        return CopyCursor(self)
+
+
+def test_copy_table():
+    progress = mock.Mock()
+    copy = DatabaseCopy(source, "template", target, "jazz", progress=progress, interval=0)
+    copy._started = copy._reported = 0
+    source_connection = CopyConnection(rows=[b"1\tjazz\n", b"2\tblues\n"])
+    target_connection = CopyConnection()
+
+    copy.copy_table(source_connection, target_connection, "public", "genres")
+    assert target_connection.received == b"1\tjazz\n2\tblues\n"
+    assert copy.snapshot().copied_bytes == 15
+    target_connection.commit.assert_called_once_with()
+    assert progress.called is True
+
+
+def test_copy_table__source_failure():
+    copy = DatabaseCopy(source, "template", target, "jazz")
+    copy._started = copy._reported = 0
+    error = Exception("connection lost")
+    target_connection = CopyConnection()
+
+    with pytest.raises(Exception, match="connection lost"):
+        copy.copy_table(CopyConnection(rows=[b"1\tjazz\n"], error=error), target_connection, "public", "genres")
+    target_connection.rollback.assert_called_once_with()
+    assert target_connection.commit.called is False
+
+
+@mock.patch("branchdb.engines.postgres.template_copy.stream_section")
+@mock.patch("branchdb.engines.postgres.template_copy.connect")
+def test_run__large_objects(mock_connect, mock_stream):
+    connection = mock_connect.return_value
+    connection.server_version = 130002
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchone.side_effect = [("00000003-1",), (True,)]
+    copy = DatabaseCopy(source, "template", target, "jazz")
+
+    with pytest.raises(DatabaseError, match="large objects are not supported"):
+        copy.run()
+    assert mock_stream.called is False
+    connection.close.assert_called_once_with()
+
+
+@mock.patch("branchdb.engines.postgres.template_copy.DatabaseCopy.run")
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.delete_database")
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.create_database")
+def test_copy_database__failure_drops_database(mock_create, mock_delete, mock_run):
+    mock_run.side_effect = DatabaseError("pg_dump of 'template' failed")
+    engine = connected_engine(130002)
+    engine._connection_params = target
+    with pytest.raises(DatabaseError):
+        engine.copy_database("jazz", "template", source, jobs=2)
+    mock_create.assert_called_once_with("jazz")
+    mock_delete.assert_called_once_with("jazz", force=True)
+
+
+@mock.patch("branchdb.engines.postgres.template_copy.DatabaseCopy.__init__")
+@mock.patch("branchdb.engines.postgres.template_copy.DatabaseCopy.run")
+@mock.patch("branchdb.engines.postgres.postgres_engine.PostgresEngine.create_database")
+def test_copy_database__connection_limit(mock_create, mock_run, mock_init):
+    mock_init.return_value = None
+    engine = connected_engine(130002)
+    engine._connection_params = target
+    with database.ConnectionManager(max_connections=6) as manager:
+        engine.manager = manager
+        # the manager has room for the template connection and two pairs of connections
+        engine.copy_database("jazz", "template", source, jobs=4)
+    mock_init.assert_called_once_with(source, "template", target, "jazz", jobs=2, progress=None)
@@ -4,6 +4,9 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+import stat
+import threading
 from branchdb import utils
 from branchdb.conf import settings
 from . import mocking
@@ -13,3 +16,28 @@ from . import mocking
 def test_get_database_name():
     db_name = utils.get_database_name(u"test")
     assert db_name == "branch-test"
+
+
+def test_atomic_json_dump__mode(tmp_path):
+    path = str(tmp_path / "content.json")
+    utils.atomic_json_dump({"a": 1}, path, mode=0o644)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    assert os.listdir(str(tmp_path)) == ["content.json"]
+
+
+def test_file_lock(tmp_path):
+    path = str(tmp_path / "file.lock")
+    events = []
+
+    def lock():
+        with utils.file_lock(path):
+            events.append("locked")
+
+    with utils.file_lock(path):
+        thread = threading.Thread(target=lock)
+        thread.start()
+        thread.join(0.2)
+        # the second lock waits for the first to be released
+        assert events == []
+    thread.join(5)
+    assert events == ["locked"]